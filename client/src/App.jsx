@@ -68,6 +68,29 @@ function App() {
   };
 
   const pollProgress = async (requestId) => {
+    // Prefer the push stream; fall back to polling if SSE is unavailable
+    if (window.EventSource) {
+      const source = new EventSource(`${API_BASE}/api/progress/${requestId}/stream`);
+      source.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data && data.status) {
+          setProgress(data);
+          if (data.status === 'completed' || data.status === 'error') {
+            source.close();
+            setTimeout(() => setDownloading(false), 2000);
+          }
+        }
+      };
+      source.onerror = () => {
+        source.close();
+        startPolling(requestId);
+      };
+      return source;
+    }
+    return startPolling(requestId);
+  };
+
+  const startPolling = (requestId) => {
     const interval = setInterval(async () => {
       try {
         const { data } = await axios.get(`${API_BASE}/api/progress/${requestId}`);
@@ -85,7 +108,7 @@ function App() {
     return interval;
   };
 
-  const handleDownload = async (height) => {
+  const handleDownload = async (height, ext) => {
     try {
       setDownloading(true);
       setProgress({ status: 'starting', progress: 0, stage: 'Initiating...', speed: '-', eta: '-' });
@@ -101,7 +124,10 @@ function App() {
       const downloadUrl = window.URL.createObjectURL(new Blob([response.data]));
       const link = document.createElement('a');
       link.href = downloadUrl;
-      link.setAttribute('download', `${videoInfo.title.replace(/[^a-zA-Z0-9]/g, '_')}_${height}p.mp4`);
+      // MP4 when the streams allow it, otherwise WebM/MKV so they merge without re-encoding
+      const disposition = response.headers['content-disposition'] || '';
+      const fileExt = (disposition.match(/\.(\w+)"?\s*$/) || [])[1] || ext || 'mp4';
+      link.setAttribute('download', `${videoInfo.title.replace(/[^a-zA-Z0-9]/g, '_')}_${height}p.${fileExt}`);
       document.body.appendChild(link);
       link.click();
       link.remove();
@@ -114,7 +140,7 @@ function App() {
     }
   };
 
-  const handleAudioDownload = async (quality) => {
+  const handleAudioDownload = async (quality, ext) => {
     try {
       setDownloading(true);
       setProgress({ status: 'starting', progress: 0, stage: 'Extracting audio...', speed: '-', eta: '-' });
@@ -130,7 +156,10 @@ function App() {
       const downloadUrl = window.URL.createObjectURL(new Blob([response.data]));
       const link = document.createElement('a');
       link.href = downloadUrl;
-      link.setAttribute('download', `${videoInfo.title.replace(/[^a-zA-Z0-9]/g, '_')}_${quality}.mp3`);
+      // Native streams are delivered as-is (m4a/opus), others as MP3; the server's filename says which
+      const disposition = response.headers['content-disposition'] || '';
+      const fileExt = (disposition.match(/\.(\w+)"?\s*$/) || [])[1] || ext || 'mp3';
+      link.setAttribute('download', `${videoInfo.title.replace(/[^a-zA-Z0-9]/g, '_')}_${quality}.${fileExt}`);
       document.body.appendChild(link);
       link.click();
       link.remove();
@@ -304,7 +333,7 @@ function App() {
                 {/* Video Hero */}
                 <div className="flex flex-col lg:flex-row gap-4 lg:gap-6 items-start">
                   <div className="w-full lg:w-48 aspect-video bg-black rounded-lg shadow-2xl overflow-hidden border border-white/10 shrink-0 relative group">
-                    <img src={videoInfo.thumbnail} className="w-full h-full object-cover opacity-90 group-hover:opacity-100 transition-opacity" />
+                    <img src={videoInfo.thumbnail?.startsWith('/') ? `${API_BASE}${videoInfo.thumbnail}?size=card` : videoInfo.thumbnail} className="w-full h-full object-cover opacity-90 group-hover:opacity-100 transition-opacity" />
                     <div className="absolute inset-0 bg-gradient-to-t from-black/60 to-transparent" />
                     <span className="absolute bottom-2 right-2 text-xs font-mono font-bold bg-black/60 backdrop-blur px-1.5 py-0.5 rounded text-white">
                       {Math.floor(videoInfo.duration / 60)}:{(videoInfo.duration % 60).toString().padStart(2, '0')}
@@ -400,7 +429,7 @@ function App() {
                         {videoInfo.formats.map((format, idx) => (
                           <button
                             key={idx}
-                            onClick={() => handleDownload(format.height)}
+                            onClick={() => handleDownload(format.height, format.ext)}
                             className="group flex flex-col items-start p-3 sm:p-4 rounded-xl border border-white/5 bg-[#161b2c] hover:bg-[#1f263a] hover:border-blue-500/30 transition-all text-left relative overflow-hidden active:scale-98"
                           >
                             <div className="flex justify-between w-full mb-1 sm:mb-2">
@@ -429,16 +458,16 @@ function App() {
                           videoInfo.audio_formats.map((format, idx) => (
                             <button
                               key={idx}
-                              onClick={() => handleAudioDownload(format.quality)}
+                              onClick={() => handleAudioDownload(format.quality, format.output_ext)}
                               className="group flex flex-col items-start p-3 sm:p-4 rounded-xl border border-white/5 bg-[#161b2c] hover:bg-[#1f263a] hover:border-purple-500/30 transition-all text-left relative overflow-hidden active:scale-98"
                             >
                               <div className="flex justify-between w-full mb-1 sm:mb-2">
                                 <span className="font-bold text-base sm:text-lg text-purple-400">{format.label}</span>
-                                <span className="text-[10px] sm:text-xs font-mono text-slate-500 px-1.5 py-0.5 rounded bg-black/30 border border-white/5 uppercase">MP3</span>
+                                <span className="text-[10px] sm:text-xs font-mono text-slate-500 px-1.5 py-0.5 rounded bg-black/30 border border-white/5 uppercase">{format.output_ext || 'MP3'}</span>
                               </div>
                               <div className="text-xs sm:text-sm text-slate-400 flex items-center gap-2">
                                 <Music className="w-3 h-3 group-hover:text-purple-400 transition-colors" />
-                                <span className="truncate">Extract Audio</span>
+                                <span className="truncate">{format.passthrough ? 'Original Audio' : 'Extract Audio'}</span>
                               </div>
                               {format.filesize_approx && (
                                 <div className="mt-2 text-[10px] sm:text-xs text-slate-600 font-mono">
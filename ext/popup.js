@@ -94,7 +94,10 @@ function renderUI(data, tabTitle, videoUrl) {
   const title = data.title || tabTitle || "Unknown Video";
   document.getElementById('video-title').textContent = title;
 
-  const thumbnail = data.thumbnail || `https://img.youtube.com/vi/${getVideoId(videoUrl)}/mqdefault.jpg`;
+  // The server proxies thumbnails at a relative URL, resized for the popup
+  const thumbnail = data.thumbnail
+    ? (data.thumbnail.startsWith('/') ? `${API_URL}${data.thumbnail}?size=popup` : data.thumbnail)
+    : `https://img.youtube.com/vi/${getVideoId(videoUrl)}/mqdefault.jpg`;
   document.getElementById('thumbnail').src = thumbnail;
 
   const container = document.getElementById('formats-container');
@@ -134,7 +137,7 @@ function renderUI(data, tabTitle, videoUrl) {
 
       btn.innerHTML = `
         <span class="format-details">${audio.label || 'Audio'}</span>
-        <span class="quality-badge audio-badge">MP3</span>
+        <span class="quality-badge audio-badge">${(audio.output_ext || 'mp3').toUpperCase()}</span>
       `;
       container.appendChild(btn);
     });
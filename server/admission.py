@@ -0,0 +1,214 @@
+import time
+import shutil
+import threading
+from collections import OrderedDict, deque
+
+import psutil
+
+
+class AdmissionRejected(Exception):
+    """A job that can't even be queued right now; retry_after is in seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Decides whether a new download job starts now, waits in a queue or is
+    rejected. A background sampler (run_sampler) reads CPU, RAM and free
+    space in download_dir. Jobs wait while the host is saturated, while
+    max_active jobs are running, or while their client already runs
+    max_active_per_client. Waiting jobs start round-robin across clients,
+    so one client's playlist can't starve the others. Jobs are rejected
+    with a retry_after hint when free disk space is below min_free_disk
+    or the queue (max_queued overall, max_queued_per_client per client)
+    is full. At least one job always runs, whatever the samples say.
+
+    ticket() returns an executor-like object whose submit() goes through
+    the controller to the underlying executor (the download pool).
+    """
+
+    def __init__(self, executor, download_dir, max_active=8, max_active_per_client=4, max_queued=100,
+                 max_queued_per_client=20, max_cpu=90, max_memory=90, min_free_disk=1024 ** 3,
+                 retry_after=30, sample_interval=2):
+        self.executor = executor
+        self.download_dir = download_dir
+        self.max_active = max_active
+        self.max_active_per_client = max_active_per_client
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self.max_cpu = max_cpu
+        self.max_memory = max_memory
+        self.min_free_disk = min_free_disk
+        self.retry_after = retry_after
+        self.sample_interval = sample_interval
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self._sample = {'cpu': None, 'memory': None, 'free_disk': None, 'time': None}
+        self._queues = OrderedDict()  # client -> deque of waiting entries, oldest first
+        self._active = {}  # client -> running jobs
+        self._served = {}  # client -> dispatch count when it last had a job started, while it has work
+        self._dispatched = 0
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """Take one resource sample and start any jobs it makes room for"""
+        sample = {
+            'cpu': psutil.cpu_percent(interval=None),
+            'memory': psutil.virtual_memory().percent,
+            'free_disk': shutil.disk_usage(self.download_dir).free,
+            'time': time.time(),
+        }
+        with self._lock:
+            self._sample = sample
+        self._dispatch()
+
+    def run_sampler(self):
+        """Background loop that re-samples every sample_interval seconds"""
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Admission sample error: {e}")
+            time.sleep(self.sample_interval)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._sample)
+
+    def check(self, client):
+        """Raise AdmissionRejected if a new job from client should be turned away"""
+        with self._lock:
+            free_disk = self._sample['free_disk']
+            if free_disk is not None and free_disk < self.min_free_disk:
+                reason = 'Server is low on disk space'
+            elif sum(len(q) for q in self._queues.values()) >= self.max_queued:
+                reason = 'Server is busy'
+            elif len(self._queues.get(client, ())) >= self.max_queued_per_client:
+                reason = 'Too many queued downloads from this client'
+            else:
+                return
+            self.rejected += 1
+        raise AdmissionRejected(f'{reason}, retry in {self.retry_after} seconds', self.retry_after)
+
+    def ticket(self, client, on_position=None):
+        """
+        Executor for one job from client. on_position(position) is called
+        with the job's 1-based place in line while it waits.
+        """
+        return AdmissionTicket(self, client, on_position)
+
+    def _enqueue(self, entry):
+        with self._lock:
+            self._queues.setdefault(entry['client'], deque()).append(entry)
+        self._dispatch()
+
+    def _saturated(self):
+        # Caller must hold the lock
+        cpu, memory = self._sample['cpu'], self._sample['memory']
+        return (cpu is not None and cpu >= self.max_cpu) or (memory is not None and memory >= self.max_memory)
+
+    def _turn(self, client, queue):
+        # Caller must hold the lock; least recently served client first
+        return (self._served.get(client, -1), queue[0]['enqueued'])
+
+    def _next(self):
+        # Caller must hold the lock; the waiting client with the fewest running jobs, then round-robin
+        running = sum(self._active.values())
+        if running >= self.max_active or (running and self._saturated()):
+            return None
+        candidates = [(self._active.get(client, 0), self._turn(client, queue), client)
+                      for client, queue in self._queues.items()
+                      if self._active.get(client, 0) < self.max_active_per_client]
+        if not candidates:
+            return None
+        client = min(candidates)[2]
+        queue = self._queues[client]
+        entry = queue.popleft()
+        if not queue:
+            del self._queues[client]
+        self._active[client] = self._active.get(client, 0) + 1
+        self._dispatched += 1
+        self._served[client] = self._dispatched
+        return entry
+
+    def _positions(self):
+        # Caller must hold the lock; round-robin order: every client's next job, then the one after, ...
+        waiting = [(index, self._turn(client, queue), entry) for client, queue in self._queues.items()
+                   for index, entry in enumerate(queue)]
+        waiting.sort(key=lambda w: w[:2])
+        return [(position, entry) for position, (_, _, entry) in enumerate(waiting, 1)
+                if entry['position'] != position]
+
+    def _dispatch(self):
+        started = []
+        with self._lock:
+            while True:
+                entry = self._next()
+                if entry is None:
+                    break
+                started.append(entry)
+                if entry['position'] is None:
+                    self.admitted += 1
+            moved = self._positions()
+            for position, entry in moved:
+                if entry['position'] is None:
+                    self.queued += 1
+                entry['position'] = position
+
+        for entry in started:
+            self.executor.submit(self._run, entry)
+        for position, entry in moved:
+            if entry['on_position'] is not None:
+                try:
+                    entry['on_position'](position)
+                except Exception as e:
+                    print(f"Queue position update error: {e}")
+
+    def _run(self, entry):
+        try:
+            return entry['fn'](*entry['args'])
+        finally:
+            with self._lock:
+                client = entry['client']
+                self._active[client] -= 1
+                if not self._active[client]:
+                    del self._active[client]
+                    if client not in self._queues:
+                        self._served.pop(client, None)
+            self._dispatch()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': sum(self._active.values()),
+                'waiting': sum(len(q) for q in self._queues.values()),
+                'clients': len(set(self._active) | set(self._queues)),
+                'saturated': self._saturated(),
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected': self.rejected,
+                'sample': dict(self._sample),
+            }
+
+
+class AdmissionTicket:
+    """Executor interface (submit) for one client's job, for SingleFlight.join"""
+
+    def __init__(self, controller, client, on_position=None):
+        self.controller = controller
+        self.client = client
+        self.on_position = on_position
+
+    def submit(self, fn, *args):
+        self.controller._enqueue({
+            'client': self.client,
+            'fn': fn,
+            'args': args,
+            'enqueued': time.monotonic(),
+            'position': None,
+            'on_position': self.on_position,
+        })
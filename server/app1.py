@@ -1,17 +1,39 @@
-from flask import Flask, request, jsonify, send_file, after_this_request, Response
+from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS
-import yt_dlp
+from werkzeug.wsgi import ClosingIterator
 import os
 import uuid
 import shutil
 import time
 import json
-import psutil
 import threading
-from datetime import datetime, timedelta
+import hmac
+import hashlib
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from info_cache import InfoCache, extract_video_id
+from output_store import OutputStore, output_key
+from single_flight import SingleFlight
+from jobs import Job, JobManager
+from progress_meter import ProgressMeter
+from progress_store import ProgressStore
+from streaming import plan_stream, iter_stream
+from format_analysis import summarize_formats, parse_height, QualityError, MERGE_CONTAINERS
+from zip_stream import ZipStream
+from storage_manager import StorageManager
+from download_profiles import load_profiles, choose_profile, profile_options
+from metrics import MetricsRegistry
+from job_timing import StageTimer, profiled
+from ydl_pool import YoutubeDLPool, CookieJarCache
+from pipeline import DownloadPipeline, deferred_postprocessing
+from admission import AdmissionController, AdmissionRejected
+from clips import ClipError, parse_clip, clip_options, clip_label, with_clip_sizes
+from thumbnail_cache import ThumbnailCache, ThumbnailError
+from prefetch import Prefetcher, PrefetchCancelled
+from state_backend import SqliteState, SqliteProgressStore, SqliteOutputStore, SqliteJobRecords, SqlitePins, SqliteMetrics
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['Content-Disposition', 'Content-Location', 'ETag', 'Accept-Ranges', 'Content-Range'])
 
 DOWNLOAD_DIR = os.path.join(os.getcwd(), 'downloads')
 if not os.path.exists(DOWNLOAD_DIR):
@@ -27,90 +49,348 @@ if not os.path.exists(COOKIE_DIR):
     os.makedirs(COOKIE_DIR)
 COOKIE_FILE_PATH = os.path.join(COOKIE_DIR, 'cookies.txt')
 
-# Global dictionary to store download progress
-# Key: request_id, Value: dict with status info
-download_progress = {}
+# Metadata cache for /api/info, keyed by video ID (TTL in seconds)
+INFO_CACHE_TTL = int(os.environ.get('INFO_CACHE_TTL', 6 * 60 * 60))
+INFO_CACHE_MAX_ENTRIES = int(os.environ.get('INFO_CACHE_MAX_ENTRIES', 512))
+info_cache = InfoCache(os.path.join(CACHE_DIR, 'info'), INFO_CACHE_MAX_ENTRIES, INFO_CACHE_TTL)
 
-# Global dictionary to store download progress
-# Key: request_id, Value: dict with status info
-download_progress = {}
+# Bounded pool for /api/info/batch extractions
+INFO_BATCH_WORKERS = int(os.environ.get('INFO_BATCH_WORKERS', 8))
+INFO_BATCH_MAX_ITEMS = int(os.environ.get('INFO_BATCH_MAX_ITEMS', 200))
+info_pool = ThreadPoolExecutor(max_workers=INFO_BATCH_WORKERS, thread_name_prefix='info')
+
+# Bulk (playlist) downloads: entries per request and how many may use the pool at once
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 200))
+BULK_MAX_PARALLEL = int(os.environ.get('BULK_MAX_PARALLEL', 3))
+
+# Where jobs, progress and the finished-file index live. 'memory' keeps them
+# in this process (development server); 'sqlite' shares them between worker
+# processes through STATE_DB_PATH, so any worker can answer any request
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'memory')
+STATE_DB_PATH = os.environ.get('STATE_DB_PATH', os.path.join(CACHE_DIR, 'state.db'))
+if STATE_BACKEND not in ('memory', 'sqlite'):
+    print(f"Unknown STATE_BACKEND '{STATE_BACKEND}', keeping state in memory")
+    STATE_BACKEND = 'memory'
+shared_state = SqliteState(STATE_DB_PATH) if STATE_BACKEND == 'sqlite' else None
+
+# Index of finished downloads so identical requests are served from disk
+if shared_state:
+    output_store = SqliteOutputStore(shared_state, DOWNLOAD_DIR, os.path.join(CACHE_DIR, 'outputs.json'))
+else:
+    output_store = OutputStore(DOWNLOAD_DIR, os.path.join(CACHE_DIR, 'outputs.json'))
+
+# Download-engine profiles (fragment concurrency, chunking, retries), picked
+# per job from the expected size. DOWNLOAD_PROFILES takes JSON overrides,
+# DOWNLOAD_PROFILE forces one profile for every job
+download_profiles = load_profiles(os.environ.get('DOWNLOAD_PROFILES'))
+DOWNLOAD_PROFILE = os.environ.get('DOWNLOAD_PROFILE') or None
+if DOWNLOAD_PROFILE and DOWNLOAD_PROFILE not in download_profiles:
+    print(f"Unknown DOWNLOAD_PROFILE '{DOWNLOAD_PROFILE}', choosing profiles automatically")
+    DOWNLOAD_PROFILE = None
+
+# Byte budget for DOWNLOAD_DIR (0 keeps files forever). Past the high
+# watermark, least recently (lru) or least frequently (lfu) used files are
+# evicted down to the low watermark; files being served are never touched
+STORAGE_BUDGET_BYTES = int(float(os.environ.get('STORAGE_BUDGET_GB', 20)) * 1024 ** 3)
+STORAGE_HIGH_WATERMARK = float(os.environ.get('STORAGE_HIGH_WATERMARK', 0.9))
+STORAGE_LOW_WATERMARK = float(os.environ.get('STORAGE_LOW_WATERMARK', 0.75))
+STORAGE_EVICTION_POLICY = os.environ.get('STORAGE_EVICTION_POLICY', 'lru')
+STORAGE_CHECK_INTERVAL = 5 * 60
+storage_manager = StorageManager(output_store, STORAGE_BUDGET_BYTES, STORAGE_HIGH_WATERMARK,
+                                 STORAGE_LOW_WATERMARK, STORAGE_EVICTION_POLICY,
+                                 pins=SqlitePins(shared_state) if shared_state else None)
+# Other workers may be mid-download: their running downloads are pinned, and
+# only leftovers that have gone quiet are swept
+storage_manager.reclaim_orphans(DOWNLOAD_DIR, CACHE_DIR, min_age=StorageManager.GRACE_SECONDS if shared_state else 0)
+
+# Downloads run in two stages with their own limits: MAX_DOWNLOAD_WORKERS
+# network transfers and POSTPROCESS_WORKERS FFmpeg runs (merges, audio
+# extraction), joined by a hand-off queue of POSTPROCESS_QUEUE places.
+# The FFmpeg default splits the CPUs between the WEB_CONCURRENCY worker
+# processes so gunicorn doesn't run one per CPU in every worker
+MAX_DOWNLOAD_WORKERS = int(os.environ.get('MAX_DOWNLOAD_WORKERS', 4))
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+POSTPROCESS_WORKERS = int(os.environ.get('POSTPROCESS_WORKERS', 0)) or max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+POSTPROCESS_QUEUE = int(os.environ.get('POSTPROCESS_QUEUE', MAX_DOWNLOAD_WORKERS))
+download_pipeline = DownloadPipeline(MAX_DOWNLOAD_WORKERS, POSTPROCESS_WORKERS, POSTPROCESS_QUEUE)
+
+# Bounded pool with a thread for every job that can hold a place in the
+# pipeline; extra work waits in its queue
+job_manager = JobManager(download_pipeline.max_jobs, records=SqliteJobRecords(shared_state) if shared_state else None)
+
+# Downloads queued or running, keyed like output_store so duplicates coalesce
+downloads_in_flight = SingleFlight(executor=job_manager)
+
+# Admission control in front of the download pool. New jobs wait while the
+# host is saturated (CPU/RAM %) or ADMISSION_MAX_ACTIVE jobs are running,
+# and start round-robin across clients. They are rejected with Retry-After
+# when free disk space or queue room runs out
+ADMISSION_MAX_ACTIVE = int(os.environ.get('ADMISSION_MAX_ACTIVE', download_pipeline.max_jobs))
+ADMISSION_MAX_PER_CLIENT = int(os.environ.get('ADMISSION_MAX_PER_CLIENT', MAX_DOWNLOAD_WORKERS))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 100))
+ADMISSION_MAX_QUEUE_PER_CLIENT = int(os.environ.get('ADMISSION_MAX_QUEUE_PER_CLIENT', 20))
+ADMISSION_MAX_CPU = float(os.environ.get('ADMISSION_MAX_CPU', 90))
+ADMISSION_MAX_MEMORY = float(os.environ.get('ADMISSION_MAX_MEMORY', 90))
+ADMISSION_MIN_FREE_DISK_GB = float(os.environ.get('ADMISSION_MIN_FREE_DISK_GB', 1))
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 30))
+admission = AdmissionController(job_manager, DOWNLOAD_DIR, ADMISSION_MAX_ACTIVE, ADMISSION_MAX_PER_CLIENT,
+                                ADMISSION_MAX_QUEUE, ADMISSION_MAX_QUEUE_PER_CLIENT, ADMISSION_MAX_CPU,
+                                ADMISSION_MAX_MEMORY, int(ADMISSION_MIN_FREE_DISK_GB * 1024 ** 3),
+                                ADMISSION_RETRY_AFTER)
+
+# Download progress, keyed by request_id. Finished entries expire after
+# PROGRESS_TTL seconds and at most PROGRESS_MAX_ENTRIES are retained
+PROGRESS_TTL = int(os.environ.get('PROGRESS_TTL', 10 * 60))
+PROGRESS_MAX_ENTRIES = int(os.environ.get('PROGRESS_MAX_ENTRIES', 10000))
+if shared_state:
+    download_progress = SqliteProgressStore(shared_state, PROGRESS_MAX_ENTRIES, PROGRESS_TTL)
+else:
+    download_progress = ProgressStore(PROGRESS_MAX_ENTRIES, PROGRESS_TTL)
+
+# Opt-in streaming downloads (?stream=1) pipe bytes to the client as they arrive
+MAX_STREAMS = int(os.environ.get('MAX_STREAMS', 8))
+stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+SSE_KEEPALIVE = 15  # seconds between keep-alive comments on idle streams
+PROGRESS_MIN_INTERVAL = float(os.environ.get('PROGRESS_MIN_INTERVAL', 0.5))  # seconds between hook updates
+
+# Warm YoutubeDL instances reused across requests with the same options and
+# cookies; parsed cookie jars are cached by content hash
+YDL_POOL_MAX_IDLE = int(os.environ.get('YDL_POOL_MAX_IDLE', 4))  # idle instances per option set
+YDL_POOL_IDLE_TTL = int(os.environ.get('YDL_POOL_IDLE_TTL', 10 * 60))
+ydl_pool = YoutubeDLPool(CookieJarCache(ttl=30 * 60), YDL_POOL_MAX_IDLE, idle_ttl=YDL_POOL_IDLE_TTL)
+
+# Audio requests whose bitrate matches a native stream listed by /api/info
+# get that stream copied (remuxed at most) instead of re-encoded to MP3
+AUDIO_PASSTHROUGH = os.environ.get('AUDIO_PASSTHROUGH', '1').lower() not in ('0', 'false', 'no')
+
+# Thumbnails are fetched from upstream once per video and served from a
+# size-bounded disk cache, resized to these widths (px) by FFmpeg
+THUMBNAIL_SIZES = {'popup': 480, 'card': 960}
+THUMBNAIL_CACHE_BYTES = int(float(os.environ.get('THUMBNAIL_CACHE_MB', 200)) * 1024 ** 2)
+THUMBNAIL_MAX_AGE = int(os.environ.get('THUMBNAIL_MAX_AGE', 7 * 24 * 60 * 60))  # Cache-Control max-age
+# Source for videos whose /api/info isn't cached
+THUMBNAIL_FALLBACK_URL = os.environ.get('THUMBNAIL_FALLBACK_URL', 'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg')
+thumbnail_cache = ThumbnailCache(os.path.join(CACHE_DIR, 'thumbnails'), THUMBNAIL_SIZES, THUMBNAIL_CACHE_BYTES,
+                                 ffmpeg_path=lambda: get_ffmpeg_path())
+
+# Optional speculative downloads: after /api/info, the format users pick
+# most often starts downloading into a scratch area on PREFETCH_SLOTS
+# threads of its own, paced to PREFETCH_RATE_MBPS across all prefetches.
+# Unclaimed prefetches are dropped after PREFETCH_TTL seconds.
+PREFETCH = os.environ.get('PREFETCH', '0').lower() in ('1', 'true', 'yes')
+PREFETCH_SLOTS = int(os.environ.get('PREFETCH_SLOTS', 1))
+PREFETCH_RATE_MBPS = float(os.environ.get('PREFETCH_RATE_MBPS', 4))  # 0 = unpaced
+PREFETCH_TTL = int(os.environ.get('PREFETCH_TTL', 120))
+PREFETCH_MAX_HEIGHT = int(os.environ.get('PREFETCH_MAX_HEIGHT', 1080))
+PREFETCH_MAX_BYTES = int(float(os.environ.get('PREFETCH_MAX_MB', 500)) * 1024 ** 2)
+prefetcher = Prefetcher(os.path.join(DOWNLOAD_DIR, '.prefetch'), DOWNLOAD_DIR, PREFETCH_SLOTS,
+                        PREFETCH_RATE_MBPS * 1024 ** 2, PREFETCH_TTL, PREFETCH_MAX_HEIGHT, PREFETCH_MAX_BYTES,
+                        yield_to=lambda: downloads_waiting())
+
+# Requests carrying X-Admin-Token may ask for profile=1 to run their download
+# job under cProfile; the .prof file lands in PROFILE_DIR
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+PROFILE_DIR = os.path.join(CACHE_DIR, 'profiles')
+
+# Prometheus metrics, exported at /metrics
+metrics = MetricsRegistry()
+extract_seconds = metrics.histogram('ytdl_extract_seconds', 'yt-dlp extract_info latency', ['kind'])
+download_seconds = metrics.histogram('ytdl_download_seconds', 'Time spent fetching media, excluding post-processing')
+postprocess_seconds = metrics.histogram('ytdl_postprocess_seconds', 'Post-processing (FFmpeg merge, audio extraction, ...) duration', ['postprocessor'])
+downloaded_bytes = metrics.counter('ytdl_downloaded_bytes_total', 'Bytes fetched from upstream')
+served_bytes = metrics.counter('ytdl_served_bytes_total', 'Bytes sent to clients', ['route'])
+errors_total = metrics.counter('ytdl_errors_total', 'Failures by stage and exception type', ['stage', 'type'])
+output_lookups = metrics.counter('ytdl_output_cache_lookups_total', 'Finished-file cache lookups for new downloads', ['result'])
+metrics.callback_counter('ytdl_info_cache_hits_total', 'Metadata cache hits', lambda: info_cache.stats()['hits'])
+metrics.callback_counter('ytdl_info_cache_misses_total', 'Metadata cache misses', lambda: info_cache.stats()['misses'])
+metrics.callback_counter('ytdl_thumbnail_cache_hits_total', 'Thumbnails served from the disk cache', lambda: thumbnail_cache.stats()['hits'])
+metrics.callback_counter('ytdl_thumbnail_fetches_total', 'Thumbnails fetched from upstream', lambda: thumbnail_cache.stats()['fetches'])
+metrics.gauge('ytdl_thumbnail_cache_bytes', 'Bytes of cached thumbnails', callback=lambda: thumbnail_cache.stats()['bytes'], shared=True)
+metrics.callback_counter('ytdl_prefetch_total', 'Speculative downloads by outcome',
+                         lambda: {(result,): prefetcher.stats()[result] for result in ('started', 'claimed', 'expired', 'cancelled', 'failed')},
+                         ['result'])
+metrics.callback_counter('ytdl_prefetch_claimed_bytes_total', 'Bytes prefetched before a real download claimed them', lambda: prefetcher.stats()['claimed_bytes'])
+metrics.callback_counter('ytdl_prefetch_wasted_bytes_total', 'Bytes prefetched for downloads nobody claimed', lambda: prefetcher.stats()['wasted_bytes'])
+metrics.callback_counter('ytdl_ydl_pool_created_total', 'YoutubeDL instances created', lambda: ydl_pool.stats()['created'])
+metrics.callback_counter('ytdl_ydl_pool_reused_total', 'Requests served by a pooled YoutubeDL instance', lambda: ydl_pool.stats()['reused'])
+metrics.callback_counter('ytdl_cookie_jar_hits_total', 'Cookie jar cache hits', lambda: ydl_pool.cookie_jars.stats()['hits'])
+metrics.callback_counter('ytdl_cookie_jar_misses_total', 'Cookie jar cache misses', lambda: ydl_pool.cookie_jars.stats()['misses'])
+metrics.gauge('ytdl_jobs_running', 'Downloads on a worker thread, in any pipeline stage', callback=lambda: job_manager.stats()['running'])
+metrics.gauge('ytdl_jobs_queued', 'Downloads waiting for a worker', callback=lambda: job_manager.stats()['queued'])
+metrics.gauge('ytdl_pipeline_jobs', 'Download jobs per pipeline stage', ['stage'],
+              callback=lambda: {(stage,): download_pipeline.stats()[stage] for stage in DownloadPipeline.STAGES})
+metrics.gauge('ytdl_admission_waiting', 'Download jobs waiting for admission', callback=lambda: admission.stats()['waiting'])
+metrics.callback_counter('ytdl_admission_queued_total', 'Download jobs that had to wait for admission', lambda: admission.stats()['queued'])
+metrics.callback_counter('ytdl_admission_rejected_total', 'Download jobs rejected with Retry-After', lambda: admission.stats()['rejected'])
+metrics.gauge('ytdl_downloads_in_flight', 'Distinct downloads queued or running', callback=downloads_in_flight.in_flight)
+metrics.gauge('ytdl_download_dir_bytes', 'Bytes of finished files in DOWNLOAD_DIR', callback=output_store.total_bytes, shared=True)
+metrics.gauge('ytdl_download_dir_free_bytes', 'Free space on the DOWNLOAD_DIR filesystem', callback=lambda: shutil.disk_usage(DOWNLOAD_DIR).free, shared=True)
+# With worker processes, each publishes its values every METRICS_PUBLISH_INTERVAL
+# seconds and /metrics on any of them reports the sum over all workers
+METRICS_PUBLISH_INTERVAL = int(os.environ.get('METRICS_PUBLISH_INTERVAL', 15))
+metrics_store = SqliteMetrics(shared_state, METRICS_PUBLISH_INTERVAL) if shared_state else None
 
 def get_ffmpeg_path():
     return shutil.which('ffmpeg')
 
-def build_cookiefile_from_request(data):
+def apply_request_cookies(ydl_opts, data):
     """
-    Accepts Netscape cookie text from extension and writes a temp cookie file.
-    Returns path or None.
+    Use Netscape cookie text from the extension, else the uploaded cookie
+    file. The text is handed to the YoutubeDL pool, which parses it once
+    per distinct content instead of writing a temp file per request.
     """
     cookies_txt = data.get("cookies")
-    if not cookies_txt:
-        return None
+    if cookies_txt:
+        ydl_opts['cookies'] = cookies_txt
+    elif os.path.exists(COOKIE_FILE_PATH):
+        ydl_opts['cookiefile'] = COOKIE_FILE_PATH
+    return ydl_opts
 
-    temp_cookie = os.path.join(CACHE_DIR, f"{uuid.uuid4()}.txt")
-    with open(temp_cookie, "w", encoding="utf-8") as f:
-        f.write(cookies_txt)
+def count_error(stage, e):
+    """Count a failure, labelled with the underlying error type yt-dlp wrapped"""
+    exc_info = getattr(e, 'exc_info', None)
+    cause = exc_info[1] if exc_info and exc_info[1] is not None else e
+    errors_total.inc(stage=stage, type=type(cause).__name__)
 
-    return temp_cookie
+def log_event(event, **fields):
+    """Structured log line (one JSON object) for log shippers"""
+    print(json.dumps({'event': event, 'time': time.time(), **fields}))
 
-# Cleanup old files periodically (runs in background)
-def cleanup_old_files():
-    """Delete files older than 1 hour from the downloads directory"""
-    while True:
-        try:
-            now = time.time()
-            cutoff = now - (60 * 60)  # 1 hour
-            
-            for filename in os.listdir(DOWNLOAD_DIR):
-                filepath = os.path.join(DOWNLOAD_DIR, filename)
-                if os.path.isfile(filepath):
-                    file_modified = os.path.getmtime(filepath)
-                    if file_modified < cutoff:
-                        try:
-                            os.remove(filepath)
-                            print(f"Cleaned up old file: {filename}")
-                        except Exception as e:
-                            print(f"Error deleting {filename}: {e}")
-        except Exception as e:
-            print(f"Cleanup error: {e}")
-        
-        # Run cleanup every 30 minutes
-        time.sleep(30 * 60)
+def is_admin():
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
 
-def progress_hook(d, request_id):
-    if d['status'] == 'downloading':
-        try:
-            total = d.get('total_bytes') or d.get('total_bytes_estimate')
-            downloaded = d.get('downloaded_bytes', 0)
-            
-            if total:
-                p = (downloaded / total) * 100
-            else:
-                p = 0
-            
-            speed = d.get('_speed_str', 'N/A')
-            eta = d.get('_eta_str', 'N/A')
-            
-            # Use ANSI strip just in case speed/eta have colors
-            if hasattr(speed, 'replace'): speed = speed.replace('\x1b', '').replace('[0m', '')
-            
-            download_progress[request_id] = {
-                'status': 'downloading',
-                'progress': p,
-                'speed': speed,
-                'eta': eta,
-                'stage': 'Downloading from YouTube...',
-            }
-        except Exception as e:
-            print(f"Progress Hook Error: {e}")
-    elif d['status'] == 'finished':
-        download_progress[request_id] = {
-            'status': 'processing',
-            'progress': 100,
-            'stage': 'Merging Video & Audio (FFmpeg)...',
-            'speed': '-',
-            'eta': '0s'
-        }
+def client_id():
+    """Who a request counts against for admission fairness"""
+    return request.remote_addr or 'unknown'
+
+def rejected_response(e, request_id):
+    set_progress(request_id, {'status': 'error', 'error': str(e)})
+    return jsonify({'error': str(e), 'retry_after': e.retry_after}), 503, {'Retry-After': str(e.retry_after)}
+
+def profile_requested(value):
+    """True if profiling was asked for; raises PermissionError for non-admins"""
+    if str(value or '').lower() not in ('1', 'true'):
+        return False
+    if not is_admin():
+        raise PermissionError('Profiling requires a valid X-Admin-Token')
+    return True
+
+def set_progress(request_id, record):
+    """Store a progress record and wake any SSE streams waiting on it"""
+    download_progress.set(request_id, record)
+
+def report_queue_position(key, position):
+    """Tell every request attached to a download waiting for admission its place in line"""
+    flight = downloads_in_flight.get(key)
+    for request_id in (flight.request_ids() if flight else []):
+        set_progress(request_id, {**download_progress.get(request_id, {}), 'status': 'queued',
+                                  'stage': f'Waiting for server capacity (position {position})...', 'queue_position': position})
+
+def progress_hook(d, flight, meter, timer):
+    """Publish throttled progress to every request attached to a download"""
+    if d.get('status') == 'downloading':
+        timer.mark('download')
+    elif d.get('status') == 'finished':
+        if d.get('elapsed') and timer.stage != 'download':
+            # FFmpeg (clip downloads) only reports when it is done
+            timer.mark('download', at=time.time() - d['elapsed'])
+        downloaded_bytes.inc(d.get('total_bytes') or d.get('downloaded_bytes') or 0)
+
+    try:
+        record = meter.update(d)
+    except Exception as e:
+        print(f"Progress Hook Error: {e}")
+        return
+
+    if record is not None:
+        record = {**record, 'timings': timer.to_dict()}
+        for request_id in flight.request_ids():
+            set_progress(request_id, record)
+
+def postprocessor_hook(d, timings, timer):
+    """Time each post-processor run; timings['total'] accumulates all of them"""
+    name = d.get('postprocessor')
+    if d.get('status') == 'started':
+        timer.mark('postprocess')
+        timings[name] = time.perf_counter()
+    elif d.get('status') == 'finished' and name in timings:
+        elapsed = time.perf_counter() - timings.pop(name)
+        timings['total'] = timings.get('total', 0) + elapsed
+        postprocess_seconds.observe(elapsed, postprocessor=name)
+
+def postprocess_queued(flight, timer):
+    """Report a finished download waiting for a post-processing slot"""
+    timer.mark('postprocess_queued')
+    record = {'status': 'processing', 'progress': 100, 'stage': 'Waiting for a free post-processing slot...',
+              'speed': '-', 'eta': '-', 'timings': timer.to_dict()}
+    for request_id in flight.request_ids():
+        set_progress(request_id, record)
+
+def postprocess_started(flight, timer):
+    was_queued = timer.stage == 'postprocess_queued'
+    timer.mark('postprocess')
+    if was_queued:
+        record = {'status': 'processing', 'progress': 100, 'stage': 'Post-processing (FFmpeg)...',
+                  'speed': '-', 'eta': '0s', 'timings': timer.to_dict()}
+        for request_id in flight.request_ids():
+            set_progress(request_id, record)
+
+def extract_info(url, ydl_opts, kind='video'):
+    """ydl.extract_info without downloading, timed and error-counted"""
+    try:
+        with extract_seconds.time(kind=kind), ydl_pool.acquire(ydl_opts) as ydl:
+            return ydl.extract_info(url, download=False)
+    except Exception as e:
+        count_error('extract', e)
+        raise
+
+def info_key(video_id, cookies_txt=None):
+    """
+    Metadata cache key. Lookups made with the extension's cookies can see
+    private formats and metadata, so they are cached per cookie set.
+    """
+    if not video_id or not cookies_txt:
+        return video_id
+    return f"{video_id}.{hashlib.sha256(cookies_txt.encode('utf-8')).hexdigest()[:16]}"
+
+def lookup_video_info(url, ydl_opts):
+    """Return the /api/info payload for url, from the metadata cache when possible"""
+    video_id = extract_video_id(url)
+    cached = info_cache.get(info_key(video_id, ydl_opts.get('cookies')))
+    if cached is not None:
+        return advertised_audio(cached)
+
+    info = extract_info(url, ydl_opts)
+    formats, audio_formats = summarize_formats(info)
+
+    result = {
+        'title': info.get('title'),
+        'thumbnail': info.get('thumbnail'),
+        'duration': info.get('duration'),
+        'formats': formats,
+        'audio_formats': audio_formats,
+        'author': info.get('uploader'),
+    }
+    info_cache.set(info_key(video_id or extract_video_id(info.get('id')), ydl_opts.get('cookies')), result)
+    return advertised_audio(result)
+
+def advertised_audio(result):
+    """
+    The payload as clients should see it: with AUDIO_PASSTHROUGH off every
+    audio entry is delivered as an MP3 re-encode, whatever the cache says.
+    """
+    if AUDIO_PASSTHROUGH:
+        return result
+    audio_formats = [{**audio, 'passthrough': False, 'output_ext': 'mp3'} for audio in result.get('audio_formats') or []]
+    return {**result, 'audio_formats': audio_formats}
+
+def proxied_thumbnail(result, url):
+    """/api/info payload pointing at the cached /api/thumbnail copy (upstream URL kept as thumbnail_source)"""
+    video_id = extract_video_id(url)
+    if not video_id:
+        return result
+    return {**result, 'thumbnail': f'/api/thumbnail/{video_id}', 'thumbnail_source': result.get('thumbnail')}
 
 @app.route('/api/info', methods=['POST'])
 def get_video_info():
@@ -120,8 +400,6 @@ def get_video_info():
     if not url:
         return jsonify({'error': 'URL is required'}), 400
 
-    temp_cookie = None
-
     try:
         ydl_opts = {
             'quiet': True,
@@ -130,182 +408,831 @@ def get_video_info():
         }
 
         # 🔐 INLINE COOKIES FROM EXTENSION
-        temp_cookie = build_cookiefile_from_request(data)
-        if temp_cookie:
-            ydl_opts['cookiefile'] = temp_cookie
-        elif os.path.exists(COOKIE_FILE_PATH):
-            ydl_opts['cookiefile'] = COOKIE_FILE_PATH
+        apply_request_cookies(ydl_opts, data)
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            duration_s = info.get('duration', 0)
-
-            formats = []
-            audio_formats = []
-            seen_heights = set()
-            seen_audio = set()
-
-            # ---------- AUDIO SIZE ESTIMATE ----------
-            best_audio_size = 0
-            for f in info.get('formats', []):
-                if f.get('vcodec') == 'none' and f.get('acodec') != 'none':
-                    size = f.get('filesize') or f.get('filesize_approx') or 0
-                    if size == 0 and f.get('abr') and duration_s:
-                        size = (f['abr'] * 1024 * duration_s) / 8
-                    best_audio_size = max(best_audio_size, size)
-
-            # ---------- VIDEO FORMATS ----------
-            for f in info.get('formats', []):
-                height = f.get('height')
-                if not height or f.get('vcodec') == 'none':
-                    continue
-
-                if height in seen_heights:
-                    continue
-
-                seen_heights.add(height)
-                bitrate = f.get('tbr') or f.get('vbr') or 0
-                size = f.get('filesize') or f.get('filesize_approx') or 0
-
-                if size == 0 and duration_s and bitrate:
-                    size = (bitrate * 1024 * duration_s) / 8
-
-                if f.get('acodec') == 'none':
-                    size += best_audio_size
-
-                label = f"{height}p"
-                formats.append({
-                    'height': height,
-                    'label': label,
-                    'filesize_approx': int(size)
-                })
-
-            formats.sort(key=lambda x: x['height'], reverse=True)
-
-            # ---------- AUDIO FORMATS ----------
-            for f in info.get('formats', []):
-                if f.get('vcodec') == 'none' and f.get('acodec') != 'none':
-                    abr = round((f.get('abr') or 0) / 16) * 16
-                    if abr and abr not in seen_audio:
-                        seen_audio.add(abr)
-                        audio_formats.append({
-                            'quality': f"{abr}k",
-                            'label': f"{abr}kbps"
-                        })
-
-            audio_formats.sort(key=lambda x: int(x['quality'].replace('k', '')), reverse=True)
-
-            return jsonify({
-                'title': info.get('title'),
-                'thumbnail': info.get('thumbnail'),
-                'duration': info.get('duration'),
-                'formats': formats,
-                'audio_formats': audio_formats,
-                'author': info.get('uploader'),
-                'ffmpeg_available': get_ffmpeg_path() is not None
-            })
+        result = lookup_video_info(url, ydl_opts)
+        # Optional clip: estimate what each format costs for just that range
+        clip = parse_clip(data.get('start'), data.get('end'), duration=result.get('duration'))
+        if clip:
+            result = with_clip_sizes(result, clip)
+        else:
+            prefetch_download(url, result, {'cookies': data.get('cookies')})
+        return jsonify({**proxied_thumbnail(result, url), 'ffmpeg_available': get_ffmpeg_path() is not None})
 
+    except ClipError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-    finally:
-        if temp_cookie and os.path.exists(temp_cookie):
-            os.remove(temp_cookie)
 
+def batch_urls(data):
+    """The 'urls' list of a batch request (or its single playlist 'url'); None unless every entry is a string"""
+    urls = data.get('urls') or ([data['url']] if data.get('url') else [])
+    if not isinstance(urls, list) or not all(isinstance(url, str) and url for url in urls):
+        return None
+    return urls
+
+def expand_playlist(url, ydl_opts):
+    """Single videos pass through; playlists are flat-extracted to their entry URLs"""
+    if extract_video_id(url):
+        return [url]
+    info = extract_info(url, {**ydl_opts, 'extract_flat': 'in_playlist'}, kind='playlist')
+    if info.get('_type') != 'playlist':
+        return [url]
+    return [e.get('url') or e.get('id') for e in info.get('entries') or [] if e and (e.get('url') or e.get('id'))]
+
+@app.route('/api/info/batch', methods=['POST'])
+def get_batch_info():
+    """
+    Resolve many URLs (or a playlist) at once. Entries are extracted
+    concurrently on the info pool and streamed back as NDJSON lines in
+    completion order; one failing entry does not fail the batch.
+    """
+    data = request.json or {}
+    urls = batch_urls(data)
+
+    if urls is None:
+        return jsonify({'error': 'urls must be a list of URL strings'}), 400
+    if not urls:
+        return jsonify({'error': 'urls (or a playlist url) is required'}), 400
+
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'socket_timeout': 15
+    }
+
+    # 🔐 INLINE COOKIES FROM EXTENSION (shared by every entry)
+    apply_request_cookies(ydl_opts, data)
+
+    def lines():
+        futures = {}
+        errors = 0
+        try:
+            entries = []
+            for url in urls:
+                try:
+                    entries.extend(expand_playlist(url, ydl_opts))
+                except Exception as e:
+                    errors += 1
+                    yield json.dumps({'url': url, 'ok': False, 'error': str(e)}) + '\n'
+
+            for index, url in enumerate(entries[:INFO_BATCH_MAX_ITEMS]):
+                futures[info_pool.submit(lookup_video_info, url, ydl_opts)] = (index, url)
+
+            for future in as_completed(futures):
+                index, url = futures[future]
+                try:
+                    result = {**proxied_thumbnail(future.result(), url), 'ffmpeg_available': get_ffmpeg_path() is not None}
+                    line = {'index': index, 'url': url, 'ok': True, 'info': result}
+                except Exception as e:
+                    errors += 1
+                    line = {'index': index, 'url': url, 'ok': False, 'error': str(e)}
+                yield json.dumps(line) + '\n'
+
+            yield json.dumps({'done': True, 'count': len(futures), 'errors': errors, 'truncated': len(entries) > INFO_BATCH_MAX_ITEMS}) + '\n'
+        finally:
+            # Client went away (or we finished): drop entries that haven't started yet
+            for future in futures:
+                future.cancel()
+
+    return Response(lines(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Report hit/miss counts for the metadata and thumbnail caches"""
+    return jsonify({'info': info_cache.stats(), 'thumbnails': thumbnail_cache.stats()})
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Report active/retained progress entries and worker pool load"""
+    return jsonify({
+        'progress': download_progress.stats(),
+        'pool': job_manager.stats(),
+        'pipeline': download_pipeline.stats(),
+        'storage': storage_manager.stats(),
+        'ydl_pool': ydl_pool.stats(),
+        'admission': admission.stats(),
+        'prefetch': prefetcher.stats(),
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of the counters, gauges and histograms above"""
+    others = ()
+    if metrics_store:
+        metrics_store.publish(metrics.snapshot())
+        others = metrics_store.others()
+    return Response(metrics.render(others), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/progress/<request_id>/stream', methods=['GET'])
+def stream_progress(request_id):
+    """Server-Sent Events feed that pushes a record only when it changes"""
+    def events():
+        last = None
+        while True:
+            record = download_progress.wait(request_id, last, SSE_KEEPALIVE)
+            if record == last:
+                yield ': keep-alive\n\n'
+                continue
+
+            last = record
+            yield f'data: {json.dumps(last)}\n\n'
+            if last.get('status') in ('completed', 'error'):
+                return
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
 
 @app.route('/api/progress/<request_id>', methods=['GET'])
 def get_progress(request_id):
     return jsonify(download_progress.get(request_id, {'status': 'unknown'}))
 
-@app.route('/api/download', methods=['GET', 'POST'])
-def download_video():
-    # Support both GET (web client) and POST (extension)
+def passthrough_audio_format(info, audio_quality):
+    """The /api/info audio entry that can be delivered as-is for audio_quality, or None"""
+    if not AUDIO_PASSTHROUGH or not info:
+        return None
+    for audio in info.get('audio_formats') or []:
+        if audio.get('quality') == audio_quality and audio.get('passthrough') and audio.get('format_id'):
+            return audio
+    return None
+
+def stream_copy_plan(info, height):
+    """
+    The /api/info entry bestvideo[height<=height] would land on, naming a
+    video + audio pair that merges without re-encoding; None if unknown.
+    """
+    if not info or not height:
+        return None
+    fitting = [f for f in info.get('formats') or [] if f.get('height') and f['height'] <= int(height)]
+    if not fitting:
+        return None
+    planned = max(fitting, key=lambda f: f['height'])
+    return planned if planned.get('format_id') and planned.get('container') else None
+
+def transcodes_audio(ydl_opts):
+    """True when the options re-encode audio rather than copy the native stream"""
+    return any(pp.get('preferredcodec') not in (None, 'best') for pp in ydl_opts.get('postprocessors', []))
+
+def build_download_options(url, height, audio_quality, start=None, end=None, precise=False, cookies_txt=None):
+    """
+    Return (ydl_opts, download_name) for a video or audio request. With
+    start and/or end only that clip is downloaded (raises ClipError). A
+    video request needs a valid height (raises QualityError). cookies_txt
+    selects the /api/info result made with the same extension cookies.
+    """
+    if not audio_quality:
+        height = parse_height(height)
+    temp_id = str(uuid.uuid4())
+    output_template = os.path.join(DOWNLOAD_DIR, f'{temp_id}.%(ext)s')
+
+    # Metadata from /api/info, if the client asked for it first
+    info = info_cache.peek(info_key(extract_video_id(url), cookies_txt))
+    native_audio = passthrough_audio_format(info, audio_quality) if audio_quality else None
+    clip = parse_clip(start, end, precise, info.get('duration') if info else None)
+    if clip and not get_ffmpeg_path():
+        raise ClipError('FFmpeg is required to download clips')
+
+    if native_audio:
+        # The requested bitrate exists as a native stream: download exactly that one
+        bitrate = native_audio['bitrate']
+        ydl_opts = {
+            'format': f"{native_audio['format_id']}/bestaudio[abr>={bitrate - 8}][abr<{bitrate + 8}]",
+            'outtmpl': output_template,
+            'quiet': True,
+            'socket_timeout': 15,
+        }
+        download_name = f"audio_{audio_quality}.{native_audio['output_ext']}"
+    elif audio_quality:
+        ydl_opts = {
+            'format': 'bestaudio/best',
+            'outtmpl': output_template,
+            'quiet': True,
+            'socket_timeout': 15,
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': audio_quality.replace('k', '')
+            }]
+        }
+        download_name = f"audio_{audio_quality}.mp3"
+    else:
+        # Video download: prefer streams FFmpeg can merge with a pure stream copy
+        selector = f'bestvideo[height<={height}]+bestaudio/best'
+        planned = stream_copy_plan(info, height)
+        if planned:
+            pair = '+'.join(filter(None, (planned['format_id'], planned.get('audio_format_id'))))
+            selector = f'{pair}/{selector}'
+        ydl_opts = {
+            'format': selector,
+            'outtmpl': output_template,
+            # yt-dlp takes the first container both streams fit as-is (MKV takes anything)
+            'merge_output_format': MERGE_CONTAINERS,
+            # Without a plan from /api/info: same height and fps, but H.264/AAC ranked first
+            'format_sort': [f'res:{height}', 'fps', '+codec:avc:m4a'],
+            'quiet': True,
+            'socket_timeout': 15,
+        }
+        download_name = f"video_{height}.{planned['container'] if planned else 'mp4'}"
+
+    if native_audio and get_ffmpeg_path():
+        # Stream copy into a plain audio container (webm/opus -> .opus); m4a is left as is
+        ydl_opts['postprocessors'] = [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'best'}]
+
+    if clip:
+        # FFmpeg fetches only the byte ranges covering the clip
+        ydl_opts.update(clip_options(clip))
+        name, ext = os.path.splitext(download_name)
+        download_name = f'{name}_{clip_label(clip)}{ext}'
+
+    # Tune the download engine for the expected size (info is usually cached by /api/info)
+    profile = choose_profile(info, height, audio_quality, DOWNLOAD_PROFILE)
+    ydl_opts.update(profile_options(download_profiles[profile]))
+
+    return ydl_opts, download_name
+
+def download_key(url, ydl_opts):
+    """Output store key for a request; also the stable /api/files/<key> URL"""
+    return output_key(extract_video_id(url) or url, ydl_opts)
+
+def send_output(path, key, download_name, request_id=None):
+    """
+    Send a finished file with a strong ETag and Range/If-Range support,
+    pointing the client at its stable URL so interrupted transfers resume
+    there instead of starting a new download.
+    """
+    # The file name is a per-download UUID, so it changes whenever the bytes do
+    etag, ext = os.path.splitext(os.path.basename(path))
+
+    # Name the download after the container actually produced (.m4a/.opus passthrough audio)
+    download_name = os.path.splitext(download_name)[0] + ext
+
+    # Pinned until the response is closed so eviction can't remove it mid-transfer
+    storage_manager.pin(key)
+    try:
+        response = send_file(path, as_attachment=True, download_name=download_name, conditional=True, etag=etag)
+    except Exception:
+        storage_manager.unpin(key)
+        raise
+    send_started = time.time()
+
+    def on_close():
+        storage_manager.unpin(key)
+        sent = response.content_length or 0
+        seconds = round(time.time() - send_started, 3)
+        served_bytes.inc(sent, route='file')
+        log_event('file_sent', key=key, request_id=request_id, bytes=sent, seconds=seconds)
+
+        # Add the delivery stage to the job timeline the client sees
+        record = download_progress.get(request_id) if request_id else None
+        if record and 'timings' in record:
+            timings = {**record['timings'], 'stages': {**record['timings']['stages'], 'send': seconds}}
+            set_progress(request_id, {**record, 'timings': timings})
+
+    # send_file responses are passed straight through, so call_on_close never fires
+    response.response = ClosingIterator(response.response, on_close)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Content-Location'] = f'/api/files/{key}'
+    return response
+
+def downloads_waiting():
+    """True while real downloads queue for admission; prefetches yield to them"""
+    stats = admission.stats()
+    return stats['waiting'] > 0 or stats['saturated']
+
+def claim_prefetch(store_key, request_id):
+    """
+    Take over a prefetch of store_key. Returns (stored_file, None) for a
+    finished one, now recorded in the output store, (None, flight) for
+    one still running (request_id is attached to it), or (None, None).
+    """
+    claimed = prefetcher.claim(store_key)
+    if claimed is None:
+        return None, None
+    path, meta, flight = claimed
+    log_event('prefetch_claimed', key=store_key, request_id=request_id, running=flight is not None)
+    if flight:
+        flight.attach(request_id)
+        set_progress(request_id, download_progress.get(flight.leader_id, download_progress.get(request_id, {})))
+        return None, flight
+    output_store.record(store_key, path, **meta)
+    storage_manager.enforce()
+    return path, None
+
+def start_download(url, ydl_opts, request_id, download_name, cookie_data, profile=False, client=None, prefetch=None):
+    """
+    Start the download on the worker pool, or attach to an identical one
+    that is already queued/running. Returns (stored_file, flight): the file
+    if it is already on disk, otherwise the flight to wait on. With profile
+    the job runs under cProfile (only if this request starts it). A new
+    job goes through admission control for client and may wait there, or
+    raise AdmissionRejected. A prefetch (entry from prefetcher.start) skips
+    admission, runs on the prefetcher's threads without a download slot and
+    leaves its file in the scratch area unless it was claimed meanwhile;
+    a request that claims a running prefetch waits on its flight. The
+    request's cookies are applied to ydl_opts first, since they are part
+    of the output key.
+    """
+    # 🔐 INLINE COOKIES
+    apply_request_cookies(ydl_opts, cookie_data)
+
+    # Serve an identical earlier download straight from disk
+    store_key = download_key(url, ydl_opts)
+    stored_file = output_store.lookup(store_key)
+    output_lookups.inc(result='hit' if stored_file else 'miss')
+    if not stored_file and prefetch is None:
+        stored_file, flight = claim_prefetch(store_key, request_id)
+        if flight:
+            return None, flight
+    if stored_file:
+        set_progress(request_id, {'status': 'completed', 'progress': 100, 'stage': 'Serving cached file...', 'file_url': f'/api/files/{store_key}'})
+        return stored_file, None
+
+    # queued -> extract -> download -> (postprocess_queued ->) postprocess, reported in progress records
+    timer = StageTimer()
+
+    def run_download(flight, stage):
+        timer.mark('extract')
+        for rid in flight.request_ids():
+            record = {**download_progress.get(rid, {}), 'status': 'starting', 'stage': 'Initializing...'}
+            record.pop('queue_position', None)
+            set_progress(rid, record)
+
+        try:
+            # The same file may have been finished while this job was queued
+            downloaded_file = output_store.lookup(store_key)
+            if not downloaded_file:
+                # yt-dlp reports the final path (after merge / audio extraction) here
+                finished_files = []
+                meter = ProgressMeter(PROGRESS_MIN_INTERVAL)
+                ydl_opts['progress_hooks'] = [lambda d: progress_hook(d, flight, meter, timer)]
+                if prefetch is not None:
+                    # Counts, paces and stops the prefetch until a real request claims it
+                    ydl_opts['progress_hooks'].append(lambda d: prefetcher.hook(prefetch, d))
+                ydl_opts['post_hooks'] = [finished_files.append]
+                timings = {}
+                ydl_opts['postprocessor_hooks'] = [lambda d: postprocessor_hook(d, timings, timer)]
+
+                started = time.perf_counter()
+                # Keeps other workers' startup sweeps off this job's .part and per-format files
+                part_stem = os.path.basename(ydl_opts['outtmpl']).split('.')[0]
+                storage_manager.pin(part_stem)
+                try:
+                    # Merges and audio extraction wait for a post-processing slot, not this download slot
+                    with ydl_pool.acquire(ydl_opts) as ydl, \
+                            deferred_postprocessing(ydl, stage, on_queued=lambda: postprocess_queued(flight, timer),
+                                                    on_started=lambda: postprocess_started(flight, timer)):
+                        ydl.download([url])
+                finally:
+                    storage_manager.unpin(part_stem)
+                download_seconds.observe(time.perf_counter() - started - timings.get('total', 0) - stage.postprocess_wait)
+
+                downloaded_file = finished_files[-1] if finished_files else None
+                if not downloaded_file or not os.path.exists(downloaded_file):
+                    raise FileNotFoundError('Download failed or file not found')
+
+                if prefetch is not None:
+                    if prefetcher.hold(prefetch, downloaded_file, {'url': url, 'download_name': download_name}):
+                        timer.finish()
+                        log_event('prefetch_finished', key=store_key, url=url, timings=timer.to_dict())
+                        return downloaded_file
+                    # Claimed while running: it becomes an ordinary finished download
+                    downloaded_file = prefetcher.promote(downloaded_file)
+
+                # Another worker process may have finished the same file meanwhile; keep theirs
+                existing = output_store.lookup(store_key)
+                if existing and existing != downloaded_file:
+                    os.remove(downloaded_file)
+                    downloaded_file = existing
+                else:
+                    output_store.record(store_key, downloaded_file, url=url, download_name=download_name)
+                storage_manager.enforce()
+        except Exception as e:
+            timer.finish()
+            if prefetch is not None:
+                prefetcher.abandon(prefetch)
+            stopped = isinstance(e, PrefetchCancelled)
+            if not stopped:
+                count_error('download', e)
+            log_event('prefetch_stopped' if stopped else 'job_finished', key=store_key, url=url, status='error', error=str(e), timings=timer.to_dict())
+            for rid in flight.request_ids():
+                set_progress(rid, {'status': 'error', 'error': str(e), 'timings': timer.to_dict()})
+            raise
+
+        timer.finish()
+        log_event('job_finished', key=store_key, url=url, status='completed', timings=timer.to_dict())
+        for rid in flight.request_ids():
+            set_progress(rid, {'status': 'completed', 'progress': 100, 'file_url': f'/api/files/{store_key}', 'timings': timer.to_dict()})
+        return downloaded_file
+
+    # Attaching to a download that is already queued or running adds no load
+    if prefetch is None and downloads_in_flight.get(store_key) is None:
+        admission.check(client)
+
+    set_progress(request_id, {**download_progress.get(request_id, {}), 'status': 'queued', 'stage': 'Waiting for a free download slot...'})
+
+    def run_job(flight):
+        if prefetch is not None:
+            # Prefetches have their own threads; only post-processing shares the pipeline
+            return run_download(flight, download_pipeline.job())
+        # Admin-requested profiling covers the whole job on its worker thread
+        with profiled(profile, PROFILE_DIR, request_id), download_pipeline.job() as stage:
+            return run_download(flight, stage)
+
+    # Identical concurrent requests attach to the job that is already queued or running. The key
+    # includes the request's cookies, so a user never waits on (or gets) another user's download
+    if prefetch is not None:
+        # Kept apart from real downloads, which only reach it through claim_prefetch
+        flight, is_leader = downloads_in_flight.join(f'prefetch:{store_key}', request_id, run_job, executor=prefetcher)
+        if is_leader:
+            prefetcher.attach(prefetch, flight)
+        else:
+            prefetcher.discard(prefetch)
+        return None, flight
+
+    ticket = admission.ticket(client, on_position=lambda position: report_queue_position(store_key, position))
+    flight, is_leader = downloads_in_flight.join(store_key, request_id, run_job, executor=ticket)
+    if not is_leader:
+        set_progress(request_id, download_progress.get(flight.leader_id, download_progress.get(request_id, {})))
+    return None, flight
+
+def read_download_request():
+    """Pull download parameters from a GET query (web client) or POST body (extension)"""
     if request.method == 'POST':
         data = request.json or {}
-        url = data.get('url')
-        height = data.get('height')
-        audio_quality = data.get('audio_quality')
-        request_id = data.get('id', str(uuid.uuid4()))
     else:
-        url = request.args.get('url')
-        height = request.args.get('height')
-        audio_quality = request.args.get('audio_quality')
-        request_id = request.args.get('id', str(uuid.uuid4()))
+        data = request.args
+    return data, data.get('url'), data.get('height'), data.get('audio_quality')
+
+def prefetch_download(url, info, cookie_data):
+    """Start downloading the format this video's next request most likely wants (if PREFETCH is on)"""
+    if not PREFETCH:
+        return
+    try:
+        choice = prefetcher.predict(info)
+        if choice is None:
+            return
+        height, audio_quality = choice
+        ydl_opts, download_name = build_download_options(url, height, audio_quality, cookies_txt=cookie_data.get('cookies'))
+        apply_request_cookies(ydl_opts, cookie_data)
+        store_key = download_key(url, ydl_opts)
+        if output_store.lookup(store_key) or downloads_in_flight.get(store_key):
+            return
+        entry = prefetcher.start(store_key)
+        if entry is None:
+            return
+        ydl_opts['outtmpl'] = os.path.join(prefetcher.scratch_dir, os.path.basename(ydl_opts['outtmpl']))
+        log_event('prefetch_started', key=store_key, url=url, height=height, audio_quality=audio_quality)
+        start_download(url, ydl_opts, f'prefetch-{uuid.uuid4()}', download_name, cookie_data, prefetch=entry)
+    except Exception as e:
+        print(f"Prefetch error: {e}")
+
+def stream_download(url, ydl_opts, audio_quality, request_id, download_name, cookie_data):
+    """
+    Pipe the download straight to the client while it is fetched, muxing
+    separate video/audio into fragmented MP4 with FFmpeg. Returns None when
+    the formats can't be streamed or every stream slot is busy, so the
+    caller falls back to the file-based path.
+    """
+    # A finished copy on disk is always faster than streaming
+    apply_request_cookies(ydl_opts, cookie_data)
+    if output_store.lookup(download_key(url, ydl_opts)):
+        return None
+    if not stream_slots.acquire(blocking=False):
+        return None
+
+    ffmpeg_path = get_ffmpeg_path()
+    opts = {k: v for k, v in ydl_opts.items() if k in ('format', 'format_sort', 'quiet', 'socket_timeout', 'cookies', 'cookiefile')}
+
+    pool_key, ydl = ydl_pool.checkout(opts)
+    try:
+        with extract_seconds.time(kind='stream'):
+            info = ydl.extract_info(url, download=False)
+        plan = plan_stream(info, audio_quality, ffmpeg_path, transcode=transcodes_audio(ydl_opts))
+    except Exception as e:
+        print(f"Streaming unavailable, using file download: {e}")
+        ydl_pool.checkin(pool_key, ydl, reusable=False)
+        stream_slots.release()
+        return None
+
+    total = sum(f.get('filesize') or f.get('filesize_approx') or 0 for f in plan['formats'])
+    meter = ProgressMeter(PROGRESS_MIN_INTERVAL)
+    sent = [0]
+
+    def on_chunk(size):
+        sent[0] += size
+        downloaded_bytes.inc(size)
+        served_bytes.inc(size, route='stream')
+        record = meter.update({'status': 'downloading', 'downloaded_bytes': sent[0], 'total_bytes': total or None})
+        if record:
+            set_progress(request_id, {**record, 'stage': 'Streaming to client...'})
+
+    finished = [False]
+
+    def generate():
+        chunks = iter_stream(ydl, plan, ffmpeg_path, audio_quality, on_chunk)
+        try:
+            for chunk in chunks:
+                yield chunk
+            finished[0] = True
+            set_progress(request_id, {'status': 'completed', 'progress': 100, 'stage': 'Ready'})
+        except Exception as e:
+            print(f"Streaming error: {e}")
+            count_error('stream', e)
+            set_progress(request_id, {'status': 'error', 'error': str(e)})
+        finally:
+            # Also runs when the client disconnects, which stops FFmpeg / the upstream read
+            chunks.close()
+
+    def release():
+        ydl_pool.checkin(pool_key, ydl, reusable=finished[0])
+        stream_slots.release()
+
+    name = f"{os.path.splitext(download_name)[0]}.{plan['ext']}"
+    response = Response(generate(), mimetype=plan['mimetype'], headers={
+        'Content-Disposition': f'attachment; filename="{name}"',
+        'X-Accel-Buffering': 'no',
+    })
+    # Runs after the body is closed, even when it was never iterated (HEAD requests)
+    response.call_on_close(release)
+    return response
+
+@app.route('/api/download', methods=['GET', 'POST'])
+def download_video():
+    # Support both GET (web client) and POST (extension)
+    data, url, height, audio_quality = read_download_request()
+    request_id = data.get('id', str(uuid.uuid4()))
 
     if not url:
         return jsonify({'error': 'URL is required'}), 400
 
-    download_progress[request_id] = {
+    set_progress(request_id, {
         'status': 'starting',
         'progress': 0,
         'stage': 'Initializing...'
-    }
+    })
+
+    try:
+        ydl_opts, download_name = build_download_options(url, height, audio_quality, data.get('start'),
+                                                         data.get('end'), data.get('precise'), data.get('cookies'))
+        if 'download_ranges' not in ydl_opts:
+            prefetcher.record_choice(height, audio_quality)
+
+        # Clips are cut by FFmpeg into a file; streaming always sends the whole video
+        if str(data.get('stream', '')).lower() in ('1', 'true') and 'download_ranges' not in ydl_opts:
+            response = stream_download(url, ydl_opts, audio_quality, request_id, download_name, {'cookies': data.get('cookies')})
+            if response is not None:
+                return response
 
-    temp_cookie = None
+        profile = profile_requested(data.get('profile'))
+        stored_file, flight = start_download(url, ydl_opts, request_id, download_name, {'cookies': data.get('cookies')}, profile, client_id())
+        downloaded_file = stored_file or flight.wait()
+
+        return send_output(downloaded_file, download_key(url, ydl_opts), download_name, request_id)
+
+    except (ClipError, QualityError) as e:
+        set_progress(request_id, {'status': 'error', 'error': str(e)})
+        return jsonify({'error': str(e)}), 400
+    except AdmissionRejected as e:
+        return rejected_response(e, request_id)
+    except PermissionError as e:
+        set_progress(request_id, {'status': 'error', 'error': str(e)})
+        return jsonify({'error': str(e)}), 403
+
+    except Exception as e:
+        set_progress(request_id, {'status': 'error', 'error': str(e)})
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/download/batch', methods=['POST'])
+def download_batch():
+    """
+    Download several videos (or a playlist) in parallel and stream them back
+    as one ZIP, adding each entry as soon as it finishes. Progress is
+    reported per entry under <id>-<n> and in aggregate under <id>.
+    """
+    data = request.json or {}
+    urls = batch_urls(data)
+    height = data.get('height')
+    audio_quality = data.get('audio_quality')
+    request_id = data.get('id') or str(uuid.uuid4())
+
+    if urls is None:
+        return jsonify({'error': 'urls must be a list of URL strings'}), 400
+    if not urls:
+        return jsonify({'error': 'urls (or a playlist url) is required'}), 400
+    if not audio_quality:
+        try:
+            parse_height(height)
+        except QualityError as e:
+            return jsonify({'error': str(e)}), 400
+
+    info_opts = {'quiet': True, 'no_warnings': True}
+
+    # 🔐 INLINE COOKIES (only needed here to expand playlists; each entry job applies its own)
+    apply_request_cookies(info_opts, data)
 
     try:
-        temp_id = str(uuid.uuid4())
-        output_template = os.path.join(DOWNLOAD_DIR, f'{temp_id}.%(ext)s')
-
-        if audio_quality:
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': output_template,
-                'quiet': True,
-                'socket_timeout': 15,
-                'progress_hooks': [lambda d: progress_hook(d, request_id)],
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': audio_quality.replace('k', '')
-                }]
-            }
-            download_name = f"audio_{audio_quality}.mp3"
-        else:
-            ydl_opts = {
-                'format': f'bestvideo[height<={height}]+bestaudio/best',
-                'outtmpl': output_template,
-                'merge_output_format': 'mp4',
-                'quiet': True,
-                'socket_timeout': 15,
-                'progress_hooks': [lambda d: progress_hook(d, request_id)]
-            }
-            download_name = f"video_{height}.mp4"
-
-        # 🔐 INLINE COOKIES
-        if request.method == 'POST':
-            temp_cookie = build_cookiefile_from_request(data)
-        else:
-            temp_cookie = build_cookiefile_from_request(request.args)
-            
-        if temp_cookie:
-            ydl_opts['cookiefile'] = temp_cookie
-        elif os.path.exists(COOKIE_FILE_PATH):
-            ydl_opts['cookiefile'] = COOKIE_FILE_PATH
+        entries = []
+        for url in urls:
+            entries.extend(expand_playlist(url, info_opts))
+    except Exception as e:
+        set_progress(request_id, {'status': 'error', 'error': str(e)})
+        return jsonify({'error': str(e)}), 500
+
+    entries = entries[:BULK_MAX_ITEMS]
+    if not entries:
+        return jsonify({'error': 'Nothing to download'}), 404
+
+    total = len(entries)
+    entry_ids = [f'{request_id}-{index}' for index in range(total)]
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+    def report(status, done, failed, stage):
+        set_progress(request_id, {
+            'status': status,
+            'progress': (done / total) * 100,
+            'stage': stage,
+            'completed': done - failed,
+            'failed': failed,
+            'total': total,
+            'entries': entry_ids,
+        })
+
+    report('starting', 0, 0, f'Queued {total} videos...')
+    client = client_id()
 
-        downloaded_file = next(
-            (os.path.join(DOWNLOAD_DIR, f) for f in os.listdir(DOWNLOAD_DIR) if f.startswith(temp_id)),
-            None
-        )
+    def generate():
+        finished = queue.Queue()
+        pending = list(enumerate(entries))
+        running = 0
+        done = 0
+        failures = []
+        archive = ZipStream()
 
-        if not downloaded_file:
-            return jsonify({'error': 'Download failed'}), 500
+        def start_next():
+            index, url = pending.pop(0)
+            entry_id = entry_ids[index]
+            set_progress(entry_id, {'status': 'starting', 'progress': 0, 'stage': 'Initializing...'})
+            try:
+                ydl_opts, download_name = build_download_options(url, height, audio_quality, cookies_txt=data.get('cookies'))
+                stored_file, flight = start_download(url, ydl_opts, entry_id, download_name, {'cookies': data.get('cookies')}, client=client)
+                key = download_key(url, ydl_opts)
+            except Exception as e:
+                finished.put((index, url, None, None, e))
+                return
 
-        download_progress[request_id] = {'status': 'completed', 'progress': 100}
+            if stored_file:
+                finished.put((index, url, key, stored_file, None))
+            else:
+                flight.add_done_callback(lambda f: finished.put((index, url, key, f.result, f.error)))
 
-        return send_file(downloaded_file, as_attachment=True, download_name=download_name)
+        try:
+            while pending or running:
+                # Keep at most BULK_MAX_PARALLEL entries of this batch in the worker pool
+                while pending and running < BULK_MAX_PARALLEL:
+                    start_next()
+                    running += 1
+
+                index, url, key, path, error = finished.get()
+                running -= 1
+                done += 1
+
+                if error is not None:
+                    failures.append(f'{url}: {error}')
+                else:
+                    arcname = f'{index + 1:03d}_{extract_video_id(url) or "video"}{os.path.splitext(path)[1]}'
+                    storage_manager.pin(key)
+                    try:
+                        for chunk in archive.add_file(arcname, path):
+                            served_bytes.inc(len(chunk), route='zip')
+                            yield chunk
+                    finally:
+                        storage_manager.unpin(key)
+
+                report('downloading', done, len(failures), f'Downloaded {done}/{total} videos')
+
+            if failures:
+                yield archive.add_text('errors.txt', '\n'.join(failures) + '\n')
+            yield archive.close()
+            report('completed', done, len(failures), 'Ready')
+        except Exception as e:
+            print(f"Bulk download error: {e}")
+            set_progress(request_id, {'status': 'error', 'error': str(e)})
+
+    label = f'audio_{audio_quality}' if audio_quality else f'video_{height}'
+    return Response(generate(), mimetype='application/zip', headers={
+        'Content-Disposition': f'attachment; filename="playlist_{label}.zip"',
+        'X-Accel-Buffering': 'no',
+    })
 
+# --- Async Job Endpoints ---
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue a download and return its job ID immediately"""
+    data, url, height, audio_quality = read_download_request()
+    job_id = data.get('id') or str(uuid.uuid4())
+
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+
+    set_progress(job_id, {
+        'status': 'starting',
+        'progress': 0,
+        'stage': 'Initializing...'
+    })
+
+    try:
+        ydl_opts, download_name = build_download_options(url, height, audio_quality, data.get('start'),
+                                                         data.get('end'), data.get('precise'), data.get('cookies'))
+        if 'download_ranges' not in ydl_opts:
+            prefetcher.record_choice(height, audio_quality)
+        profile = profile_requested(data.get('profile'))
+        stored_file, flight = start_download(url, ydl_opts, job_id, download_name, {'cookies': data.get('cookies')}, profile, client_id())
+        job_manager.register(Job(job_id, download_key(url, ydl_opts), download_name, flight=flight, file=stored_file))
+    except (ClipError, QualityError) as e:
+        set_progress(job_id, {'status': 'error', 'error': str(e)})
+        return jsonify({'error': str(e)}), 400
+    except AdmissionRejected as e:
+        return rejected_response(e, job_id)
+    except PermissionError as e:
+        set_progress(job_id, {'status': 'error', 'error': str(e)})
+        return jsonify({'error': str(e)}), 403
     except Exception as e:
-        download_progress[request_id] = {'status': 'error', 'error': str(e)}
+        set_progress(job_id, {'status': 'error', 'error': str(e)})
         return jsonify({'error': str(e)}), 500
 
-    finally:
-        if temp_cookie and os.path.exists(temp_cookie):
-            os.remove(temp_cookie)
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'file_url': f'/api/jobs/{job_id}/file',
+        'progress_url': f'/api/progress/{job_id}',
+    }), 202
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    return jsonify({
+        'job_id': job_id,
+        'state': job.state,
+        'error': job.error,
+        'download_name': job.download_name,
+        'file_url': f'/api/files/{job.key}' if job.state == 'completed' else None,
+        'progress': download_progress.get(job_id, {'status': 'unknown'}),
+        'pool': job_manager.stats(),
+    })
+
+@app.route('/api/jobs/<job_id>/file', methods=['GET'])
+def get_job_file(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    state = job.state
+    if state == 'error':
+        return jsonify({'error': job.error}), 500
+    if state != 'completed':
+        return jsonify({'error': 'Job not finished', 'state': state}), 409
+    if not os.path.exists(job.file):
+        return jsonify({'error': 'File no longer available'}), 410
+
+    return send_output(job.file, job.key, job.download_name)
+
+
+@app.route('/api/files/<key>', methods=['GET'])
+def get_file(key):
+    """Stable URL for a finished download; supports Range, If-Range and ETags"""
+    path = output_store.lookup(key)
+    if not path:
+        return jsonify({'error': 'File not found'}), 404
+
+    entry = output_store.entry(key) or {}
+    return send_output(path, key, entry.get('download_name') or os.path.basename(path))
+
+@app.route('/api/thumbnail/<video_id>', methods=['GET'])
+def get_thumbnail(video_id):
+    """Thumbnail from the disk cache (?size=popup|card|original) with an ETag and long-lived caching"""
+    size = request.args.get('size', 'card')
+    if extract_video_id(video_id) != video_id:
+        return jsonify({'error': 'Invalid video ID'}), 404
+    if size not in THUMBNAIL_SIZES and size != 'original':
+        return jsonify({'error': f"size must be one of {', '.join([*THUMBNAIL_SIZES, 'original'])}"}), 400
+
+    info = info_cache.peek(video_id)
+    source_url = (info or {}).get('thumbnail') or THUMBNAIL_FALLBACK_URL.format(video_id=video_id)
+    try:
+        path = thumbnail_cache.get(video_id, size, source_url)
+    except ThumbnailError as e:
+        count_error('thumbnail', e)
+        return jsonify({'error': str(e)}), 502
+
+    response = send_file(path, conditional=True, etag=True, max_age=THUMBNAIL_MAX_AGE)
+    response.cache_control.public = True
+    return response
 
 @app.route('/api/auth/check', methods=['GET'])
 def check_auth():
@@ -387,13 +1314,24 @@ def delete_cookies():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def start_background_tasks():
+    """Start the admission sampler, metrics publishing, prefetch expiry and periodic storage budget check (once per process)"""
+    threading.Thread(target=admission.run_sampler, daemon=True).start()
+    if metrics_store:
+        threading.Thread(target=metrics_store.run_periodically, args=(metrics.snapshot,), daemon=True).start()
+    if PREFETCH:
+        threading.Thread(target=prefetcher.run_periodically, args=(30,), daemon=True).start()
+        print(f"Speculative prefetch enabled ({PREFETCH_SLOTS} slot(s), {PREFETCH_RATE_MBPS:g} MB/s, {PREFETCH_TTL}s TTL)")
+    if STORAGE_BUDGET_BYTES:
+        storage_thread = threading.Thread(target=storage_manager.run_periodically, args=(STORAGE_CHECK_INTERVAL,), daemon=True)
+        storage_thread.start()
+        print(f"Started background storage check (budget {STORAGE_BUDGET_BYTES} bytes, runs every 5 minutes)")
+    else:
+        print("Storage budget DISABLED (keeping files forever)")
+
 if __name__ == '__main__':
-    # Start background cleanup thread
-    # cleanup_thread = threading.Thread(target=cleanup_old_files, daemon=True)
-    # cleanup_thread.start() # Disabled to keep files
-    print("Background file cleanup thread DISABLED (keeping files forever)")
-    print("Started background file cleanup thread (runs every 30 minutes)")
-    
+    start_background_tasks()
+
     # threaded=True is required so that the progress polling requests 
     # are not blocked by the main download request
     app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
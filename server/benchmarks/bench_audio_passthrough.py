@@ -0,0 +1,164 @@
+"""
+CPU cost of audio jobs: MP3 re-encoding vs native-stream passthrough.
+
+Generates real AAC (m4a) and Opus (webm) tracks with FFmpeg, serves them
+from a local HTTP server through a one-video extractor, and runs the
+same audio job with the options build_download_options uses for each
+path: FFmpegExtractAudio to MP3 at the requested bitrate, or the
+matching native format with a stream copy. Reports wall time and CPU
+seconds (this process plus FFmpeg children) per job.
+
+    python server/benchmarks/bench_audio_passthrough.py [--duration 600] [--jobs 3]
+"""
+import os
+import sys
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import threading
+import functools
+import subprocess
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp  # noqa: E402
+from yt_dlp.extractor.common import InfoExtractor  # noqa: E402
+from format_analysis import summarize_formats  # noqa: E402
+
+# (format_id, file, acodec, ext, FFmpeg encoder args) at 128 kbps like YouTube's 140 / 251
+TRACKS = [
+    ('140', 'track.m4a', 'mp4a.40.2', 'm4a', ['-c:a', 'aac', '-b:a', '128k']),
+    ('251', 'track.webm', 'opus', 'webm', ['-c:a', 'libopus', '-b:a', '128k']),
+]
+
+
+class BenchAudioIE(InfoExtractor):
+    IE_NAME = 'bench:audio'
+    _VALID_URL = r'bench://(?P<id>[\w-]+)'
+
+    base_url = None
+    directory = None
+    duration = 0
+
+    def _real_extract(self, url):
+        return {
+            'id': self._match_id(url),
+            'title': 'Benchmark track',
+            'duration': self.duration,
+            'formats': [{
+                'format_id': format_id, 'url': f'{self.base_url}/{filename}', 'vcodec': 'none',
+                'acodec': acodec, 'ext': ext, 'abr': 128,
+                'filesize': os.path.getsize(os.path.join(self.directory, filename)),
+            } for format_id, filename, acodec, ext, _ in TRACKS],
+        }
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def make_tracks(ffmpeg, directory, duration):
+    for _, filename, _, _, codec_args in TRACKS:
+        subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-f', 'lavfi',
+                        '-i', f'anoisesrc=d={duration}:c=pink:a=0.2:r=48000', '-ac', '2', *codec_args,
+                        os.path.join(directory, filename)], check=True)
+
+
+def transcode_options(audio_quality):
+    # What every audio request used before passthrough existed
+    return {
+        'format': 'bestaudio/best',
+        'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3',
+                            'preferredquality': audio_quality.replace('k', '')}],
+    }
+
+
+def passthrough_options(native):
+    bitrate = native['bitrate']
+    return {
+        'format': f"{native['format_id']}/bestaudio[abr>={bitrate - 8}][abr<{bitrate + 8}]",
+        'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'best'}],
+    }
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_job(out_dir, extra_opts, format_override=None):
+    ydl_opts = {
+        'outtmpl': os.path.join(out_dir, f'{time.perf_counter_ns()}.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        **extra_opts,
+    }
+    if format_override:
+        ydl_opts['format'] = format_override
+
+    cpu = cpu_seconds()
+    start = time.perf_counter()
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.add_info_extractor(BenchAudioIE())
+        info = ydl.extract_info('bench://track', ie_key='BenchAudio')
+    path = info['requested_downloads'][0]['filepath']
+    return time.perf_counter() - start, cpu_seconds() - cpu, os.path.splitext(path)[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=int, default=600, help='track length in seconds')
+    parser.add_argument('--jobs', type=int, default=3, help='jobs per mode (averaged)')
+    args = parser.parse_args()
+
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        sys.exit('FFmpeg is required (both to build the test tracks and for MP3 transcoding)')
+
+    media_dir = tempfile.mkdtemp(prefix='bench-audio-media-')
+    out_dir = tempfile.mkdtemp(prefix='bench-audio-out-')
+    make_tracks(ffmpeg, media_dir, args.duration)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=media_dir))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    BenchAudioIE.base_url = f'http://127.0.0.1:{server.server_port}'
+    BenchAudioIE.directory = media_dir
+    BenchAudioIE.duration = args.duration
+
+    # The entry /api/info would list for 128k, found the same way the app does
+    with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+        ydl.add_info_extractor(BenchAudioIE())
+        info = ydl.extract_info('bench://track', ie_key='BenchAudio', download=False, process=False)
+
+    print(f'{args.duration}s stereo track at 128 kbps, {args.jobs} jobs per mode')
+    print(f"  {'source':8} {'mode':22} {'output':7} {'wall s':>8} {'CPU s':>8}")
+    try:
+        for format_id, _, _, ext, _ in TRACKS:
+            only_this = {**info, 'formats': [f for f in info['formats'] if f['format_id'] == format_id]}
+            native = next(a for a in summarize_formats(only_this)[1] if a['quality'] == '128k')
+            results = {}
+            for mode, opts in (('mp3 transcode', transcode_options('128k')),
+                               ('passthrough', passthrough_options(native))):
+                runs = [run_job(out_dir, opts, format_override=format_id if mode == 'mp3 transcode' else None)
+                        for _ in range(args.jobs)]
+                wall = sum(r[0] for r in runs) / len(runs)
+                cpu = sum(r[1] for r in runs) / len(runs)
+                results[mode] = cpu
+                print(f'  {ext:8} {mode:22} {runs[0][2]:7} {wall:8.2f} {cpu:8.2f}')
+            saving = results['mp3 transcode'] / results['passthrough'] if results['passthrough'] else float('inf')
+            print(f'  {ext:8} {"CPU per job saved":22} {"":7} {"":8} {saving:7.1f}x')
+    finally:
+        server.shutdown()
+        shutil.rmtree(media_dir, ignore_errors=True)
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
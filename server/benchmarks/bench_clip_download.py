@@ -0,0 +1,225 @@
+"""
+Bytes transferred and wall time for a short clip of a long video vs the
+whole video.
+
+Generates a long H.264 video (keyframe every 2 s, index at the front like
+YouTube's MP4s) and a matching AAC track with FFmpeg. They are served by
+a local HTTP server with Range support, throttled per connection like
+YouTube. The same video is then downloaded three ways:
+
+  full     the whole video (what a clip cost before), merged by stream copy
+  clip     --start/--end only, cut by stream copy at keyframes (the default
+           for clip requests)
+  precise  the same range, re-encoded to cut on the exact frame (precise=1)
+
+Reports bytes served, wall time and the output length for each.
+
+    python server/benchmarks/bench_clip_download.py [--video-seconds 1800] [--start 600] [--end 630] [--mbps 2]
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp  # noqa: E402
+from yt_dlp.extractor.common import InfoExtractor  # noqa: E402
+from clips import parse_clip, clip_options  # noqa: E402
+
+CHUNK = 64 * 1024
+
+
+class BenchClipIE(InfoExtractor):
+    IE_NAME = 'bench:clip'
+    _VALID_URL = r'bench://clip/(?P<id>\w+)'
+
+    base_url = None
+    directory = None
+    duration = None
+
+    def _format(self, format_id, filename, **fields):
+        return {'format_id': format_id, 'url': f'{self.base_url}/{filename}',
+                'filesize': os.path.getsize(os.path.join(self.directory, filename)), **fields}
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        return {
+            'id': video_id,
+            'title': 'Benchmark clip',
+            'duration': self.duration,
+            'formats': [
+                self._format('140', 'audio.m4a', vcodec='none', acodec='mp4a.40.2', ext='m4a', abr=128),
+                self._format('136', 'video.mp4', vcodec='avc1.4d401f', acodec='none', ext='mp4',
+                             height=360, width=640, fps=30),
+            ],
+        }
+
+
+def make_handler(directory, bytes_per_second, counter):
+    class RangeHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            path = os.path.join(directory, os.path.basename(self.path))
+            if not os.path.isfile(path):
+                self.send_error(404)
+                return
+
+            size = os.path.getsize(path)
+            start, end, status = 0, size - 1, 200
+            match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                status = 206
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'video/mp4')
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Length', str(end - start + 1))
+            if status == 206:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.end_headers()
+
+            # Per-connection rate limit; FFmpeg closes the connection once it has the clip
+            with open(path, 'rb') as f:
+                f.seek(start)
+                remaining = end - start + 1
+                try:
+                    while remaining > 0:
+                        started = time.perf_counter()
+                        chunk = f.read(min(CHUNK, remaining))
+                        self.wfile.write(chunk)
+                        remaining -= len(chunk)
+                        counter.add(len(chunk))
+                        time.sleep(max(0, len(chunk) / bytes_per_second - (time.perf_counter() - started)))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+    return RangeHandler
+
+
+class ByteCounter:
+    def __init__(self):
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def add(self, n):
+        with self._lock:
+            self.total += n
+
+    def take(self):
+        with self._lock:
+            total, self.total = self.total, 0
+        return total
+
+
+def make_media(ffmpeg, directory, seconds):
+    def run(*args):
+        subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', *args], check=True)
+
+    run('-f', 'lavfi', '-i', 'testsrc=size=640x360:rate=30', '-t', str(seconds),
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '1M', '-g', '60', '-an',
+        '-movflags', '+faststart', os.path.join(directory, 'video.mp4'))
+    run('-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}', '-ac', '2',
+        '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', os.path.join(directory, 'audio.m4a'))
+
+
+def probe_duration(ffmpeg, path):
+    # `ffmpeg -i` prints the container duration and exits with an error (no output file)
+    stderr = subprocess.run([ffmpeg, '-hide_banner', '-i', path], capture_output=True, text=True).stderr
+    match = re.search(r'Duration: (\d+):(\d+):([\d.]+)', stderr)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def download(url, out_dir, name, clip=None):
+    ydl_opts = {
+        'format': '136+140',
+        'merge_output_format': 'mp4',
+        'outtmpl': os.path.join(out_dir, f'{name}.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+    }
+    if clip:
+        ydl_opts.update(clip_options(clip))
+    finished = []
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.add_post_hook(finished.append)
+        ydl.add_info_extractor(BenchClipIE())
+        ydl.extract_info(url, ie_key='BenchClip')
+    return finished[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--video-seconds', type=int, default=1800, help='length of the source video')
+    parser.add_argument('--start', default='600', help='clip start (seconds or [HH:]MM:SS)')
+    parser.add_argument('--end', default='630', help='clip end')
+    parser.add_argument('--mbps', type=float, default=2, help='per-connection speed in MB/s')
+    args = parser.parse_args()
+
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        sys.exit('FFmpeg is required (to build the media, merge and cut)')
+
+    media_dir = tempfile.mkdtemp(prefix='bench-clip-media-')
+    out_dir = tempfile.mkdtemp(prefix='bench-clip-out-')
+    print(f'Encoding a {args.video_seconds}s 360p test video...')
+    make_media(ffmpeg, media_dir, args.video_seconds)
+
+    counter = ByteCounter()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(media_dir, args.mbps * 1024 * 1024, counter))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    BenchClipIE.base_url = f'http://127.0.0.1:{server.server_port}'
+    BenchClipIE.directory = media_dir
+    BenchClipIE.duration = args.video_seconds
+
+    clip = parse_clip(args.start, args.end, duration=args.video_seconds)
+    source_mb = sum(os.path.getsize(os.path.join(media_dir, f)) for f in ('video.mp4', 'audio.m4a')) / 1024 ** 2
+    print(f"{source_mb:.0f} MB source, clip {clip['start']:g}-{clip['end']:g}s, "
+          f'{args.mbps:g} MB/s per connection, {os.cpu_count()} CPUs')
+    print(f"  {'mode':8} {'served MB':>10} {'wall s':>8} {'output s':>9} {'output MB':>10}")
+    try:
+        results = {}
+        for mode, mode_clip in (('full', None), ('clip', clip), ('precise', {**clip, 'precise': True})):
+            counter.take()
+            started = time.perf_counter()
+            path = download('bench://clip/source', out_dir, mode, mode_clip)
+            wall = time.perf_counter() - started
+            served = counter.take()
+            length = probe_duration(ffmpeg, path)
+            results[mode] = (served, wall)
+            print(f'  {mode:8} {served / 1024 ** 2:10.2f} {wall:8.2f} '
+                  f"{length if length is not None else float('nan'):9.2f} {os.path.getsize(path) / 1024 ** 2:10.2f}")
+        full_bytes, full_wall = results['full']
+        clip_bytes, clip_wall = results['clip']
+        print(f'  clip vs full: {full_bytes / max(clip_bytes, 1):.0f}x fewer bytes, {full_wall / clip_wall:.0f}x faster')
+    finally:
+        server.shutdown()
+        shutil.rmtree(media_dir, ignore_errors=True)
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Throughput benchmark for download_profiles.
+
+Starts a local HTTP server that serves a synthetic DASH manifest and its
+fragments with per-request latency and a per-connection bandwidth cap
+(roughly what a CDN edge looks like from one TCP connection), then
+downloads it with yt-dlp under yt-dlp's defaults and under each profile.
+
+    python server/benchmarks/bench_download_profiles.py [--fragments 60] [--fragment-kb 512]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp  # noqa: E402
+from download_profiles import load_profiles, profile_options  # noqa: E402
+
+MPD_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{duration}S"
+     minBufferTime="PT2S" profiles="urn:mpeg:dash:profile:isoff-on-demand:2011">
+  <Period>
+    <AdaptationSet mimeType="video/mp4" contentType="video">
+      <Representation id="v1" codecs="avc1.640028" bandwidth="{bandwidth}" width="1920" height="1080">
+        <SegmentTemplate media="seg-$Number$.m4s" initialization="init.mp4" startNumber="1" duration="2" timescale="1"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+
+def make_handler(fragments, fragment_size, latency, bytes_per_second):
+    payload = os.urandom(fragment_size)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path.endswith('.mpd'):
+                body = MPD_TEMPLATE.format(duration=fragments * 2,
+                                           bandwidth=fragment_size * 8 // 2).encode()
+                content_type = 'application/dash+xml'
+            elif self.path.endswith('init.mp4'):
+                body = b'\0' * 1024
+                content_type = 'video/mp4'
+            elif '/seg-' in self.path:
+                body = payload
+                content_type = 'video/mp4'
+            else:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+
+            # Throttle each connection in 64KB slices
+            step = 64 * 1024
+            for offset in range(0, len(body), step):
+                self.wfile.write(body[offset:offset + step])
+                if bytes_per_second:
+                    time.sleep(step / bytes_per_second)
+
+    return Handler
+
+
+def run(url, out_dir, extra_opts):
+    ydl_opts = {
+        'outtmpl': os.path.join(out_dir, '%(id)s.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'fixup': 'never',
+        'overwrites': True,
+        **extra_opts,
+    }
+    start = time.perf_counter()
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.download([url])
+    elapsed = time.perf_counter() - start
+    size = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+    shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fragments', type=int, default=60)
+    parser.add_argument('--fragment-kb', type=int, default=512)
+    parser.add_argument('--latency-ms', type=float, default=40, help='added to every request')
+    parser.add_argument('--conn-mbps', type=float, default=40, help='per-connection cap, 0 = unlimited')
+    args = parser.parse_args()
+
+    handler = make_handler(args.fragments, args.fragment_kb * 1024, args.latency_ms / 1000,
+                           args.conn_mbps * 1024 * 1024 / 8)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/manifest.mpd'
+
+    out_dir = tempfile.mkdtemp(prefix='bench-profiles-')
+    print(f'{args.fragments} x {args.fragment_kb}KB fragments, '
+          f'{args.latency_ms:.0f}ms latency, {args.conn_mbps:g} Mbit/s per connection')
+
+    try:
+        baseline, size = run(url, out_dir, {})
+        print(f'  {"yt-dlp defaults":16} {baseline:7.2f}s  {size / baseline / 1024 / 1024:7.2f} MB/s')
+        for name, profile in load_profiles(os.environ.get('DOWNLOAD_PROFILES')).items():
+            elapsed, size = run(url, out_dir, profile_options(profile))
+            print(f'  {name:16} {elapsed:7.2f}s  {size / elapsed / 1024 / 1024:7.2f} MB/s  ({baseline / elapsed:.2f}x)')
+    finally:
+        server.shutdown()
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+Micro-benchmark for format_analysis.summarize_formats.
+
+Checks summarize_formats against a golden fixture
+(fixtures/format_analysis_golden.json: synthetic info dicts and what the
+original three-pass code in get_video_info returned for them). The video
+heights and labels and every audio field must match it. The video ext
+and filesize_approx now follow the stream-copy merge plan, so those are
+checked to name a merge container and streams of the listed height
+instead. The fixture is written by the baseline code only; regenerate it
+with --update-golden after changing the synthetic info dicts. Then it
+times both on an info dict with thousands of formats.
+
+Like yt-dlp's, the synthetic formats are sorted worst to best, which
+summarize_formats relies on to rank only the last stream per codec.
+
+    python server/benchmarks/bench_format_analysis.py [--formats 5000] [--runs 20] [--update-golden]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from format_analysis import summarize_formats, MERGE_CONTAINERS  # noqa: E402
+
+GOLDEN_PATH = os.path.join(BENCH_DIR, 'fixtures', 'format_analysis_golden.json')
+
+HEIGHTS = [144, 240, 360, 480, 720, 1080, 1440, 2160, 4320]
+AUDIO_BITRATES = [48, 50, 64, 70, 96, 128, 129.5, 160, 192, 256]
+
+
+def legacy_summarize(info):
+    """The three-pass logic get_video_info used before format_analysis existed"""
+    duration_s = info.get('duration', 0)
+
+    formats = []
+    seen_heights = set()
+
+    best_audio_size = 0
+    for f in info.get('formats', []):
+        if f.get('acodec') != 'none' and f.get('vcodec') == 'none':
+            size = f.get('filesize') or f.get('filesize_approx') or 0
+            if size == 0 and f.get('abr') and duration_s > 0:
+                size = (f.get('abr') * 1024 * duration_s) / 8
+            if size > best_audio_size:
+                best_audio_size = size
+
+    for f in info.get('formats', []):
+        height = f.get('height')
+        if not height: continue
+        if f.get('vcodec') == 'none': continue
+
+        label = f"{height}p"
+        if height >= 4320: label = "8K (4320p)"
+        elif height >= 2160: label = "4K (2160p)"
+        elif height >= 1440: label = "2K (1440p)"
+        elif height >= 1080: label = "1080p(HD)"
+
+        if height not in seen_heights:
+            video_size = f.get('filesize') or f.get('filesize_approx') or 0
+            if video_size == 0 and duration_s > 0:
+                bitrate = f.get('tbr') or f.get('vbr')
+                if bitrate:
+                    video_size = (bitrate * 1024 * duration_s) / 8
+
+            total_size = 0
+            is_video_only = (f.get('acodec') == 'none')
+            if is_video_only:
+                if video_size > 0:
+                    total_size = video_size + best_audio_size
+            else:
+                total_size = video_size
+
+            formats.append({
+                'height': height,
+                'ext': 'mp4',
+                'label': label,
+                'filesize_approx': total_size
+            })
+            seen_heights.add(height)
+
+    formats.sort(key=lambda x: x['height'], reverse=True)
+
+    audio_formats = []
+    seen_audio_bitrates = set()
+    for f in info.get('formats', []):
+        if f.get('acodec') != 'none' and f.get('vcodec') == 'none':
+            abr = f.get('abr')
+            if not abr:
+                continue
+            rounded_abr = round(abr / 16) * 16
+            if rounded_abr not in seen_audio_bitrates:
+                audio_size = f.get('filesize') or f.get('filesize_approx') or 0
+                if audio_size == 0 and duration_s > 0:
+                    audio_size = (rounded_abr * 1024 * duration_s) / 8
+                audio_formats.append({
+                    'quality': f'{rounded_abr}k',
+                    'bitrate': rounded_abr,
+                    'ext': f.get('ext', 'm4a'),
+                    'label': f'{rounded_abr}kbps',
+                    'filesize_approx': audio_size
+                })
+                seen_audio_bitrates.add(rounded_abr)
+
+    audio_formats.sort(key=lambda x: x['bitrate'], reverse=True)
+    return formats, audio_formats
+
+
+# Fields the legacy code produced the same way (sizes and containers now
+# follow the stream picked for a stream-copy merge)
+VIDEO_FIELDS = ('height', 'label')
+AUDIO_FIELDS = ('quality', 'bitrate', 'ext', 'label', 'filesize_approx')
+
+
+def comparable(result):
+    formats, audio_formats = result
+    return ([{k: v[k] for k in VIDEO_FIELDS} for v in formats],
+            [{k: a[k] for k in AUDIO_FIELDS} for a in audio_formats])
+
+
+def synthetic_info(n_formats, seed=0):
+    """Info dict mixing video-only, progressive, audio-only and storyboard formats"""
+    rng = random.Random(seed)
+    formats = []
+    for i in range(n_formats):
+        kind = rng.random()
+        f = {'format_id': str(i)}
+        if kind < 0.5:
+            f.update(height=rng.choice(HEIGHTS), vcodec=rng.choice(['avc1.640028', 'vp09.00.40.08', 'av01.0.08M.08']),
+                     acodec='none', ext=rng.choice(['mp4', 'webm']), tbr=rng.uniform(100, 20000))
+        elif kind < 0.6:
+            f.update(height=rng.choice(HEIGHTS[:5]), vcodec='avc1.42001E', acodec='mp4a.40.2', ext='mp4',
+                     tbr=rng.uniform(300, 3000))
+        elif kind < 0.95:
+            f.update(vcodec='none', acodec=rng.choice(['opus', 'mp4a.40.2']), ext=rng.choice(['webm', 'm4a']),
+                     abr=rng.choice(AUDIO_BITRATES))
+        else:
+            f.update(height=rng.choice([45, 90]), vcodec='none', acodec='none', ext='mhtml')
+
+        # Roughly half the formats report a size, the rest need the bitrate fallback
+        if rng.random() < 0.5:
+            f['filesize'] = rng.randint(10 ** 5, 10 ** 9)
+        formats.append(f)
+
+    # yt-dlp hands formats over sorted worst to best: audio-only first, then by resolution and bitrate
+    formats.sort(key=lambda f: (f.get('vcodec') != 'none', f.get('height') or 0, f.get('tbr') or f.get('abr') or 0))
+    return {'id': 'synthetic', 'duration': rng.randint(30, 4 * 3600), 'formats': formats}
+
+
+def golden_cases():
+    """Info dicts of several shapes, including empty and tiny ones"""
+    return [synthetic_info(n, seed) for seed in range(5) for n in (0, 1, 10, 60)]
+
+
+def write_golden():
+    """The fixture is the baseline's output, never summarize_formats'"""
+    cases = []
+    for info in golden_cases():
+        formats, audio_formats = legacy_summarize(info)
+        cases.append({'info': info, 'formats': formats, 'audio_formats': audio_formats})
+    os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+    with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+        json.dump(cases, f, indent=1, sort_keys=True)
+        f.write('\n')
+    print(f'golden: wrote {len(cases)} cases from the legacy code to {GOLDEN_PATH}')
+
+
+def plan_problems(info, formats):
+    """Video entries whose merge plan doesn't fit the info dict"""
+    by_id = {f['format_id']: f for f in info['formats']}
+    containers = MERGE_CONTAINERS.split('/')
+    for entry in formats:
+        video = by_id.get(entry['format_id'])
+        audio = by_id.get(entry['audio_format_id'])
+        if entry['ext'] not in containers or entry['ext'] != entry['container']:
+            yield entry, f"container {entry['ext']!r}"
+        elif video is None or video.get('height') != entry['height'] or video.get('vcodec') == 'none':
+            yield entry, 'format_id is not a video stream of this height'
+        elif video.get('acodec') != 'none' and audio is not None:
+            yield entry, 'progressive stream merged with audio'
+        elif video.get('acodec') == 'none' and audio is not None and audio.get('vcodec') != 'none':
+            yield entry, 'audio_format_id is not an audio-only stream'
+
+
+def check_golden():
+    with open(GOLDEN_PATH, encoding='utf-8') as f:
+        cases = json.load(f)
+    for index, case in enumerate(cases):
+        formats, audio_formats = summarize_formats(case['info'])
+        # Round-trip through JSON so tuples and lists compare the same way
+        got = json.loads(json.dumps(comparable((formats, audio_formats))))
+        expected = comparable((case['formats'], case['audio_formats']))
+        for name, g_entries, e_entries in zip(('formats', 'audio_formats'), got, expected):
+            for position, (g, e) in enumerate(zip(g_entries, e_entries)):
+                if g != e:
+                    sys.exit(f'golden mismatch in case {index} {name}[{position}]:\n  got      {g}\n  expected {e}')
+            if len(g_entries) != len(e_entries):
+                sys.exit(f'golden mismatch in case {index} {name}: {len(g_entries)} entries, expected {len(e_entries)}')
+        for entry, problem in plan_problems(case['info'], formats):
+            sys.exit(f"bad merge plan in case {index} at {entry['height']}p: {problem}")
+    print(f'golden: {len(cases)} info dicts match the legacy output, with valid merge plans')
+
+
+def time_it(fn, info, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn(info)
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--formats', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--seeds', type=int, default=25, help='legacy comparisons to run')
+    parser.add_argument('--update-golden', action='store_true', help='rewrite the golden fixture from the legacy code')
+    args = parser.parse_args()
+
+    if args.update_golden:
+        write_golden()
+    check_golden()
+
+    # Same qualities as the legacy code on many random shapes, including tiny ones
+    for seed in range(args.seeds):
+        for n in (0, 1, 10, 200):
+            info = synthetic_info(n, seed)
+            result = comparable(summarize_formats(info))
+            assert result == comparable(legacy_summarize(info)), f'mismatch (seed={seed}, n={n})'
+    print(f'legacy: {args.seeds * 4} info dicts list the same qualities as the three-pass code')
+
+    info = synthetic_info(args.formats)
+    legacy = time_it(legacy_summarize, info, args.runs)
+    single = time_it(summarize_formats, info, args.runs)
+    print(f'{args.formats} formats, {args.runs} runs')
+    print(f'  legacy three-pass (no merge/passthrough planning): {legacy * 1000:8.3f} ms')
+    print(f'  single-pass summarize_formats:                     {single * 1000:8.3f} ms  ({single / legacy:.2f}x the legacy time)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Throughput of a mixed workload with download and post-processing in one
+worker pool vs the two-stage pipeline (DownloadPipeline).
+
+Generates a large H.264 video with an AAC track (standing in for a 4K
+job: long transfer, stream-copy merge) and a long AAC track (an audio
+job: short transfer, CPU-bound MP3 transcode) with FFmpeg. They are
+served from a local HTTP server throttled per connection like YouTube.
+The same interleaved batch of jobs then runs two ways with the same
+number of download slots:
+
+  combined  each worker downloads, then merges/transcodes on its own slot
+            (what every download did before the pipeline)
+  pipeline  download slots are freed as soon as a transfer ends, FFmpeg
+            runs on POSTPROCESS_WORKERS slots (default: CPU count)
+
+Reports the makespan, jobs per minute and mean latency per job kind.
+
+    python server/benchmarks/bench_postprocess_pipeline.py [--jobs 12] [--workers 4] [--mbps 2]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import functools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp  # noqa: E402
+from yt_dlp.extractor.common import InfoExtractor  # noqa: E402
+from pipeline import DownloadPipeline, deferred_postprocessing  # noqa: E402
+
+CHUNK = 64 * 1024
+
+
+class BenchMediaIE(InfoExtractor):
+    IE_NAME = 'bench:media'
+    _VALID_URL = r'bench://(?P<kind>video|audio)/(?P<id>\w+)'
+
+    base_url = None
+    directory = None
+
+    def _format(self, format_id, filename, **fields):
+        return {'format_id': format_id, 'url': f'{self.base_url}/{filename}',
+                'filesize': os.path.getsize(os.path.join(self.directory, filename)), **fields}
+
+    def _real_extract(self, url):
+        kind, video_id = self._match_valid_url(url).group('kind', 'id')
+        formats = [self._format('140', 'audio.m4a' if kind == 'audio' else 'video-audio.m4a',
+                                vcodec='none', acodec='mp4a.40.2', ext='m4a', abr=128)]
+        if kind == 'video':
+            formats.append(self._format('313', 'video.mp4', vcodec='avc1.640033', acodec='none',
+                                        ext='mp4', height=720, width=1280, fps=30))
+        return {'id': f'{kind}-{video_id}', 'title': f'Benchmark {kind}', 'formats': formats}
+
+
+def make_handler(directory, bytes_per_second):
+    class ThrottledHandler(SimpleHTTPRequestHandler):
+        def copyfile(self, source, outputfile):
+            # Per-connection rate limit, like YouTube's throttled media servers
+            while True:
+                started = time.perf_counter()
+                chunk = source.read(CHUNK)
+                if not chunk:
+                    return
+                outputfile.write(chunk)
+                if bytes_per_second:
+                    time.sleep(max(0, len(chunk) / bytes_per_second - (time.perf_counter() - started)))
+
+        def log_message(self, *args):
+            pass
+
+    return functools.partial(ThrottledHandler, directory=directory)
+
+
+def make_media(ffmpeg, directory, video_seconds, audio_seconds):
+    def run(*args):
+        subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', *args], check=True)
+
+    run('-f', 'lavfi', '-i', 'testsrc2=size=1280x720:rate=30', '-t', str(video_seconds),
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-qp', '10', '-an', os.path.join(directory, 'video.mp4'))
+    for filename, seconds in (('video-audio.m4a', video_seconds), ('audio.m4a', audio_seconds)):
+        run('-f', 'lavfi', '-i', f'anoisesrc=d={seconds}:c=pink:a=0.2:r=48000', '-ac', '2',
+            '-c:a', 'aac', '-b:a', '128k', os.path.join(directory, filename))
+
+
+def job_options(kind, out_dir):
+    ydl_opts = {
+        'outtmpl': os.path.join(out_dir, '%(id)s.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+    }
+    if kind == 'video':
+        ydl_opts.update({'format': '313+140', 'merge_output_format': 'mp4/webm/mkv'})
+    else:
+        ydl_opts.update({
+            'format': '140',
+            'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'mp3', 'preferredquality': '192'}],
+        })
+    return ydl_opts
+
+
+def run_job(url, kind, out_dir, pipeline, submitted):
+    def download(ydl):
+        ydl.add_info_extractor(BenchMediaIE())
+        ydl.extract_info(url, ie_key='BenchMedia')
+
+    if pipeline is None:
+        with yt_dlp.YoutubeDL(job_options(kind, out_dir)) as ydl:
+            download(ydl)
+    else:
+        with pipeline.job() as job, yt_dlp.YoutubeDL(job_options(kind, out_dir)) as ydl, \
+                deferred_postprocessing(ydl, job):
+            download(ydl)
+    return kind, time.perf_counter() - submitted
+
+
+def run_batch(mode, args, out_dir):
+    if mode == 'pipeline':
+        pipeline = DownloadPipeline(args.workers, args.postprocess_workers, args.queue)
+        threads = pipeline.max_jobs
+    else:
+        pipeline = None
+        threads = args.workers
+
+    kinds = ['video' if i % 2 == 0 else 'audio' for i in range(args.jobs)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(run_job, f'bench://{kind}/{mode}{i}', kind, out_dir, pipeline, started)
+                   for i, kind in enumerate(kinds)]
+        results = [f.result() for f in futures]
+    return time.perf_counter() - started, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=12, help='jobs per mode, alternating video and audio')
+    parser.add_argument('--workers', type=int, default=4, help='download slots (MAX_DOWNLOAD_WORKERS)')
+    parser.add_argument('--postprocess-workers', type=int, default=None, help='default: CPU count')
+    parser.add_argument('--queue', type=int, default=None, help='hand-off queue size (default: --workers)')
+    parser.add_argument('--mbps', type=float, default=2, help='per-connection speed in MB/s')
+    parser.add_argument('--video-seconds', type=int, default=20, help='length of the large video')
+    parser.add_argument('--audio-seconds', type=int, default=300, help='length of the audio track')
+    args = parser.parse_args()
+
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        sys.exit('FFmpeg is required (to build the media, merge and transcode)')
+
+    media_dir = tempfile.mkdtemp(prefix='bench-pipeline-media-')
+    out_dir = tempfile.mkdtemp(prefix='bench-pipeline-out-')
+    make_media(ffmpeg, media_dir, args.video_seconds, args.audio_seconds)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(media_dir, args.mbps * 1024 * 1024))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    BenchMediaIE.base_url = f'http://127.0.0.1:{server.server_port}'
+    BenchMediaIE.directory = media_dir
+
+    video_mb = sum(os.path.getsize(os.path.join(media_dir, f)) for f in ('video.mp4', 'video-audio.m4a')) / 1024 ** 2
+    audio_mb = os.path.getsize(os.path.join(media_dir, 'audio.m4a')) / 1024 ** 2
+    print(f'{args.jobs} jobs (video {video_mb:.0f} MB + merge, audio {audio_mb:.0f} MB + MP3 transcode), '
+          f'{args.workers} download slots, {args.mbps:g} MB/s per connection, {os.cpu_count()} CPUs')
+    print(f"  {'mode':10} {'makespan s':>11} {'jobs/min':>9} {'video s':>8} {'audio s':>8}")
+    try:
+        makespans = {}
+        for mode in ('combined', 'pipeline'):
+            makespan, results = run_batch(mode, args, out_dir)
+            makespans[mode] = makespan
+            latency = {kind: [t for k, t in results if k == kind] for kind in ('video', 'audio')}
+            print(f'  {mode:10} {makespan:11.2f} {len(results) / makespan * 60:9.1f} '
+                  f"{sum(latency['video']) / len(latency['video']):8.2f} "
+                  f"{sum(latency['audio']) / len(latency['audio']):8.2f}")
+        print(f"  throughput gain: {makespans['combined'] / makespans['pipeline']:.2f}x")
+    finally:
+        server.shutdown()
+        shutil.rmtree(media_dir, ignore_errors=True)
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Time from clicking download to having the file, with and without
+speculative prefetch.
+
+Runs app.py in-process (temporary working directory) against the stub
+YouTube extractor and the throttled synthetic media server from
+fake_youtube (progressive format only: its filler bytes can't be
+merged). Each simulated user looks a video up (/api/info), thinks for
+--think seconds, then downloads it with probability --downloads or
+leaves, which is what a wasted prefetch costs. Every mode uses fresh
+videos so nothing is served from the output store of an earlier mode.
+
+  off   PREFETCH disabled: the download starts on click
+  on    PREFETCH enabled: the likely format starts downloading after
+        /api/info, and the click claims it (finished or still running)
+
+Reports median and p90 click-to-file time, prefetch hits and the MB
+prefetched for nothing.
+
+    python server/benchmarks/bench_prefetch.py [--users 10] [--think 4] [--downloads 0.8] [--mbps 16]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_youtube import install_stub, start_media_server  # noqa: E402
+
+
+def run_mode(app, client, mode, args, rng):
+    app.PREFETCH = mode == 'on'
+    before = app.prefetcher.stats()
+    waits = []
+    for i in range(args.users):
+        url = f'https://www.youtube.com/watch?v={mode}{i:0{11 - len(mode)}d}'
+        client.post('/api/info', json={'url': url})
+        time.sleep(args.think)
+
+        if rng.random() >= args.downloads:
+            continue
+        started = time.perf_counter()
+        response = client.get('/api/download', query_string={'url': url, 'height': 360})
+        response.get_data()
+        waits.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            print(f'  {mode}: download {i} failed with {response.status_code}', file=sys.stderr)
+
+    # Let an unclaimed prefetch finish or stop before the next mode
+    while app.prefetcher.stats()['running']:
+        time.sleep(0.2)
+    app.prefetcher.ttl = 0
+    app.prefetcher.expire()
+    app.prefetcher.ttl = args.ttl
+    after = app.prefetcher.stats()
+    return waits, after['claimed'] - before['claimed'], after['started'] - before['started'], \
+        (after['wasted_bytes'] - before['wasted_bytes']) / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10, help='video lookups per mode')
+    parser.add_argument('--think', type=float, default=4, help='seconds between /api/info and the click')
+    parser.add_argument('--downloads', type=float, default=0.8, help='share of lookups followed by a download')
+    parser.add_argument('--mbps', type=float, default=16, help='media server speed per connection (Mbit/s)')
+    parser.add_argument('--scale', type=float, default=0.1, help='served size as a share of the real size')
+    parser.add_argument('--ttl', type=int, default=120, help='PREFETCH_TTL')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    server, media_url = start_media_server(mbps=args.mbps)
+    install_stub(media_url, scale=args.scale, progressive_only=True)
+
+    work_dir = tempfile.mkdtemp(prefix='bench-prefetch-')
+    os.environ.update(PREFETCH='1', PREFETCH_TTL=str(args.ttl))
+    os.chdir(work_dir)
+    # Quiet yt-dlp's own progress lines, which would drown the report
+    sys.stdout = open(os.devnull, 'w')
+    import app  # noqa: E402  (creates its directories in the working directory)
+    sys.stdout = sys.__stdout__
+    client = app.app.test_client()
+
+    print(f'{args.users} users per mode, {args.think:g}s think time, {args.downloads:.0%} of lookups downloaded, '
+          f'{args.mbps:g} Mbit/s per connection, PREFETCH_RATE_MBPS={app.PREFETCH_RATE_MBPS:g}')
+    print(f"  {'mode':5} {'median s':>9} {'p90 s':>7} {'hits':>6} {'wasted MB':>10}")
+    try:
+        for mode in ('off', 'on'):
+            rng = random.Random(args.seed)
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                waits, hits, started, wasted = run_mode(app, client, mode, args, rng)
+            finally:
+                sys.stdout = sys.__stdout__
+            p90 = statistics.quantiles(waits, n=10)[-1] if len(waits) > 1 else waits[0]
+            print(f'  {mode:5} {statistics.median(waits):9.2f} {p90:7.2f} {f"{hits}/{started}":>6} {wasted:10.1f}')
+    finally:
+        server.shutdown()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Time to first byte and peak disk use of a download: stream=1 vs the
+file path.
+
+Starts the throttled synthetic media server from fake_youtube and runs
+app.py (or app1.py) in a subprocess through serve_app.py, progressive
+format only (its filler bytes can't be muxed by FFmpeg). Each mode
+downloads the same --videos videos one after another over HTTP:
+
+  stream   /api/download with stream=1: bytes are piped to the client
+           as they arrive from upstream, nothing is written to disk
+  file     /api/download: the server downloads the whole file to
+           downloads/, then sends it
+
+Streaming runs first because it stores nothing, so the file path can't
+be served from the output store. Reports the median size, time to first
+byte, time to the last byte and peak growth of the bytes on disk under
+the server's working directory during a download (sampled every 20 ms).
+
+    python server/benchmarks/bench_streaming.py [--videos 5] [--height 720] [--mbps 40] [--app app]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import urllib.request
+from urllib.parse import urlencode
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_youtube import start_media_server  # noqa: E402
+from loadtest import free_port, wait_until_ready  # noqa: E402
+
+
+def disk_usage(root):
+    total = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass  # renamed or removed while walking
+    return total
+
+
+class DiskSampler(threading.Thread):
+    """Peak bytes under root above what was there when it started"""
+
+    def __init__(self, root, interval=0.02):
+        super().__init__(daemon=True)
+        self.root = root
+        self.interval = interval
+        self.baseline = disk_usage(root)
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, disk_usage(self.root) - self.baseline)
+            self.stopped.wait(self.interval)
+
+
+def fetch(base_url, app_name, video_id, height, stream):
+    """(seconds to first byte, seconds to last byte, bytes) of one download"""
+    params = {'url': f'https://www.youtube.com/watch?v={video_id}', 'height': height}
+    if stream:
+        params['stream'] = 1
+    if app_name == 'app':
+        request = urllib.request.Request(f'{base_url}/api/download?{urlencode(params)}')
+    else:
+        request = urllib.request.Request(f'{base_url}/api/download', data=json.dumps(params).encode(),
+                                         headers={'Content-Type': 'application/json'})
+    started = time.perf_counter()
+    first = None
+    size = 0
+    with urllib.request.urlopen(request, timeout=600) as response:
+        while True:
+            chunk = response.read1(64 * 1024)
+            if not chunk:
+                break
+            if first is None:
+                first = time.perf_counter() - started
+            size += len(chunk)
+    return first or 0.0, time.perf_counter() - started, size
+
+
+def run_mode(base_url, workdir, mode, args):
+    """(first byte s, last byte s, bytes, peak disk bytes) per download"""
+    results = []
+    for i in range(args.videos):
+        sampler = DiskSampler(workdir)
+        sampler.start()
+        try:
+            result = fetch(base_url, args.app, f'stream{i:05d}', args.height, stream=mode == 'stream')
+        finally:
+            sampler.stopped.set()
+            sampler.join()
+        results.append((*result, sampler.peak))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--app', default='app', choices=['app', 'app1'])
+    parser.add_argument('--videos', type=int, default=5, help='downloads per mode')
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--mbps', type=float, default=40, help='media server speed per connection (Mbit/s)')
+    parser.add_argument('--scale', type=float, default=0.1, help='served size as a share of the real size')
+    args = parser.parse_args()
+
+    server, media_url = start_media_server(mbps=args.mbps)
+    workdir = tempfile.mkdtemp(prefix='bench-streaming-')
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    # Outside workdir so the server's own output doesn't count as disk use
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'serve_app.py'), '--app', args.app, '--port', str(port),
+         '--workdir', workdir, '--media-url', media_url, '--scale', str(args.scale), '--progressive-only'],
+        stdout=log, stderr=subprocess.STDOUT)
+
+    print(f'{args.app}: {args.videos} downloads per mode at {args.height}p, {args.mbps:g} Mbit/s upstream')
+    print(f"  {'mode':7} {'MB':>6} {'TTFB s':>8} {'total s':>8} {'peak disk MB':>13}")
+    try:
+        wait_until_ready(base_url, proc)
+        # Streaming first: it stores nothing, so the file path then downloads the same videos afresh
+        for mode in ('stream', 'file'):
+            results = run_mode(base_url, workdir, mode, args)
+            ttfb, total, size, peak = (statistics.median(r[i] for r in results) for i in range(4))
+            print(f'  {mode:7} {size / 1024 ** 2:6.1f} {ttfb:8.2f} {total:8.2f} {peak / 1024 ** 2:13.1f}')
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Bytes and latency per thumbnail load: the full-size upstream image vs
+/api/thumbnail (cold, warm, and a browser revalidating its copy).
+
+Generates a 1280x720 JPEG (the size of YouTube's maxresdefault) with
+FFmpeg and serves it from a local image server that adds --latency ms
+per request, standing in for the upstream CDN. app.py runs in-process
+against it (THUMBNAIL_FALLBACK_URL), in a temporary working directory.
+Each mode loads the popup-size thumbnail of --videos videos --loads
+times in total:
+
+  upstream     every load fetches the full-size image from upstream
+  proxy cold   the first load per video fetches and resizes it
+  proxy warm   later loads are served from the disk cache
+  revalidate   a browser with the image cached sends If-None-Match (304)
+
+    python server/benchmarks/bench_thumbnail_proxy.py [--videos 10] [--loads 100] [--latency 80]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import functools
+import subprocess
+import urllib.request
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_handler(directory, latency, counter):
+    class UpstreamHandler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            counter.append(1)
+            time.sleep(latency)
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    return functools.partial(UpstreamHandler, directory=directory)
+
+
+def video_ids(count):
+    return [f'bench{i:06d}' for i in range(count)]
+
+
+def timed(fn, loads):
+    started = time.perf_counter()
+    sizes = [fn(i) for i in range(loads)]
+    return sum(sizes), (time.perf_counter() - started) / loads * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--videos', type=int, default=10, help='distinct videos')
+    parser.add_argument('--loads', type=int, default=100, help='thumbnail loads per mode')
+    parser.add_argument('--latency', type=float, default=80, help='upstream latency per request in ms')
+    args = parser.parse_args()
+
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        sys.exit('FFmpeg is required (to build the image and resize it)')
+
+    image_dir = tempfile.mkdtemp(prefix='bench-thumb-upstream-')
+    work_dir = tempfile.mkdtemp(prefix='bench-thumb-work-')
+    # Noise keeps the JPEG about as large as a real photo-like thumbnail
+    subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=1280x720',
+                    '-vf', 'noise=alls=8:allf=t', '-frames:v', '1', '-q:v', '4',
+                    os.path.join(image_dir, 'maxresdefault.jpg')], check=True)
+
+    upstream_requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(image_dir, args.latency / 1000, upstream_requests))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    upstream = f'http://127.0.0.1:{server.server_port}/maxresdefault.jpg'
+
+    os.environ['THUMBNAIL_FALLBACK_URL'] = upstream + '?v={video_id}'
+    os.chdir(work_dir)
+    import app  # noqa: E402  (creates its directories in the working directory)
+    client = app.app.test_client()
+
+    ids = video_ids(args.videos)
+    etags = {}
+
+    def direct(i):
+        with urllib.request.urlopen(f'{upstream}?v={ids[i % len(ids)]}') as response:
+            return len(response.read())
+
+    def proxied(i, revalidate=False):
+        video_id = ids[i % len(ids)]
+        headers = {'If-None-Match': etags[video_id]} if revalidate else {}
+        response = client.get(f'/api/thumbnail/{video_id}?size=popup', headers=headers)
+        etags[video_id] = response.headers.get('ETag')
+        return len(response.get_data())
+
+    print(f"{args.loads} loads of {args.videos} videos, upstream image "
+          f"{os.path.getsize(os.path.join(image_dir, 'maxresdefault.jpg')) / 1024:.0f} KB, "
+          f'{args.latency:g} ms upstream latency')
+    print(f"  {'mode':12} {'KB/load':>8} {'ms/load':>8} {'upstream':>9}")
+    try:
+        modes = (
+            ('upstream', direct, args.loads),
+            ('proxy cold', proxied, args.videos),
+            ('proxy warm', proxied, args.loads),
+            ('revalidate', functools.partial(proxied, revalidate=True), args.loads),
+        )
+        for mode, fn, loads in modes:
+            upstream_requests.clear()
+            total, ms = timed(fn, loads)
+            print(f'  {mode:12} {total / loads / 1024:8.1f} {ms:8.2f} {len(upstream_requests):9d}')
+    finally:
+        server.shutdown()
+        shutil.rmtree(image_dir, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Checks that app1.py keeps what one user's extension cookies unlock away
+from other users.
+
+Runs app1.py in-process (temporary working directory) with the stub
+YouTube extractor and the throttled synthetic media server from
+fake_youtube (progressive format only, so FFmpeg isn't needed). Submits
+concurrent /api/jobs for one video with cookie set A, without cookies
+and with A again, then checks that:
+
+  - the request without cookies gets a download of its own instead of
+    attaching to the running one made with A
+  - the second request with A attaches to the first one
+  - each finished file has its own /api/files/<key>, and a later request
+    without cookies is not served the file made with A
+  - /api/info results looked up with A are only served from the metadata
+    cache (memory or disk) to requests with A, and an earlier lookup
+    without cookies isn't served to requests with A
+
+Prints one line per check and exits non-zero if any fails.
+
+    python server/benchmarks/check_cookie_isolation.py
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_youtube import install_stub, start_media_server  # noqa: E402
+
+URL = 'https://www.youtube.com/watch?v=isolation01'
+INFO_URL = 'https://www.youtube.com/watch?v=isolation02'
+
+
+def cookie_text(value):
+    return f'# Netscape HTTP Cookie File\n.youtube.com\tTRUE\t/\tTRUE\t2000000000\tSID\t{value}\n'
+
+
+def main():
+    # Slow enough that the first download is still running when the others arrive
+    server, media_url = start_media_server(mbps=8)
+    install_stub(media_url, scale=0.01, progressive_only=True)
+
+    work_dir = tempfile.mkdtemp(prefix='check-cookies-')
+    os.chdir(work_dir)
+    # Quiet yt-dlp's own progress lines, which would drown the report
+    sys.stdout = open(os.devnull, 'w')
+    import app1  # noqa: E402  (creates its directories in the working directory)
+    sys.stdout = sys.__stdout__
+    client = app1.app.test_client()
+
+    failures = []
+
+    def check(name, ok, detail=''):
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}{f' ({detail})' if detail and not ok else ''}")
+        if not ok:
+            failures.append(name)
+
+    def submit(body):
+        response = client.post('/api/jobs', json={'url': URL, 'height': 360, **body})
+        return response.get_json()['job_id']
+
+    def wait(job_id):
+        while True:
+            job = client.get(f'/api/jobs/{job_id}').get_json()
+            if job['state'] in ('completed', 'failed'):
+                return job
+            time.sleep(0.1)
+
+    try:
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            first = submit({'cookies': cookie_text('a')})
+            anonymous = submit({})
+            again = submit({'cookies': cookie_text('a')})
+            in_flight = app1.downloads_in_flight.in_flight()
+            jobs = {job_id: wait(job_id) for job_id in (first, anonymous, again)}
+            response = client.post('/api/download', json={'url': URL, 'height': 360, 'id': 'later'})
+            response.get_data()
+        finally:
+            sys.stdout = sys.__stdout__
+
+        print('concurrent requests:')
+        check('all jobs completed', all(job['state'] == 'completed' for job in jobs.values()),
+              [job['error'] for job in jobs.values()])
+        check('a download per cookie set is in flight', in_flight == 2, f'{in_flight} in flight')
+        check('same cookies share a file', jobs[first]['file_url'] == jobs[again]['file_url'])
+        check('no cookies get a file of their own', jobs[anonymous]['file_url'] != jobs[first]['file_url'],
+              jobs[anonymous]['file_url'])
+
+        print('later requests:')
+        check('a request without cookies is not served the cookie file',
+              response.headers.get('Content-Location') != jobs[first]['file_url'],
+              response.headers.get('Content-Location'))
+
+        print('metadata cache:')
+        video_id = app1.extract_video_id(INFO_URL)
+
+        def lookup(body):
+            before = app1.info_cache.stats()
+            response = client.post('/api/info', json={'url': INFO_URL, **body})
+            after = app1.info_cache.stats()
+            return response.status_code, after['hits'] - before['hits']
+
+        status, _ = lookup({'cookies': cookie_text('a')})
+        check('lookup with cookies succeeds', status == 200, status)
+        check('the cookie result is not cached under the bare video ID', app1.info_cache.peek(video_id) is None)
+        check('nor on disk for another worker', app1.InfoCache(app1.info_cache.cache_dir).peek(video_id) is None)
+        check('a lookup without cookies misses the cache', lookup({}) == (200, 0))
+        check('a lookup with other cookies misses the cache', lookup({'cookies': cookie_text('b')}) == (200, 0))
+        check('a lookup with the same cookies hits the cache', lookup({'cookies': cookie_text('a')}) == (200, 1))
+    finally:
+        server.shutdown()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if failures:
+        sys.exit(f'{len(failures)} check(s) failed')
+    print('all checks passed')
+
+
+if __name__ == '__main__':
+    main()
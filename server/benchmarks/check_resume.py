@@ -0,0 +1,130 @@
+"""
+Checks resumable transfers of finished files: the Content-Location a
+download returns (/api/files/<key>) against Range, If-Range and
+If-None-Match.
+
+Runs app.py or app1.py in-process (temporary working directory) with the
+stub YouTube extractor and the synthetic media server from fake_youtube
+(progressive format only, so FFmpeg isn't needed), downloads one video
+and then checks that:
+
+  - Range gets a 206 with the matching Content-Range and bytes, a suffix
+    range the tail of the file, and a range past the end a 416
+  - If-Range with the file's ETag gets a 206, a stale ETag the whole
+    file with a 200
+  - If-None-Match with the ETag gets a 304 with no body
+  - none of these start a new download
+  - an unknown key gets a 404
+
+Prints one line per check and exits non-zero if any fails.
+
+    python server/benchmarks/check_resume.py [--app app|app1]
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_youtube import install_stub, start_media_server  # noqa: E402
+
+URL = 'https://www.youtube.com/watch?v=resume00001'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--app', choices=('app', 'app1'), default='app')
+    args = parser.parse_args()
+
+    server, media_url = start_media_server()
+    install_stub(media_url, scale=0.01, progressive_only=True)
+
+    work_dir = tempfile.mkdtemp(prefix='check-resume-')
+    os.chdir(work_dir)
+    # Quiet yt-dlp's own progress lines, which would drown the report
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        app = __import__(args.app)  # creates its directories in the working directory
+        client = app.app.test_client()
+        if args.app == 'app':
+            response = client.get('/api/download', query_string={'url': URL, 'height': 360})
+        else:
+            response = client.post('/api/download', json={'url': URL, 'height': 360})
+        body = response.get_data()
+    finally:
+        sys.stdout = sys.__stdout__
+
+    failures = []
+
+    def check(name, ok, detail=''):
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}{f' ({detail})' if detail and not ok else ''}")
+        if not ok:
+            failures.append(name)
+
+    def downloads():
+        stats = app.ydl_pool.stats()
+        return stats['created'] + stats['reused']
+
+    try:
+        file_url = response.headers.get('Content-Location')
+        etag = response.headers.get('ETag')
+        print(f'{args.app}: {len(body)} bytes from /api/download')
+        check('download succeeded', response.status_code == 200 and len(body) > 1000, response.status_code)
+        check('download points at /api/files/<key>', bool(file_url and file_url.startswith('/api/files/')), file_url)
+        check('download has an ETag and Accept-Ranges', bool(etag) and response.headers.get('Accept-Ranges') == 'bytes',
+              f"{etag}, {response.headers.get('Accept-Ranges')}")
+        if failures:
+            sys.exit('download failed, nothing to resume')
+        before = downloads()
+
+        print('Range:')
+        response = client.get(file_url, headers={'Range': 'bytes=100-199'})
+        check('Range gets 206', response.status_code == 206, response.status_code)
+        check('Content-Range matches', response.headers.get('Content-Range') == f'bytes 100-199/{len(body)}',
+              response.headers.get('Content-Range'))
+        check('body is the requested bytes', response.get_data() == body[100:200])
+        response = client.get(file_url, headers={'Range': 'bytes=-100'})
+        check('suffix range gets the last bytes', response.status_code == 206 and response.get_data() == body[-100:],
+              response.status_code)
+        response = client.get(file_url, headers={'Range': 'bytes=1000-'})
+        check('open range resumes to the end', response.status_code == 206 and response.get_data() == body[1000:],
+              response.status_code)
+        response = client.get(file_url, headers={'Range': f'bytes={len(body) + 10}-'})
+        check('range past the end gets 416', response.status_code == 416, response.status_code)
+
+        print('If-Range:')
+        response = client.get(file_url, headers={'Range': 'bytes=1000-', 'If-Range': etag})
+        check('matching If-Range gets 206', response.status_code == 206 and response.get_data() == body[1000:],
+              response.status_code)
+        response = client.get(file_url, headers={'Range': 'bytes=1000-', 'If-Range': '"stale"'})
+        check('stale If-Range gets the whole file (200)', response.status_code == 200 and response.get_data() == body,
+              response.status_code)
+
+        print('If-None-Match:')
+        response = client.get(file_url, headers={'If-None-Match': etag})
+        check('matching If-None-Match gets 304', response.status_code == 304 and not response.get_data(),
+              response.status_code)
+        response = client.get(file_url, headers={'If-None-Match': '"stale"'})
+        check('stale If-None-Match gets 200', response.status_code == 200 and response.get_data() == body,
+              response.status_code)
+
+        print('other:')
+        check('no new download was started', downloads() == before, f'{downloads() - before} started')
+        response = client.get('/api/files/unknown')
+        check('unknown key gets 404', response.status_code == 404, response.status_code)
+    finally:
+        server.shutdown()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if failures:
+        sys.exit(f'{len(failures)} check(s) failed')
+    print('all checks passed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Checks /api/thumbnail and the thumbnail disk cache against a local image
+server, standing in for the upstream CDN.
+
+Generates a 1280x720 and a 320x180 JPEG with FFmpeg and runs app.py
+in-process (temporary working directory) with THUMBNAIL_FALLBACK_URL
+pointing at them. Checks that:
+
+  - popup and card sizes are resized by FFmpeg to 480 / 960 px wide,
+    original is the upstream image byte for byte, and a small image is
+    never upscaled
+  - each video is fetched from upstream once, later sizes and loads come
+    from the cache
+  - a revalidation with the ETag gets a 304 with no body, a stale ETag
+    the image, and responses carry Cache-Control: public, max-age
+  - without FFmpeg every size is the original image
+  - malformed video IDs get a 404 and never reach upstream, an unknown
+    size a 400, and an upstream failure a 502
+
+Prints one line per check and exits non-zero if any fails.
+
+    python server/benchmarks/check_thumbnail_proxy.py
+"""
+import os
+import sys
+import shutil
+import struct
+import tempfile
+import threading
+import functools
+import subprocess
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_handler(directory, requests):
+    class UpstreamHandler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    return functools.partial(UpstreamHandler, directory=directory)
+
+
+def jpeg_size(data):
+    """(width, height) from a JPEG's start-of-frame marker, None if it isn't a JPEG"""
+    if data[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xff:
+            return None
+        marker = data[i + 1]
+        length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def make_image(ffmpeg, path, size):
+    subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', f'testsrc2=size={size}',
+                    '-frames:v', '1', '-q:v', '4', path], check=True)
+
+
+def main():
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        sys.exit('FFmpeg is required (to build the images and resize them)')
+
+    image_dir = tempfile.mkdtemp(prefix='check-thumb-upstream-')
+    work_dir = tempfile.mkdtemp(prefix='check-thumb-work-')
+    make_image(ffmpeg, os.path.join(image_dir, 'large.jpg'), '1280x720')
+    make_image(ffmpeg, os.path.join(image_dir, 'small.jpg'), '320x180')
+    with open(os.path.join(image_dir, 'large.jpg'), 'rb') as f:
+        large = f.read()
+
+    upstream_requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(image_dir, upstream_requests))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    upstream = f'http://127.0.0.1:{server.server_port}'
+
+    # The video ID picks the image: check0small gets the small one, an ID
+    # starting with "missing" a 404 from upstream
+    os.environ['THUMBNAIL_FALLBACK_URL'] = upstream + '/{video_id}.jpg'
+    for name in ('check000000', 'check000001', 'check000002'):
+        os.link(os.path.join(image_dir, 'large.jpg'), os.path.join(image_dir, f'{name}.jpg'))
+    os.link(os.path.join(image_dir, 'small.jpg'), os.path.join(image_dir, 'check0small.jpg'))
+    os.chdir(work_dir)
+    import app  # noqa: E402  (creates its directories in the working directory)
+    client = app.app.test_client()
+
+    failures = []
+
+    def check(name, ok, detail=''):
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}{f' ({detail})' if detail and not ok else ''}")
+        if not ok:
+            failures.append(name)
+
+    def load(video_id, size=None, headers=None):
+        query = f'?size={size}' if size else ''
+        return client.get(f'/api/thumbnail/{video_id}{query}', headers=headers or {})
+
+    try:
+        print('resize (FFmpeg):')
+        for size, width in (('popup', 480), ('card', 960), (None, 960)):
+            response = load('check000000', size)
+            dims = jpeg_size(response.get_data())
+            check(f"{size or 'default'} is {width} px wide", response.status_code == 200 and dims == (width, width * 9 // 16),
+                  f'{response.status_code}, {dims}')
+        response = load('check000000', 'original')
+        check('original is the upstream image', response.get_data() == large)
+        response = load('check0small', 'card')
+        check('a small image is not upscaled', jpeg_size(response.get_data()) == (320, 180),
+              jpeg_size(response.get_data()))
+
+        print('cache:')
+        check('one upstream fetch per video', upstream_requests == ['/check000000.jpg', '/check0small.jpg'],
+              upstream_requests)
+        upstream_requests.clear()
+        for _ in range(3):
+            load('check000000', 'popup')
+        check('later loads stay off upstream', not upstream_requests, upstream_requests)
+
+        print('revalidation:')
+        response = load('check000001', 'popup')
+        etag = response.headers.get('ETag')
+        check('response has an ETag', bool(etag))
+        check('Cache-Control is public with max-age', response.cache_control.public and
+              response.cache_control.max_age == app.THUMBNAIL_MAX_AGE, response.headers.get('Cache-Control'))
+        response = load('check000001', 'popup', {'If-None-Match': etag})
+        check('matching If-None-Match gets 304', response.status_code == 304 and not response.get_data(),
+              response.status_code)
+        response = load('check000001', 'popup', {'If-None-Match': '"stale"'})
+        check('stale If-None-Match gets the image', response.status_code == 200 and jpeg_size(response.get_data()),
+              response.status_code)
+
+        print('without FFmpeg:')
+        app.thumbnail_cache.ffmpeg_path = lambda: None
+        response = load('check000002', 'popup')
+        check('popup is the original image', response.get_data() == large)
+        app.thumbnail_cache.ffmpeg_path = app.get_ffmpeg_path
+
+        print('rejection:')
+        upstream_requests.clear()
+        for video_id in ('short', 'check0000000', 'check00000!', '..'):
+            response = load(video_id)
+            check(f'{video_id!r} gets 404', response.status_code == 404, response.status_code)
+        check('bad IDs never reach upstream', not upstream_requests, upstream_requests)
+        response = load('check000000', 'huge')
+        check('unknown size gets 400', response.status_code == 400, response.status_code)
+        response = load('missing0000')
+        check('upstream failure gets 502', response.status_code == 502, response.status_code)
+    finally:
+        server.shutdown()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(image_dir, ignore_errors=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if failures:
+        sys.exit(f'{len(failures)} check(s) failed')
+    print('all checks passed')
+
+
+if __name__ == '__main__':
+    main()
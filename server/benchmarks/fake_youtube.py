@@ -0,0 +1,188 @@
+"""
+Offline stand-ins for YouTube, used by the load test:
+
+- StubYoutubeIE: a yt-dlp extractor that claims YouTube URLs and returns
+  realistic info dicts (DASH video-only and audio-only formats plus a
+  progressive one) whose URLs point at the local media server.
+- A local HTTP media server that serves deterministic synthetic streams
+  at a configurable per-connection speed, with Range support so yt-dlp's
+  chunked downloads work.
+
+install_stub() patches yt_dlp.YoutubeDL in the current process only.
+"""
+import re
+import time
+import random
+import shutil
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+
+# (format_id, height, vcodec, acodec, ext, tbr kbps) modelled on a typical YouTube video
+VIDEO_FORMATS = [
+    ('160', 144, 'avc1.4d400c', 'none', 'mp4', 110),
+    ('133', 240, 'avc1.4d4015', 'none', 'mp4', 250),
+    ('134', 360, 'avc1.4d401e', 'none', 'mp4', 600),
+    ('135', 480, 'avc1.4d401f', 'none', 'mp4', 1100),
+    ('136', 720, 'avc1.4d401f', 'none', 'mp4', 2300),
+    ('137', 1080, 'avc1.640028', 'none', 'mp4', 4500),
+    ('248', 1080, 'vp9', 'none', 'webm', 3000),
+]
+AUDIO_FORMATS = [
+    ('139', 'mp4a.40.5', 'm4a', 49),
+    ('140', 'mp4a.40.2', 'm4a', 129),
+    ('251', 'opus', 'webm', 135),
+]
+PROGRESSIVE_FORMAT = ('18', 360, 'avc1.42001E', 'mp4a.40.2', 'mp4', 500)
+
+CHUNK = 64 * 1024
+
+
+class StubYoutubeIE(InfoExtractor):
+    IE_NAME = 'stub:youtube'
+    _VALID_URL = r'https?://(?:www\.)?(?:youtube\.com|youtu\.be)/.+'
+
+    # Set by install_stub()
+    media_url = None
+    scale = 0.01
+    progressive_only = False
+
+    def _real_extract(self, url):
+        playlist = parse_qs(urlparse(url).query).get('list')
+        if playlist and 'v=' not in url:
+            return self.playlist_result(
+                [self.url_result(f'https://www.youtube.com/watch?v={playlist[0][:6]}{i:05d}', StubYoutubeIE)
+                 for i in range(10)], playlist[0], f'Playlist {playlist[0]}')
+
+        match = re.search(r'(?:v=|youtu\.be/|shorts/|embed/)([\w-]{11})', url)
+        video_id = match.group(1) if match else 'stubvideo00'
+        rng = random.Random(video_id)
+        duration = rng.randint(60, 20 * 60)
+
+        def media(format_id, tbr):
+            # Real size from bitrate x duration, served scaled down so runs stay short
+            size = max(int(tbr * 1024 * duration / 8 * self.scale), 1024)
+            return {
+                'url': f'{self.media_url}/media/{video_id}/{format_id}?size={size}',
+                'filesize': size,
+                'tbr': tbr,
+            }
+
+        formats = []
+        if not self.progressive_only:
+            for format_id, height, vcodec, acodec, ext, tbr in VIDEO_FORMATS:
+                formats.append({'format_id': format_id, 'height': height, 'width': height * 16 // 9,
+                                'vcodec': vcodec, 'acodec': acodec, 'ext': ext, 'vbr': tbr, **media(format_id, tbr)})
+            for format_id, acodec, ext, abr in AUDIO_FORMATS:
+                formats.append({'format_id': format_id, 'vcodec': 'none', 'acodec': acodec, 'ext': ext,
+                                'abr': abr, **media(format_id, abr)})
+
+        format_id, height, vcodec, acodec, ext, tbr = PROGRESSIVE_FORMAT
+        formats.append({'format_id': format_id, 'height': height, 'width': 640, 'vcodec': vcodec,
+                        'acodec': acodec, 'ext': ext, **media(format_id, tbr)})
+
+        return {
+            'id': video_id,
+            'title': f'Synthetic video {video_id}',
+            'uploader': 'Benchmark Channel',
+            'duration': duration,
+            'thumbnail': f'{self.media_url}/thumb/{video_id}.jpg',
+            'formats': formats,
+        }
+
+
+def install_stub(media_url, scale=0.01, progressive_only=None):
+    """
+    Make every YoutubeDL in this process try StubYoutubeIE first.
+    Without FFmpeg only the progressive format is offered, since merges
+    and audio extraction can't run.
+    """
+    StubYoutubeIE.media_url = media_url.rstrip('/')
+    StubYoutubeIE.scale = scale
+    StubYoutubeIE.progressive_only = shutil.which('ffmpeg') is None if progressive_only is None else progressive_only
+
+    original = yt_dlp.YoutubeDL.add_default_info_extractors
+
+    def add_default_info_extractors(self):
+        self.add_info_extractor(StubYoutubeIE())
+        original(self)
+
+    yt_dlp.YoutubeDL.add_default_info_extractors = add_default_info_extractors
+
+
+def make_media_handler(bytes_per_second, latency):
+    class MediaHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            parsed = urlparse(self.path)
+            if parsed.path.startswith('/thumb/'):
+                self._send_bytes(b'\xff\xd8\xff\xe0' + b'\0' * 4096, 'image/jpeg')
+                return
+            if not parsed.path.startswith('/media/'):
+                self.send_error(404)
+                return
+
+            size = int(parse_qs(parsed.query).get('size', ['1048576'])[0])
+            start, end = 0, size - 1
+            status = 200
+            match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+            if match:
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                else:
+                    start = max(size - int(match.group(2)), 0)
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                status = 206
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'video/mp4')
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Length', str(end - start + 1))
+            if status == 206:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.end_headers()
+
+            # Deterministic filler; only the length matters to the app
+            block = bytes(range(256)) * (CHUNK // 256)
+            remaining = end - start + 1
+            try:
+                while remaining > 0:
+                    n = min(CHUNK, remaining)
+                    self.wfile.write(block[:n])
+                    remaining -= n
+                    if bytes_per_second:
+                        time.sleep(n / bytes_per_second)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def _send_bytes(self, body, content_type):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return MediaHandler
+
+
+def start_media_server(mbps=0, latency_ms=0, host='127.0.0.1', port=0):
+    """Serve synthetic media in a background thread; returns (server, base_url)"""
+    handler = make_media_handler(mbps * 1024 * 1024 / 8, latency_ms / 1000)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_port}'
@@ -0,0 +1,278 @@
+"""
+Offline load test for app.py and app1.py.
+
+Starts the synthetic media server, runs each app in a subprocess with
+the stub YouTube extractor, and drives mixed /api/info, /api/download
+and /api/progress polling traffic at a fixed concurrency. Reports
+throughput, p50/p99 latency per request type, peak RSS and open file
+descriptors of the server process. No network access is needed.
+
+    python server/benchmarks/loadtest.py [--apps app,app1] [--concurrency 8] [--duration 30]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from urllib.parse import urlencode
+
+import psutil
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_youtube import start_media_server  # noqa: E402
+
+HEIGHTS = [360, 720, 1080]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class Recorder:
+    """Latencies and errors per request type, shared by all driver threads"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, op, seconds, ok=True, nbytes=0):
+        with self._lock:
+            self.latencies.setdefault(op, []).append(seconds)
+            self.bytes += nbytes
+            if not ok:
+                self.errors[op] = self.errors.get(op, 0) + 1
+
+
+class ResourceSampler(threading.Thread):
+    """Polls RSS and open file descriptors of the server and its children (FFmpeg)"""
+
+    def __init__(self, pid, interval=0.2):
+        super().__init__(daemon=True)
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_fds = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            rss = fds = 0
+            try:
+                for proc in [self.process] + self.process.children(recursive=True):
+                    rss += proc.memory_info().rss
+                    fds += proc.num_fds() if hasattr(proc, 'num_fds') else proc.num_handles()
+            except psutil.Error:
+                pass
+            self.peak_rss = max(self.peak_rss, rss)
+            self.peak_fds = max(self.peak_fds, fds)
+            self.stopped.wait(self.interval)
+
+
+class LoadDriver:
+    def __init__(self, base_url, args):
+        self.base_url = base_url
+        self.args = args
+        self.recorder = Recorder()
+        self.video_ids = [f'bench{i:06d}' for i in range(args.videos)]
+        self.mix = [(op, int(weight)) for op, weight in (part.split('=') for part in args.mix.split(','))]
+
+    def _url(self):
+        return f'https://www.youtube.com/watch?v={random.choice(self.video_ids)}'
+
+    def _request(self, op, path, body=None, stream=False):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        start = time.perf_counter()
+        nbytes = 0
+        ok = True
+        try:
+            with urllib.request.urlopen(req, timeout=self.args.timeout) as resp:
+                if stream:
+                    while True:
+                        chunk = resp.read(256 * 1024)
+                        if not chunk:
+                            break
+                        nbytes += len(chunk)
+                    payload = None
+                else:
+                    payload = resp.read()
+        except Exception:
+            ok = False
+            payload = None
+        self.recorder.add(op, time.perf_counter() - start, ok, nbytes)
+        return payload
+
+    def info(self):
+        self._request('info', '/api/info', {'url': self._url()})
+
+    def download(self):
+        request_id = str(uuid.uuid4())
+        done = threading.Event()
+
+        def poll():
+            # What the web client does while a download runs
+            while not done.wait(self.args.poll_interval):
+                payload = self._request('progress', f'/api/progress/{request_id}')
+                if payload and json.loads(payload).get('status') in ('completed', 'error'):
+                    break
+
+        poller = threading.Thread(target=poll, daemon=True)
+        poller.start()
+        query = urlencode({'url': self._url(), 'height': random.choice(HEIGHTS), 'id': request_id})
+        self._request('download', f'/api/download?{query}', stream=True)
+        done.set()
+        poller.join()
+
+    def worker(self, deadline):
+        ops = [op for op, weight in self.mix for _ in range(weight)]
+        while time.time() < deadline:
+            getattr(self, random.choice(ops))()
+
+    def run(self):
+        deadline = time.time() + self.args.duration
+        threads = [threading.Thread(target=self.worker, args=(deadline,)) for _ in range(self.args.concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start
+
+
+def wait_until_ready(base_url, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            urllib.request.urlopen(base_url + '/api/cache/stats', timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError('server did not come up')
+
+
+def bench_app(app_name, media_url, args):
+    workdir = tempfile.mkdtemp(prefix=f'loadtest-{app_name}-')
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'serve_app.py'), '--app', app_name, '--port', str(port),
+         '--workdir', workdir, '--media-url', media_url, '--scale', str(args.scale)],
+        stdout=log, stderr=subprocess.STDOUT)
+
+    try:
+        wait_until_ready(base_url, proc)
+        sampler = ResourceSampler(proc.pid)
+        sampler.start()
+        driver = LoadDriver(base_url, args)
+        elapsed = driver.run()
+        sampler.stopped.set()
+        sampler.join()
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    rec = driver.recorder
+    total = sum(len(v) for v in rec.latencies.values())
+    return {
+        'app': app_name,
+        'elapsed': elapsed,
+        'requests': total,
+        'throughput': total / elapsed if elapsed else 0,
+        'mb_per_s': rec.bytes / elapsed / 1024 / 1024 if elapsed else 0,
+        'peak_rss_mb': sampler.peak_rss / 1024 / 1024,
+        'peak_fds': sampler.peak_fds,
+        'ops': {op: {
+            'count': len(values),
+            'errors': rec.errors.get(op, 0),
+            'p50': percentile(values, 50),
+            'p99': percentile(values, 99),
+            'max': max(values),
+        } for op, values in sorted(rec.latencies.items())},
+        'workdir': workdir if args.keep else None,
+    }
+
+
+def print_report(results):
+    for r in results:
+        print(f"\n== {r['app']}: {r['requests']} requests in {r['elapsed']:.1f}s "
+              f"({r['throughput']:.1f} req/s, {r['mb_per_s']:.1f} MB/s delivered)")
+        print(f"   peak RSS {r['peak_rss_mb']:.1f} MB, peak open fds {r['peak_fds']}")
+        print(f"   {'request':10} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for op, s in r['ops'].items():
+            print(f"   {op:10} {s['count']:7d} {s['errors']:7d} {s['p50'] * 1000:9.1f} "
+                  f"{s['p99'] * 1000:9.1f} {s['max'] * 1000:9.1f}")
+        if r['workdir']:
+            print(f"   server log and files kept in {r['workdir']}")
+
+    if len(results) > 1:
+        print('\n== comparison')
+        print(f"   {'app':6} {'req/s':>8} {'RSS MB':>8} {'fds':>5} " +
+              ' '.join(f'{op + " p99":>14}' for op in results[0]['ops']))
+        for r in results:
+            print(f"   {r['app']:6} {r['throughput']:8.1f} {r['peak_rss_mb']:8.1f} {r['peak_fds']:5d} " +
+                  ' '.join(f"{r['ops'].get(op, {}).get('p99', 0) * 1000:12.1f}ms" for op in results[0]['ops']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--apps', default='app,app1', help='comma separated: app, app1')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='seconds per app')
+    parser.add_argument('--mix', default='info=5,download=3', help='weights per request type')
+    parser.add_argument('--videos', type=int, default=20, help='distinct video IDs (fewer = more cache hits)')
+    parser.add_argument('--media-mbps', type=float, default=100, help='per-connection speed of the media server')
+    parser.add_argument('--media-latency-ms', type=float, default=20)
+    parser.add_argument('--scale', type=float, default=0.005, help='fraction of the real stream size to serve')
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--keep', action='store_true', help='keep each run\'s working directory')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    media_server, media_url = start_media_server(args.media_mbps, args.media_latency_ms)
+    try:
+        results = [bench_app(name.strip(), media_url, args) for name in args.apps.split(',')]
+    finally:
+        media_server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Run app.py or app1.py with the offline YouTube stub installed.
+Started as a subprocess by loadtest.py so its memory and file
+descriptors can be measured on their own.
+
+    python server/benchmarks/serve_app.py --app app --port 5001 --workdir /tmp/x --media-url http://127.0.0.1:8000
+"""
+import os
+import sys
+import argparse
+import importlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_youtube import install_stub  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--app', default='app', choices=['app', 'app1'])
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--workdir', required=True, help='downloads/ and cache/ are created here')
+    parser.add_argument('--media-url', required=True)
+    parser.add_argument('--scale', type=float, default=0.01, help='fraction of the real stream size to serve')
+    parser.add_argument('--progressive-only', action='store_true', help='offer only the progressive format, even with FFmpeg')
+    args = parser.parse_args()
+
+    # The apps keep downloads/ and cache/ under the working directory
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)
+    install_stub(args.media_url, args.scale, progressive_only=args.progressive_only or None)
+
+    module = importlib.import_module(args.app)
+
+    from werkzeug.serving import run_simple
+    run_simple('127.0.0.1', args.port, module.app, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
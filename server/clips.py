@@ -0,0 +1,88 @@
+"""
+Helpers for clip downloads: a start/end time range of a video. yt-dlp
+hands ranged downloads to FFmpeg, which seeks with HTTP range requests
+and reads only the part of each stream that covers the clip.
+"""
+from yt_dlp.utils import download_range_func, parse_duration
+
+
+class ClipError(ValueError):
+    """A start/end pair that doesn't describe a usable clip"""
+
+
+def parse_timestamp(value):
+    """Seconds from a number or a '90', '90.5', '1:30', '1:02:03.5' string; None if empty"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = float(value)
+    else:
+        seconds = parse_duration(str(value).strip())
+    if seconds is None or seconds < 0:
+        raise ClipError(f'Invalid timestamp: {value}')
+    return seconds
+
+
+def parse_flag(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def parse_clip(start, end, precise=False, duration=None):
+    """
+    Return {'start', 'end', 'precise'} for a requested range, or None when
+    neither bound is given (the whole video). A missing start means 0, a
+    missing end the end of the video; end is clamped to duration if known.
+    """
+    start, end = parse_timestamp(start), parse_timestamp(end)
+    if start is None and end is None:
+        return None
+
+    start = start or 0
+    if duration:
+        if start >= duration:
+            raise ClipError(f'Clip starts after the end of the video ({duration:g}s)')
+        end = duration if end is None else min(end, duration)
+    if end is not None and end <= start:
+        raise ClipError('Clip end must be after its start')
+    return {'start': start, 'end': end, 'precise': parse_flag(precise)}
+
+
+def clip_options(clip):
+    """
+    yt-dlp options that download only the clip. Cuts are stream copies at
+    the nearest keyframes; precise clips are re-encoded to cut exactly.
+    """
+    end = clip['end'] if clip['end'] is not None else float('inf')
+    return {
+        'download_ranges': download_range_func(None, [(clip['start'], end)]),
+        'force_keyframes_at_cuts': clip['precise'],
+    }
+
+
+def clip_label(clip):
+    """Suffix for download names: '30-90s', '30s-end'"""
+    start = f"{clip['start']:g}"
+    return f"{start}-{clip['end']:g}s" if clip['end'] is not None else f'{start}s-end'
+
+
+def with_clip_sizes(result, clip):
+    """
+    Copy of an /api/info payload with clip_filesize_approx on every format:
+    the full size scaled by the clip's share of the video. Stream-copy
+    clips start at the keyframe before start, so they run slightly larger.
+    """
+    duration = result.get('duration')
+    end = clip['end'] if clip['end'] is not None else duration
+    clip_info = {'start': clip['start'], 'end': end, 'duration': end - clip['start'] if end is not None else None,
+                 'precise': clip['precise']}
+    if not duration or end is None:
+        return {**result, 'clip': clip_info}
+
+    share = (end - clip['start']) / duration
+
+    def scaled(entries):
+        return [{**f, 'clip_filesize_approx': round((f.get('filesize_approx') or 0) * share)} for f in entries or []]
+
+    return {**result, 'clip': clip_info,
+            'formats': scaled(result.get('formats')),
+            'audio_formats': scaled(result.get('audio_formats'))}
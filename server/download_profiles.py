@@ -0,0 +1,121 @@
+"""
+Download-engine profiles: how many DASH/HLS fragments to fetch at once,
+how big the HTTP range chunks and read buffers are, and how hard to retry.
+A profile is picked per job from the request type and the expected size
+reported by /api/info.
+"""
+import json
+import functools
+
+MB = 1024 * 1024
+
+# Expected sizes below SMALL_BYTES use 'small', above LARGE_BYTES 'large'
+SMALL_BYTES = 50 * MB
+LARGE_BYTES = 500 * MB
+
+DEFAULT_PROFILES = {
+    # Audio and short clips: a handful of fragments, connection setup dominates
+    'small': {
+        'concurrent_fragment_downloads': 2,
+        'http_chunk_size': None,
+        'buffersize': 64 * 1024,
+        'retries': 5,
+        'fragment_retries': 5,
+        'retry_backoff': 0.5,
+        'retry_backoff_max': 4,
+    },
+    'standard': {
+        'concurrent_fragment_downloads': 4,
+        'http_chunk_size': 10 * MB,
+        'buffersize': 256 * 1024,
+        'retries': 10,
+        'fragment_retries': 10,
+        'retry_backoff': 1,
+        'retry_backoff_max': 16,
+    },
+    # Long or high resolution videos: keep the pipe full
+    'large': {
+        'concurrent_fragment_downloads': 8,
+        'http_chunk_size': 10 * MB,
+        'buffersize': 1 * MB,
+        'retries': 15,
+        'fragment_retries': 15,
+        'retry_backoff': 1,
+        'retry_backoff_max': 30,
+    },
+}
+
+
+def load_profiles(overrides=None):
+    """
+    Merge operator overrides into the defaults. overrides is a dict or a
+    JSON string such as '{"large": {"concurrent_fragment_downloads": 16}}';
+    unknown profile names are added as new profiles based on 'standard'.
+    """
+    if isinstance(overrides, str):
+        overrides = json.loads(overrides) if overrides.strip() else {}
+
+    profiles = {name: dict(settings) for name, settings in DEFAULT_PROFILES.items()}
+    for name, settings in (overrides or {}).items():
+        profiles.setdefault(name, dict(DEFAULT_PROFILES['standard'])).update(settings)
+    return profiles
+
+
+def expected_size(info, height, audio_quality):
+    """Approximate output size from a cached /api/info payload, 0 if unknown"""
+    if not info:
+        return 0
+
+    if audio_quality:
+        for audio in info.get('audio_formats') or []:
+            if audio.get('quality') == audio_quality:
+                return audio.get('filesize_approx') or 0
+        return 0
+
+    # bestvideo[height<=h] picks the tallest format that fits
+    fitting = [f for f in info.get('formats') or [] if f.get('height') and f['height'] <= int(height)]
+    if not fitting:
+        return 0
+    return max(fitting, key=lambda f: f['height']).get('filesize_approx') or 0
+
+
+def choose_profile(info, height, audio_quality, forced=None):
+    """Profile name for a job; forced (e.g. from config) wins when set"""
+    if forced:
+        return forced
+
+    size = expected_size(info, height, audio_quality)
+    if size:
+        if size < SMALL_BYTES:
+            return 'small'
+        if size > LARGE_BYTES:
+            return 'large'
+        return 'standard'
+
+    # No size estimate: fall back to the request type
+    if audio_quality:
+        return 'small'
+    if height and int(height) >= 1440:
+        return 'large'
+    return 'standard'
+
+
+def backoff_delay(base, cap, n):
+    """Seconds to sleep before retry n (yt-dlp passes n as a keyword)"""
+    return min(base * 2 ** n, cap)
+
+
+def profile_options(profile):
+    """Translate a profile into yt-dlp options"""
+    sleep = functools.partial(backoff_delay, profile.get('retry_backoff', 1), profile.get('retry_backoff_max', 30))
+
+    options = {
+        'concurrent_fragment_downloads': profile['concurrent_fragment_downloads'],
+        'buffersize': profile['buffersize'],
+        'retries': profile['retries'],
+        'fragment_retries': profile['fragment_retries'],
+        'retry_sleep_functions': {'http': sleep, 'fragment': sleep},
+    }
+    if profile.get('http_chunk_size'):
+        options['http_chunk_size'] = profile['http_chunk_size']
+    return options
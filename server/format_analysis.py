@@ -0,0 +1,230 @@
+"""
+Pure helpers that turn a yt-dlp info dict into the /api/info format lists.
+Shared by app.py and app1.py so both report the same shape.
+"""
+import functools
+
+
+class QualityError(ValueError):
+    """A requested height that can't select a video format"""
+
+
+def parse_height(value):
+    """Positive int height from a request parameter ('720' or 720); raises QualityError"""
+    try:
+        height = int(value)
+    except (TypeError, ValueError):
+        raise QualityError(f'Invalid height: {value!r}' if value not in (None, '') else 'height or audio_quality is required')
+    if height <= 0 or isinstance(value, bool):
+        raise QualityError(f'Invalid height: {value!r}')
+    return height
+
+
+def height_label(height):
+    if height >= 4320: return "8K (4320p)"
+    if height >= 2160: return "4K (2160p)"
+    if height >= 1440: return "2K (1440p)"
+    if height >= 1080: return "1080p(HD)"
+    return f"{height}p"
+
+
+# Container a native audio stream ends up in when it is copied rather than
+# re-encoded (yt-dlp's FFmpegExtractAudio with preferredcodec 'best')
+PASSTHROUGH_EXTS = {'aac': 'm4a', 'opus': 'opus', 'vorbis': 'ogg', 'mp3': 'mp3', 'flac': 'flac'}
+
+
+@functools.lru_cache(maxsize=256)
+def audio_codec(acodec):
+    """Normalize a yt-dlp acodec string ('mp4a.40.2', 'opus', ...)"""
+    acodec = (acodec or '').lower()
+    if acodec.startswith('mp4a') or acodec == 'aac':
+        return 'aac'
+    return acodec.split('.')[0]
+
+
+# Codecs FFmpeg can stream-copy into each container (what yt-dlp's merger
+# checks); a pair that fits neither is merged into MKV, which takes anything
+CONTAINER_CODECS = {
+    'mp4': ({'h264', 'hevc', 'av1'}, {'aac'}),
+    'webm': ({'vp9', 'vp8', 'av1'}, {'opus', 'vorbis'}),
+}
+MERGE_CONTAINERS = 'mp4/webm/mkv'
+
+# Among streams of the same height and frame rate, the most widely playable first
+VIDEO_CODEC_PREFERENCE = ('h264', 'av1', 'hevc', 'vp9', 'vp8')
+
+
+@functools.lru_cache(maxsize=256)
+def video_codec(vcodec):
+    """Normalize a yt-dlp vcodec string ('avc1.640028', 'vp09.00.40.08', ...)"""
+    vcodec = (vcodec or '').lower()
+    if vcodec.startswith(('avc', 'h264')):
+        return 'h264'
+    if vcodec.startswith(('hev', 'hvc', 'h265')):
+        return 'hevc'
+    if vcodec.startswith(('vp09', 'vp9')):
+        return 'vp9'
+    if vcodec.startswith(('vp08', 'vp8')):
+        return 'vp8'
+    if vcodec.startswith('av01'):
+        return 'av1'
+    return vcodec.split('.')[0]
+
+
+def merge_container(vcodec, acodec):
+    """First container that takes both (normalized) codecs without re-encoding"""
+    for container, (vcodecs, acodecs) in CONTAINER_CODECS.items():
+        if vcodec in vcodecs and acodec in acodecs:
+            return container
+    return 'mkv'
+
+
+_CODEC_ORDER = {codec: i for i, codec in enumerate(VIDEO_CODEC_PREFERENCE)}
+
+
+def _codec_order(vcodec):
+    return _CODEC_ORDER.get(vcodec, len(VIDEO_CODEC_PREFERENCE))
+
+
+def _plan_merge(vcodec, best_audio):
+    """(container, audio format or None, audio size) for merging vcodec video without re-encoding"""
+    for container, (vcodecs, acodecs) in CONTAINER_CODECS.items():
+        if vcodec not in vcodecs:
+            continue
+        candidates = [best_audio[codec] for codec in acodecs if codec in best_audio]
+        if candidates:
+            _, audio, audio_size = max(candidates, key=lambda c: c[0])
+            return container, audio, audio_size
+
+    if not best_audio:
+        return 'mp4', None, 0
+    _, audio, audio_size = max(best_audio.values(), key=lambda c: c[0])
+    return 'mkv', audio, audio_size
+
+
+def _height_entry(height, best, codecs):
+    """/api/info entry for one height from its winning (rank, format, video size, vcodec, merge plan)"""
+    _, f, video_size, vcodec, (container, audio, audio_size) = best
+    # Merged sizes only count when the video size is known
+    total_size = video_size + audio_size if video_size > 0 and audio is not None else video_size
+    return {
+        'height': height,
+        'ext': container,
+        'label': height_label(height),
+        'filesize_approx': total_size,
+        'vcodec': vcodec,
+        'fps': f.get('fps'),
+        'container': container,
+        'format_id': f.get('format_id'),
+        'audio_format_id': audio.get('format_id') if audio is not None else None,
+        'codecs': sorted(codecs, key=_codec_order),
+    }
+
+
+def summarize_formats(info):
+    """
+    Classify info['formats'] in a single pass. Expects them in yt-dlp's
+    order (worst to best), as extract_info returns them.
+    Returns (formats, audio_formats): one entry per video height and per
+    rounded (16kbps) audio bitrate, both sorted best first. Each video
+    entry names the video (format_id) and audio (audio_format_id) streams
+    that merge into its container with a pure stream copy. Every audio
+    entry names a native stream (format_id) that can be delivered without
+    re-encoding, in output_ext.
+    """
+    duration_s = info.get('duration') or 0
+    # Approximate stream size for formats without one: bytes per kbps of bitrate
+    bytes_per_kbps = 128 * duration_s if duration_s > 0 else 0
+
+    # yt-dlp sorts info['formats'] worst to best, so the last stream seen per
+    # yt-dlp codec string is the one it would pick; only those get ranked below
+    last_audio = {}  # acodec -> last audio-only format
+    last_video = {}  # (height, vcodec, progressive ext) -> last video format
+    audio_formats = []
+    seen_audio_bitrates = set()
+
+    for f in info.get('formats') or []:
+        get = f.get
+        vcodec = get('vcodec')
+        acodec = get('acodec')
+
+        if vcodec == 'none':
+            if acodec == 'none':
+                continue
+
+            # Audio-only stream: candidate for merging and for the audio list
+            last_audio[acodec] = f
+            abr = get('abr')
+            if not abr:
+                continue
+
+            # Round to nearest common bitrate to avoid showing every slight variation
+            rounded_abr = round(abr / 16) * 16
+            if rounded_abr in seen_audio_bitrates:
+                continue
+            seen_audio_bitrates.add(rounded_abr)
+
+            codec = audio_codec(acodec)
+            audio_formats.append({
+                'quality': f'{rounded_abr}k',
+                'bitrate': rounded_abr,
+                'ext': get('ext', 'm4a'),
+                'label': f'{rounded_abr}kbps',
+                'filesize_approx': get('filesize') or get('filesize_approx') or rounded_abr * bytes_per_kbps,
+                'format_id': get('format_id'),
+                'codec': codec,
+                'output_ext': PASSTHROUGH_EXTS.get(codec, get('ext', 'm4a')),
+                'passthrough': True,
+            })
+            continue
+
+        height = get('height')
+        if height:
+            last_video[height, vcodec, get('ext', 'mp4') if acodec != 'none' else None] = f
+
+    best_audio = {}  # codec -> (rank, format, size) of the best audio-only stream
+    for acodec, f in last_audio.items():
+        abr = f.get('abr')
+        size = f.get('filesize') or f.get('filesize_approx') or (abr * bytes_per_kbps if abr else 0)
+        # Original-language, non-DRC tracks first, then bitrate
+        rank = (f.get('language_preference') or 0, f.get('preference') or 0, abr or 0, size)
+        codec = audio_codec(acodec)
+        best = best_audio.get(codec)
+        if best is None or rank > best[0]:
+            best_audio[codec] = (rank, f, size)
+
+    # Pick the stream for each height: highest frame rate first, then the one
+    # that stream-copies into MP4, then WebM, then the most playable codec
+    merges = {}  # vcodec -> merge plan; it depends only on the audio on offer
+    best_video = {}  # height -> (rank, format, video size, vcodec, merge plan)
+    codecs = {}  # height -> vcodecs on offer
+    other_codecs = len(VIDEO_CODEC_PREFERENCE)
+    for (height, vcodec, progressive_ext), f in last_video.items():
+        vcodec = video_codec(vcodec)
+        # tbr is total bitrate, vbr is video bitrate (progressive streams: tbr covers both)
+        bitrate = f.get('tbr') or f.get('vbr')
+        video_size = f.get('filesize') or f.get('filesize_approx') or (bitrate * bytes_per_kbps if bitrate else 0)
+        if progressive_ext:
+            # Progressive streams need no merge
+            plan = (progressive_ext, None, 0)
+        else:
+            plan = merges.get(vcodec)
+            if plan is None:
+                plan = merges[vcodec] = _plan_merge(vcodec, best_audio)
+        container = plan[0]
+        rank = (f.get('fps') or 0, container == 'mp4', container == 'webm',
+                -_CODEC_ORDER.get(vcodec, other_codecs), video_size)
+        best = best_video.get(height)
+        if best is None:
+            codecs[height] = {vcodec}
+        else:
+            codecs[height].add(vcodec)
+            if rank <= best[0]:
+                continue
+        best_video[height] = (rank, f, video_size, vcodec, plan)
+
+    formats = [_height_entry(height, best, codecs[height]) for height, best in best_video.items()]
+
+    formats.sort(key=lambda x: x['height'], reverse=True)
+    audio_formats.sort(key=lambda x: x['bitrate'], reverse=True)
+    return formats, audio_formats
@@ -0,0 +1,18 @@
+# Production server: gunicorn -c gunicorn.conf.py (run from server/)
+import os
+import multiprocessing
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# Each worker has its own download pool (MAX_DOWNLOAD_WORKERS); threads keep
+# progress polls and file transfers from blocking behind a long request
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# Workers size their default FFmpeg limit (POSTPROCESS_WORKERS) by this
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 16))
+
+# Heartbeat timeout; with gthread a long download on one thread doesn't trip it
+timeout = 120
+graceful_timeout = 30
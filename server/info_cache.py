@@ -0,0 +1,173 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+# Matches the 11 character IDs YouTube uses for videos
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+
+def extract_video_id(url):
+    """
+    Normalize youtu.be / watch?v= / shorts / embed URLs to a video ID.
+    Returns None if the URL does not point at a single video.
+    """
+    if not url:
+        return None
+
+    url = url.strip()
+    if VIDEO_ID_RE.match(url):
+        return url
+
+    try:
+        parsed = urlparse(url if '://' in url else f'https://{url}')
+    except ValueError:
+        return None
+
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if host.startswith('m.'):
+        host = host[2:]
+
+    candidate = None
+    if host == 'youtu.be':
+        candidate = parsed.path.lstrip('/').split('/')[0]
+    elif host in ('youtube.com', 'music.youtube.com', 'youtube-nocookie.com'):
+        if parsed.path == '/watch':
+            candidate = (parse_qs(parsed.query).get('v') or [None])[0]
+        else:
+            parts = parsed.path.strip('/').split('/')
+            if len(parts) >= 2 and parts[0] in ('shorts', 'embed', 'live', 'v'):
+                candidate = parts[1]
+
+    if candidate and VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+class InfoCache:
+    """
+    LRU + TTL cache for /api/info responses, keyed by video ID.
+    Entries are kept in memory and mirrored to JSON files under cache_dir
+    so they survive a restart.
+    """
+
+    def __init__(self, cache_dir, max_entries=512, ttl=6 * 60 * 60):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # video_id -> (cached_at, payload)
+        self._lock = threading.Lock()
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def _path(self, video_id):
+        return os.path.join(self.cache_dir, f'{video_id}.json')
+
+    def _expired(self, cached_at):
+        return self.ttl > 0 and time.time() - cached_at > self.ttl
+
+    def _load_from_disk(self, video_id):
+        path = self._path(video_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            return record['cached_at'], record['payload']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _remove_file(self, video_id):
+        try:
+            os.remove(self._path(video_id))
+        except OSError:
+            pass
+
+    def get(self, video_id):
+        if not video_id:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None:
+                entry = self._load_from_disk(video_id)
+                if entry is not None:
+                    self._entries[video_id] = entry
+                    self._evict()
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            cached_at, payload = entry
+            if self._expired(cached_at):
+                self._entries.pop(video_id, None)
+                self._remove_file(video_id)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(video_id)
+            self.hits += 1
+            return payload
+
+    def peek(self, video_id):
+        """
+        Return a cached payload without touching hit counts or LRU order.
+        Falls back to the disk copy, which another worker process or an
+        earlier run may have written.
+        """
+        if not video_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(video_id)
+        if entry is None:
+            entry = self._load_from_disk(video_id)
+        if entry is None or self._expired(entry[0]):
+            return None
+        return entry[1]
+
+    def set(self, video_id, payload):
+        if not video_id:
+            return
+
+        cached_at = time.time()
+        with self._lock:
+            self._entries[video_id] = (cached_at, payload)
+            self._entries.move_to_end(video_id)
+            self._evict()
+
+        # Write to a temp file first so readers never see a half written entry
+        path = self._path(video_id)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'cached_at': cached_at, 'payload': payload}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Info cache write error: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _evict(self):
+        # Caller must hold the lock
+        while len(self._entries) > self.max_entries:
+            video_id, _ = self._entries.popitem(last=False)
+            self._remove_file(video_id)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+            }
@@ -0,0 +1,73 @@
+import os
+import re
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """
+    Wall-clock timeline of one download job. mark() starts a stage and
+    ends the previous one; a stage entered more than once (e.g. separate
+    video and audio downloads around a merge) accumulates its time.
+    """
+
+    def __init__(self, stage='queued'):
+        self.started = time.time()
+        self._marks = [(stage, self.started)]
+        self._ended = None
+        self._lock = threading.Lock()
+
+    @property
+    def stage(self):
+        with self._lock:
+            return self._marks[-1][0]
+
+    def mark(self, stage, at=None):
+        """Start stage now, or at an earlier time (never before the current stage began)"""
+        with self._lock:
+            if self._ended is None and self._marks[-1][0] != stage:
+                self._marks.append((stage, max(at or time.time(), self._marks[-1][1])))
+
+    def finish(self):
+        with self._lock:
+            if self._ended is None:
+                self._ended = time.time()
+
+    def to_dict(self):
+        with self._lock:
+            marks = list(self._marks)
+            ended = self._ended
+
+        now = ended or time.time()
+        stages = {}
+        for (stage, start), (_, end) in zip(marks, marks[1:] + [(None, now)]):
+            stages[stage] = round(stages.get(stage, 0) + end - start, 3)
+
+        return {
+            'started': self.started,
+            'ended': ended,
+            'total': round(now - self.started, 3),
+            'stages': stages,
+        }
+
+
+@contextmanager
+def profiled(enabled, directory, name):
+    """Run the block under cProfile and dump the stats to <directory>/<name>-<time>.prof"""
+    if not enabled:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    safe_name = re.sub(r'[^\w.-]', '_', name)
+    path = os.path.join(directory, f'{safe_name}-{int(time.time())}.prof')
+    profiler.enable()
+    try:
+        yield path
+    finally:
+        profiler.disable()
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(path)
+        print(f"Saved profile to {path}")
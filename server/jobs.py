@@ -0,0 +1,132 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """
+    A submitted download: either already on disk or backed by a running
+    flight. Jobs loaded from shared records (run by another worker
+    process) have neither and carry their stored outcome instead.
+    """
+
+    def __init__(self, job_id, key, download_name, flight=None, file=None, error=None):
+        self.job_id = job_id
+        self.key = key
+        self.download_name = download_name
+        self.flight = flight
+        self.file = file
+        self._error = error
+        self.created = time.time()
+
+    @property
+    def state(self):
+        if self.file:
+            return 'completed'
+        if self._error is not None:
+            return 'error'
+        if self.flight is None or not self.flight.done():
+            return 'pending'
+        if self.flight.error is not None:
+            return 'error'
+        self.file = self.flight.result
+        return 'completed'
+
+    @property
+    def error(self):
+        if self._error is not None:
+            return self._error
+        if self.flight is not None and self.flight.done() and self.flight.error is not None:
+            return str(self.flight.error)
+        return None
+
+
+class JobManager:
+    """
+    Bounded worker pool for downloads plus a registry of submitted jobs.
+    Work beyond max_workers waits in the executor queue instead of
+    starting another simultaneous download. With shared records (see
+    state_backend), job outcomes are also written there so other worker
+    processes can report on them.
+    """
+
+    def __init__(self, max_workers=4, retention=60 * 60, records=None):
+        self.max_workers = max_workers
+        self.retention = retention
+        self.records = records
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='download')
+        self._jobs = {}
+        self._queued = 0
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """Queue fn(*args) on the pool (also used by SingleFlight)"""
+        with self._lock:
+            self._queued += 1
+
+        def run():
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        return self._executor.submit(run)
+
+    def register(self, job):
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+
+        if self.records is not None:
+            self.records.put(job.job_id, {
+                'key': job.key,
+                'download_name': job.download_name,
+                'state': job.state,
+                'file': job.file,
+                'created': job.created,
+            })
+            if job.flight is not None:
+                job.flight.add_done_callback(lambda flight: self._store_outcome(job))
+        return job
+
+    def _store_outcome(self, job):
+        try:
+            self.records.update(job.job_id, state=job.state, file=job.file, error=job.error)
+        except Exception as e:
+            print(f"Job record update error: {e}")
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or self.records is None:
+            return job
+
+        # Submitted to another worker process
+        record = self.records.get(job_id)
+        if record is None:
+            return None
+        job = Job(job_id, record['key'], record['download_name'], file=record['file'], error=record['error'])
+        job.created = record['created']
+        return job
+
+    def _prune(self):
+        # Caller must hold the lock; forget finished jobs past the retention window
+        cutoff = time.time() - self.retention
+        for job_id in [j.job_id for j in self._jobs.values() if j.created < cutoff and j.state != 'pending']:
+            del self._jobs[job_id]
+        if self.records is not None:
+            self.records.prune(cutoff)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'running': self._running,
+                'queued': self._queued,
+                'jobs': len(self._jobs),
+            }
@@ -0,0 +1,218 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+Updates are a dict lookup and an add under a per-metric lock, cheap
+enough to leave on in the download and delivery paths. With several
+worker processes, render() can merge in the snapshot() of the others.
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Seconds; covers quick metadata lookups up to multi-hour downloads
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+    # Counts keep adding up after the process that made them exits
+    cumulative = True
+    # Every process reads the same value (shared state), so it is never summed
+    shared = False
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def _add(self, value, other):
+        return value + other
+
+    def merge(self, items, others):
+        """items plus the items of other processes, summed per label set"""
+        totals = dict(items)
+        for other in others:
+            for key, value in other:
+                key = tuple(key)
+                totals[key] = self._add(totals[key], value) if key in totals else value
+        return list(totals.items())
+
+    def lines(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+    def collect(self):
+        return self.lines(self.items())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    A settable gauge, or one read from callback() at scrape time. Gauges
+    of exited processes are dropped; shared ones are reported as read by
+    the process that answers.
+    """
+    kind = 'gauge'
+    cumulative = False
+
+    def __init__(self, name, documentation, labelnames=(), callback=None, shared=False):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.shared = shared
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def items(self):
+        if self.callback is None:
+            return super().items()
+        # Callbacks return a number, or {label value tuple: number} for labelled gauges
+        value = self.callback()
+        return list(value.items()) if isinstance(value, dict) else [((), value)]
+
+
+class CallbackCounter(Gauge):
+    """Counter whose value lives elsewhere (e.g. a cache's own hit count)"""
+    kind = 'counter'
+    cumulative = True
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def items(self):
+        with self._lock:
+            return [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+
+    def _add(self, value, other):
+        return [a + b for a, b in zip(value[0], other[0])], value[1] + other[1], value[2] + other[2]
+
+    def lines(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None, shared=False):
+        return self._register(Gauge(name, documentation, labelnames, callback, shared))
+
+    def callback_counter(self, name, documentation, callback, labelnames=()):
+        return self._register(CallbackCounter(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        """{metric name: [[label values, value], ...]} as JSON-serialisable lists, for other processes to merge"""
+        snapshot = {}
+        for metric in self._metrics:
+            try:
+                snapshot[metric.name] = [[list(key), value] for key, value in metric.items()]
+            except Exception as e:
+                print(f"Metrics collection error for {metric.name}: {e}")
+        return snapshot
+
+    def render(self, others=()):
+        """
+        Prometheus text exposition format (version 0.0.4). others holds
+        (snapshot, alive) pairs of other worker processes: their counters
+        and histograms are added in, and the gauges of those still alive.
+        """
+        lines = []
+        for metric in self._metrics:
+            try:
+                items = metric.items()
+                if not metric.shared:
+                    items = metric.merge(items, [snapshot.get(metric.name, []) for snapshot, alive in others
+                                                 if alive or metric.cumulative])
+                samples = metric.lines(items)
+            except Exception as e:
+                print(f"Metrics collection error for {metric.name}: {e}")
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+def output_key(source, ydl_opts):
+    """
+    Build a stable key for a finished download from the video (ID or URL)
+    and the options that change the produced file: format selector and
+    sort order, merge container, postprocessor settings and clip range.
+    Downloads made with a user's own cookie text ('cookies') are kept
+    apart per cookie set, since those may unlock private files.
+    """
+    spec = {
+        'source': source,
+        'format': ydl_opts.get('format'),
+        'merge_output_format': ydl_opts.get('merge_output_format'),
+        'postprocessors': ydl_opts.get('postprocessors', []),
+    }
+    if ydl_opts.get('format_sort'):
+        # Only when set, so keys of files made before format sorting stay valid
+        spec['format_sort'] = ydl_opts['format_sort']
+    ranges = getattr(ydl_opts.get('download_ranges'), 'ranges', None)
+    if ranges:
+        # Clips: the time ranges and whether the cuts were re-encoded
+        spec['ranges'] = [list(r) for r in ranges]
+        spec['force_keyframes_at_cuts'] = bool(ydl_opts.get('force_keyframes_at_cuts'))
+    if ydl_opts.get('cookies'):
+        spec['cookies'] = hashlib.sha256(ydl_opts['cookies'].encode('utf-8')).hexdigest()
+    blob = json.dumps(spec, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+class OutputStore:
+    """
+    Persistent index of finished downloads: key -> file in download_dir.
+    Lookups are O(1) and the index is reloaded on restart, so repeat
+    requests can be served from disk without scanning the directory.
+    """
+
+    def __init__(self, download_dir, index_path):
+        self.download_dir = download_dir
+        self.index_path = index_path
+        self._index = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        # Drop entries whose file was removed while we were down
+        for key, entry in index.items():
+            if os.path.isfile(os.path.join(self.download_dir, entry.get('filename', ''))):
+                self._index[key] = entry
+
+    def _save(self):
+        # Caller must hold the lock
+        tmp_path = f'{self.index_path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Output index write error: {e}")
+
+    def lookup(self, key):
+        """Return the absolute path of a finished file for key, or None"""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+
+            path = os.path.join(self.download_dir, entry['filename'])
+            if not os.path.isfile(path):
+                del self._index[key]
+                self._save()
+                return None
+
+            entry['last_access'] = time.time()
+            entry['hits'] = entry.get('hits', 0) + 1
+            return path
+
+    def entry(self, key):
+        """Metadata recorded for key (filename, size, download_name, ...) or None"""
+        with self._lock:
+            entry = self._index.get(key)
+            return dict(entry) if entry is not None else None
+
+    def record(self, key, path, **meta):
+        """Register a finished file under key"""
+        entry = {
+            'filename': os.path.basename(path),
+            'size': os.path.getsize(path),
+            'created': time.time(),
+            'last_access': time.time(),
+        }
+        entry.update(meta)
+
+        with self._lock:
+            self._index[key] = entry
+            self._save()
+
+    def forget(self, key):
+        with self._lock:
+            if self._index.pop(key, None) is not None:
+                self._save()
+
+    def path(self, key):
+        """Absolute path recorded for key, without counting it as an access"""
+        with self._lock:
+            entry = self._index.get(key)
+            return os.path.join(self.download_dir, entry['filename']) if entry else None
+
+    def snapshot(self):
+        """Copy of every (key, entry) pair, for eviction decisions"""
+        with self._lock:
+            return [(key, dict(entry)) for key, entry in self._index.items()]
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry.get('size', 0) for entry in self._index.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._index)
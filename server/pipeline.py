@@ -0,0 +1,143 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+
+class DownloadPipeline:
+    """
+    Separate concurrency limits for the two halves of a download job: the
+    network transfer (download_workers slots) and FFmpeg post-processing
+    such as merges and audio extraction (postprocess_workers slots,
+    defaulting to the CPU count). A job that finished downloading frees
+    its download slot and waits for a post-processing slot in a hand-off
+    queue of handoff_size places. When that queue is full, the job keeps
+    its download slot until a place opens, so downloads slow to the pace
+    post-processing can absorb.
+    """
+
+    STAGES = ('download_waiting', 'downloading', 'postprocess_waiting', 'postprocessing')
+
+    def __init__(self, download_workers=4, postprocess_workers=None, handoff_size=None):
+        self.download_workers = download_workers
+        self.postprocess_workers = postprocess_workers or os.cpu_count() or 1
+        self.handoff_size = download_workers if handoff_size is None else handoff_size
+        self._download_slots = threading.BoundedSemaphore(self.download_workers)
+        self._postprocess_slots = threading.BoundedSemaphore(self.postprocess_workers)
+        # Places past the download stage: post-processing plus the hand-off queue
+        self._handoff_places = threading.BoundedSemaphore(self.postprocess_workers + self.handoff_size)
+        self._counts = dict.fromkeys(self.STAGES, 0)
+        self._lock = threading.Lock()
+
+    @property
+    def max_jobs(self):
+        """Jobs that can hold a place in the pipeline at once (size the worker threads to this)"""
+        return self.download_workers + self.handoff_size + self.postprocess_workers
+
+    def job(self):
+        """`with pipeline.job() as job:` holds a download slot for the block"""
+        return PipelineJob(self)
+
+    def _count(self, stage, delta):
+        with self._lock:
+            self._counts[stage] += delta
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            'download_workers': self.download_workers,
+            'postprocess_workers': self.postprocess_workers,
+            'handoff_size': self.handoff_size,
+            **counts,
+        }
+
+
+class PipelineJob:
+    """One job's place in a DownloadPipeline"""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.postprocess_wait = 0  # seconds spent waiting for a post-processing slot
+        self._downloading = False
+
+    def __enter__(self):
+        pipeline = self.pipeline
+        pipeline._count('download_waiting', 1)
+        try:
+            pipeline._download_slots.acquire()
+        finally:
+            pipeline._count('download_waiting', -1)
+        pipeline._count('downloading', 1)
+        self._downloading = True
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._release_download()
+
+    def _release_download(self):
+        if self._downloading:
+            self._downloading = False
+            self.pipeline._count('downloading', -1)
+            self.pipeline._download_slots.release()
+
+    def postprocess(self, fn, *args, on_queued=None, on_started=None):
+        """
+        Run fn(*args) in the post-processing stage, handing the download
+        slot on. on_queued() is called if the job has to wait for a slot,
+        on_started() once it has one.
+        """
+        pipeline = self.pipeline
+        waited = time.perf_counter()
+        pipeline._count('postprocess_waiting', 1)
+        try:
+            queued = not pipeline._handoff_places.acquire(blocking=False)
+            if queued:
+                if on_queued:
+                    on_queued()
+                pipeline._handoff_places.acquire()
+            self._release_download()
+
+            try:
+                if not pipeline._postprocess_slots.acquire(blocking=False):
+                    if on_queued and not queued:
+                        on_queued()
+                    pipeline._postprocess_slots.acquire()
+            except BaseException:
+                pipeline._handoff_places.release()
+                raise
+        finally:
+            pipeline._count('postprocess_waiting', -1)
+        self.postprocess_wait += time.perf_counter() - waited
+
+        pipeline._count('postprocessing', 1)
+        try:
+            if on_started:
+                on_started()
+            return fn(*args)
+        finally:
+            pipeline._count('postprocessing', -1)
+            pipeline._postprocess_slots.release()
+            pipeline._handoff_places.release()
+
+
+@contextmanager
+def deferred_postprocessing(ydl, job, on_queued=None, on_started=None):
+    """
+    Run ydl's post-processing (merge, audio extraction, fixups and the
+    final move) in job's post-processing stage. A download that only
+    needs its file moved into place finishes on the download slot.
+    """
+    run = ydl.post_process
+
+    def post_process(filename, info, files_to_move=None):
+        if not info.get('__postprocessors') and not ydl._pps['post_process']:
+            return run(filename, info, files_to_move)
+        return job.postprocess(run, filename, info, files_to_move, on_queued=on_queued, on_started=on_started)
+
+    ydl.post_process = post_process
+    try:
+        yield ydl
+    finally:
+        # Pooled instances go back with their class method
+        del ydl.post_process
@@ -0,0 +1,250 @@
+import os
+import time
+import shutil
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+
+class PrefetchCancelled(Exception):
+    """Raised from a progress hook to stop an unclaimed prefetch"""
+
+
+class Prefetcher:
+    """
+    Speculative downloads of the format a user is most likely to pick
+    after /api/info, so the real request finds it done or under way.
+    Prefetches run on their own `slots` threads (never the download
+    workers) and are paced from the progress hook so that together they
+    stay under rate_limit bytes/s. Finished files wait in a per-process
+    directory under scratch_root until a download claims them (claim()
+    moves them to download_dir). A prefetch nobody claims within ttl
+    seconds is stopped or deleted and its bytes are counted as wasted.
+    While yield_to() reports real downloads waiting, no prefetch starts
+    and unclaimed running ones are stopped.
+
+    Predictions come from the choices recorded with record_choice(): the
+    most requested height or audio quality the video offers, else its
+    top height up to max_height. Formats over max_bytes are skipped.
+    """
+
+    def __init__(self, scratch_root, download_dir, slots=1, rate_limit=None, ttl=120,
+                 max_height=1080, max_bytes=500 * 1024 ** 2, yield_to=None):
+        self.scratch_dir = os.path.join(scratch_root, str(os.getpid()))
+        self.download_dir = download_dir
+        self.slots = slots
+        self.rate_limit = rate_limit
+        self.ttl = ttl
+        self.max_height = max_height
+        self.max_bytes = max_bytes
+        self.yield_to = yield_to or (lambda: False)
+        self.started = 0
+        self.claimed = 0
+        self.expired = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.claimed_bytes = 0
+        self.wasted_bytes = 0
+        self._executor = ThreadPoolExecutor(max_workers=slots, thread_name_prefix='prefetch')
+        self._entries = {}  # key -> entry, running or held in scratch_dir
+        self._choices = Counter()  # ('video', height) / ('audio', quality) -> requests
+        self._pace_until = 0  # when the bytes prefetched so far are paid for under rate_limit
+        self._lock = threading.Lock()
+
+        # Files left by this or any exited process were never claimed
+        os.makedirs(scratch_root, exist_ok=True)
+        for name in os.listdir(scratch_root):
+            if not name.isdigit() or int(name) == os.getpid() or not psutil.pid_exists(int(name)):
+                shutil.rmtree(os.path.join(scratch_root, name), ignore_errors=True)
+        os.makedirs(self.scratch_dir, exist_ok=True)
+
+    def record_choice(self, height, audio_quality):
+        """Count a real download request towards future predictions"""
+        try:
+            choice = ('audio', audio_quality) if audio_quality else ('video', int(height))
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._choices[choice] += 1
+
+    def predict(self, info):
+        """(height, audio_quality) to prefetch for an /api/info payload, or None"""
+        candidates = {}
+        for f in info.get('formats') or []:
+            if f['height'] <= self.max_height and (f.get('filesize_approx') or 0) <= self.max_bytes:
+                candidates[('video', f['height'])] = (f['height'], None)
+        for f in info.get('audio_formats') or []:
+            if (f.get('filesize_approx') or 0) <= self.max_bytes:
+                candidates[('audio', f['quality'])] = (None, f['quality'])
+        if not candidates:
+            return None
+
+        with self._lock:
+            popular = [(count, choice) for choice, count in self._choices.items() if choice in candidates]
+        if popular:
+            return candidates[max(popular)[1]]
+        heights = [choice for choice in candidates if choice[0] == 'video']
+        return candidates[max(heights)] if heights else None
+
+    def start(self, key):
+        """Reserve a slot for key; returns the entry for hook(), or None if busy"""
+        if self.yield_to():
+            return None
+        with self._lock:
+            running = sum(1 for e in self._entries.values() if e['state'] == 'running')
+            if key in self._entries or running >= self.slots:
+                return None
+            entry = {'key': key, 'state': 'running', 'started': time.time(), 'claimed': False,
+                     'bytes': 0, 'files': {}, 'flight': None, 'path': None, 'meta': None}
+            self._entries[key] = entry
+            self.started += 1
+            return entry
+
+    def submit(self, fn, *args):
+        """Executor interface for SingleFlight.join"""
+        return self._executor.submit(fn, *args)
+
+    def attach(self, entry, flight):
+        """Record the flight running entry, which claim() hands to real requests"""
+        with self._lock:
+            entry['flight'] = flight
+
+    def discard(self, entry):
+        """Drop an entry that never started a download of its own"""
+        with self._lock:
+            if self._entries.get(entry['key']) is entry:
+                del self._entries[entry['key']]
+
+    def hook(self, entry, d):
+        """
+        yt-dlp progress hook for a prefetch: counts its bytes, paces it
+        under rate_limit and stops it once it is no longer wanted.
+        """
+        if d.get('status') != 'downloading':
+            return
+        name = d.get('tmpfilename') or d.get('filename')
+        downloaded = d.get('downloaded_bytes') or 0
+        with self._lock:
+            delta = max(downloaded - entry['files'].get(name, 0), 0)
+            entry['files'][name] = downloaded
+            entry['bytes'] += delta
+            if entry['claimed']:
+                return
+            if time.time() - entry['started'] > self.ttl:
+                self.expired += 1
+                entry['state'] = 'stopped'
+                raise PrefetchCancelled('Prefetch was not claimed in time')
+
+            # Pace all prefetches together: these bytes are due rate_limit seconds after the last
+            now = time.monotonic()
+            if self.rate_limit:
+                self._pace_until = max(self._pace_until, now) + delta / self.rate_limit
+            wait = self._pace_until - now
+
+        if self.yield_to():
+            with self._lock:
+                if not entry['claimed']:
+                    self.cancelled += 1
+                    entry['state'] = 'stopped'
+                    raise PrefetchCancelled('Prefetch stopped for waiting downloads')
+        if wait > 0:
+            time.sleep(wait)
+
+    def claim(self, key):
+        """
+        Called by a real download for key. Returns (path, meta, None) if a
+        finished prefetch was waiting (moved into download_dir), or marks a
+        running one as claimed (it then runs unthrottled and is no longer
+        stopped) and returns (None, None, flight) for the caller to wait on.
+        Returns None if there's nothing to claim.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['claimed'] or entry['state'] == 'stopped' or \
+                    (entry['state'] == 'running' and entry['flight'] is None):
+                return None
+            entry['claimed'] = True
+            self.claimed += 1
+            self.claimed_bytes += entry['bytes']
+            if entry['state'] == 'running':
+                return None, None, entry['flight']
+            del self._entries[key]
+
+        return self.promote(entry['path']), entry['meta'], None
+
+    def promote(self, path):
+        """Move a prefetched file from scratch_dir into download_dir"""
+        target = os.path.join(self.download_dir, os.path.basename(path))
+        os.replace(path, target)
+        return target
+
+    def hold(self, entry, path, meta):
+        """
+        Keep a finished prefetch in scratch_dir for claim(). Returns False
+        if it has been claimed meanwhile: the caller promotes it instead.
+        """
+        with self._lock:
+            if entry['claimed']:
+                self._entries.pop(entry['key'], None)
+                return False
+            entry.update(state='held', path=path, meta=meta, flight=None)
+            return True
+
+    def abandon(self, entry):
+        """End a prefetch that failed or was stopped, removing its partial files"""
+        with self._lock:
+            if entry['state'] == 'running':
+                self.failed += 1
+            if not entry['claimed']:
+                self.wasted_bytes += entry['bytes']
+            self._entries.pop(entry['key'], None)
+            names = list(entry['files'])
+        for name in names:
+            for path in (name, name[:-len('.part')] if name.endswith('.part') else None):
+                if path and os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        print(f"Error removing prefetched file {path}: {e}")
+
+    def expire(self):
+        """Delete finished prefetches nobody claimed within ttl"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            stale = [e for e in self._entries.values() if e['state'] == 'held' and e['started'] < cutoff]
+            for entry in stale:
+                del self._entries[entry['key']]
+                self.expired += 1
+                self.wasted_bytes += entry['bytes']
+        for entry in stale:
+            try:
+                os.remove(entry['path'])
+            except OSError as e:
+                print(f"Error removing prefetched file {entry['path']}: {e}")
+
+    def run_periodically(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.expire()
+            except Exception as e:
+                print(f"Prefetch expiry error: {e}")
+
+    def stats(self):
+        with self._lock:
+            states = Counter(e['state'] for e in self._entries.values())
+            return {
+                'slots': self.slots,
+                'running': states['running'],
+                'held': states['held'],
+                'started': self.started,
+                'claimed': self.claimed,
+                'expired': self.expired,
+                'cancelled': self.cancelled,
+                'failed': self.failed,
+                'hit_rate': round(self.claimed / self.started, 3) if self.started else None,
+                'claimed_bytes': self.claimed_bytes,
+                'wasted_bytes': self.wasted_bytes,
+            }
@@ -0,0 +1,104 @@
+import time
+
+
+def format_speed(bytes_per_sec):
+    if not bytes_per_sec:
+        return 'N/A'
+    for unit in ('B/s', 'KiB/s', 'MiB/s', 'GiB/s'):
+        if bytes_per_sec < 1024 or unit == 'GiB/s':
+            return f'{bytes_per_sec:.2f}{unit}'
+        bytes_per_sec /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return 'N/A'
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes:02d}:{seconds:02d}'
+
+
+class ProgressMeter:
+    """
+    Turns raw yt-dlp progress hook calls into progress records, computing
+    its own smoothed speed/ETA and dropping updates that arrive faster
+    than min_interval unless the status itself changed.
+    """
+
+    def __init__(self, min_interval=0.5, smoothing=0.3):
+        self.min_interval = min_interval
+        self.smoothing = smoothing
+        self._filename = None
+        self._last_bytes = 0
+        self._last_sample = None
+        self._speed = None
+        self._last_publish = 0
+        self._last_record = None
+
+    def _sample_speed(self, d, now):
+        filename = d.get('filename')
+        downloaded = d.get('downloaded_bytes') or 0
+
+        # yt-dlp restarts the byte count for every file (video, then audio)
+        if self._last_sample is None or filename != self._filename:
+            self._filename = filename
+            self._last_bytes = downloaded
+            self._last_sample = now
+            return
+
+        elapsed = now - self._last_sample
+        if elapsed <= 0:
+            return
+
+        rate = max(downloaded - self._last_bytes, 0) / elapsed
+        if self._speed is None:
+            self._speed = rate
+        else:
+            self._speed = self.smoothing * rate + (1 - self.smoothing) * self._speed
+        self._last_bytes = downloaded
+        self._last_sample = now
+
+    def update(self, d):
+        """Return a record to publish, or None if this update should be dropped"""
+        now = time.monotonic()
+        status = d.get('status')
+
+        if status == 'downloading':
+            self._sample_speed(d, now)
+
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            downloaded = d.get('downloaded_bytes') or 0
+            eta = None
+            if total and self._speed:
+                eta = max(total - downloaded, 0) / self._speed
+
+            record = {
+                'status': 'downloading',
+                'progress': round((downloaded / total) * 100, 1) if total else 0,
+                'speed': format_speed(self._speed),
+                'eta': format_eta(eta),
+                'stage': 'Downloading from YouTube...',
+            }
+        elif status == 'finished':
+            record = {
+                'status': 'processing',
+                'progress': 100,
+                'stage': 'Merging Video & Audio (FFmpeg)...',
+                'speed': '-',
+                'eta': '0s'
+            }
+        else:
+            return None
+
+        last = self._last_record
+        status_changed = last is None or last['status'] != record['status']
+        if not status_changed:
+            if now - self._last_publish < self.min_interval or record == last:
+                return None
+
+        self._last_publish = now
+        self._last_record = record
+        return record
@@ -0,0 +1,113 @@
+import time
+import threading
+from collections import OrderedDict
+
+TERMINAL_STATUSES = ('completed', 'error')
+
+
+class ProgressRecord:
+    """Compact progress entry; only the fields the clients read get a slot"""
+
+    __slots__ = ('status', 'progress', 'stage', 'speed', 'eta', 'error', 'extra', 'updated')
+
+    FIELDS = ('status', 'progress', 'stage', 'speed', 'eta', 'error')
+
+    def __init__(self, record):
+        self.status = record.get('status')
+        self.progress = record.get('progress')
+        self.stage = record.get('stage')
+        self.speed = record.get('speed')
+        self.eta = record.get('eta')
+        self.error = record.get('error')
+        extra = {k: v for k, v in record.items() if k not in self.FIELDS}
+        self.extra = extra or None
+        self.updated = time.time()
+
+    @property
+    def terminal(self):
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self):
+        record = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                record[field] = value
+        if self.extra:
+            record.update(self.extra)
+        return record
+
+
+class ProgressStore:
+    """
+    Thread-safe progress records keyed by request ID. Finished
+    (completed/error) entries are dropped after terminal_ttl seconds, and
+    the store never holds more than max_entries records: once full, the
+    oldest finished entries go first, then the oldest of the rest.
+    """
+
+    def __init__(self, max_entries=10000, terminal_ttl=10 * 60):
+        self.max_entries = max_entries
+        self.terminal_ttl = terminal_ttl
+        self._records = OrderedDict()  # request_id -> ProgressRecord, oldest update first
+        self._changed = threading.Condition()
+        self._last_sweep = 0
+
+    def get(self, request_id, default=None):
+        with self._changed:
+            record = self._records.get(request_id)
+            return record.to_dict() if record is not None else default
+
+    def set(self, request_id, record):
+        """Replace the record for request_id and wake anyone waiting on changes"""
+        with self._changed:
+            self._records[request_id] = ProgressRecord(record)
+            self._records.move_to_end(request_id)
+            self._evict()
+            self._changed.notify_all()
+
+    def wait(self, request_id, last, timeout):
+        """
+        Return the record for request_id as soon as it differs from last,
+        or the unchanged record once timeout expires.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                record = self._records.get(request_id)
+                current = record.to_dict() if record is not None else {'status': 'unknown'}
+                remaining = deadline - time.monotonic()
+                if current != last or remaining <= 0:
+                    return current
+                self._changed.wait(remaining)
+
+    def _evict(self):
+        # Caller must hold the lock
+        now = time.time()
+        if now - self._last_sweep >= 1:
+            self._last_sweep = now
+            cutoff = now - self.terminal_ttl
+            expired = [rid for rid, rec in self._records.items() if rec.terminal and rec.updated < cutoff]
+            for request_id in expired:
+                del self._records[request_id]
+
+        overflow = len(self._records) - self.max_entries
+        if overflow <= 0:
+            return
+
+        for request_id in [rid for rid, rec in self._records.items() if rec.terminal][:overflow]:
+            del self._records[request_id]
+            overflow -= 1
+        while overflow > 0:
+            self._records.popitem(last=False)
+            overflow -= 1
+
+    def stats(self):
+        with self._changed:
+            active = sum(1 for rec in self._records.values() if not rec.terminal)
+            return {
+                'active': active,
+                'retained': len(self._records),
+                'max_entries': self.max_entries,
+                'terminal_ttl': self.terminal_ttl,
+            }
@@ -0,0 +1,110 @@
+import threading
+
+
+class Flight:
+    """A single in-flight job shared by every request that asked for it"""
+
+    def __init__(self, key):
+        self.key = key
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        self._callbacks = []
+        self._request_ids = []
+        self._lock = threading.Lock()
+
+    def attach(self, request_id):
+        with self._lock:
+            self._request_ids.append(request_id)
+
+    def request_ids(self):
+        """Snapshot of every request attached to this job (leader first)"""
+        with self._lock:
+            return list(self._request_ids)
+
+    @property
+    def leader_id(self):
+        with self._lock:
+            return self._request_ids[0] if self._request_ids else None
+
+    def done(self):
+        return self._done.is_set()
+
+    def add_done_callback(self, fn):
+        """Call fn(flight) once the job finishes (right away if it already has)"""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; re-raises the job's error for every waiter"""
+        self._done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent jobs. The first request for a key starts
+    the job on a background thread (or the given executor), later requests
+    for the same key attach to it and receive the same result (or error).
+    Because the job does not run on any request thread, a waiter that
+    disconnects cannot cancel it.
+    """
+
+    def __init__(self, executor=None):
+        self._executor = executor
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def join(self, key, request_id, fn, executor=None):
+        """
+        Attach request_id to the job for key, starting fn(flight) if nothing
+        is running yet (on executor, if given, instead of the default).
+        Returns (flight, is_leader).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = Flight(key)
+                self._flights[key] = flight
+            flight.attach(request_id)
+
+        if is_leader:
+            executor = executor or self._executor
+            if executor is not None:
+                executor.submit(self._run, flight, fn)
+            else:
+                threading.Thread(target=self._run, args=(flight, fn), daemon=True).start()
+
+        return flight, is_leader
+
+    def _run(self, flight, fn):
+        try:
+            flight.result = fn(flight)
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                self._flights.pop(flight.key, None)
+            flight._finish()
+
+    def get(self, key):
+        """The queued or running flight for key, if any"""
+        with self._lock:
+            return self._flights.get(key)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
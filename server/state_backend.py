@@ -0,0 +1,377 @@
+"""
+Shared state for running several worker processes on one host.
+
+Five stores are shared: progress records, job records, the finished-file
+index, pins on files in use and metric values. Each has an in-process
+implementation (ProgressStore, JobManager's own registry, OutputStore,
+StorageManager's PinCounter, the MetricsRegistry itself) and a SQLite one
+here. The SQLite versions use a single WAL-mode database, so any worker
+can answer a progress poll, a job status request, a file request or a
+metrics scrape, and no worker evicts or sweeps a file another one uses.
+
+An external store (Redis, Postgres, ...) only needs to implement the
+same methods:
+
+  progress store  get(id, default), set(id, record), wait(id, last, timeout), stats()
+  job records     put(job_id, record), update(job_id, **fields), get(job_id), prune(cutoff)
+  output store    lookup(key), entry(key), record(key, path, **meta), forget(key),
+                  path(key), snapshot(), total_bytes(), __len__()
+  pins            pin(key), unpin(key), is_pinned(key), __len__()
+  metrics         publish(snapshot), others()
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+import psutil
+
+from progress_store import ProgressRecord
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    request_id TEXT PRIMARY KEY,
+    record TEXT NOT NULL,
+    terminal INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS progress_age ON progress (terminal, updated);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    download_name TEXT,
+    state TEXT NOT NULL,
+    file TEXT,
+    error TEXT,
+    created REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS outputs (
+    key TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    meta TEXT
+);
+
+CREATE TABLE IF NOT EXISTS pins (
+    key TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (key, pid)
+);
+
+CREATE TABLE IF NOT EXISTS metrics (
+    worker TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    snapshot TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+# How often a waiter re-reads a record that another process may have changed
+POLL_INTERVAL = 0.25
+
+
+class SqliteState:
+    """One WAL-mode SQLite connection per process, shared by its threads"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        with self._lock:
+            self._connection().executescript(SCHEMA)
+
+    def connect(self, write=True):
+        """Lock the connection for one transaction: `with state.connect() as conn:`"""
+        return _Transaction(self, write)
+
+    def _connection(self):
+        # Caller must hold the lock; a forked worker must not reuse its parent's handle
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._pid = os.getpid()
+        return self._conn
+
+
+class _Transaction:
+    def __init__(self, state, write):
+        self.state = state
+        self.write = write
+
+    def __enter__(self):
+        self.state._lock.acquire()
+        try:
+            self.conn = self.state._connection()
+            # Writers take the lock up front so busy_timeout applies instead of failing on upgrade
+            self.conn.execute('BEGIN IMMEDIATE' if self.write else 'BEGIN')
+        except Exception:
+            self.state._lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.state._lock.release()
+
+
+class SqliteProgressStore:
+    """ProgressStore with the records in SQLite, visible to every worker process"""
+
+    def __init__(self, state, max_entries=10000, terminal_ttl=10 * 60):
+        self.state = state
+        self.max_entries = max_entries
+        self.terminal_ttl = terminal_ttl
+        self._changed = threading.Condition()  # wakes waiters in this process early
+        self._last_sweep = 0
+
+    def get(self, request_id, default=None):
+        with self.state.connect(write=False) as conn:
+            row = conn.execute('SELECT record FROM progress WHERE request_id = ?', (request_id,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, request_id, record):
+        # Same normalisation as the in-memory store, so both return identical dicts
+        record = ProgressRecord(record)
+        blob = json.dumps(record.to_dict())
+        with self.state.connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO progress (request_id, record, terminal, updated) VALUES (?, ?, ?, ?)',
+                         (request_id, blob, int(record.terminal), record.updated))
+            self._evict(conn)
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait(self, request_id, last, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.get(request_id, {'status': 'unknown'})
+            remaining = deadline - time.monotonic()
+            if current != last or remaining <= 0:
+                return current
+            with self._changed:
+                self._changed.wait(min(remaining, POLL_INTERVAL))
+
+    def _evict(self, conn):
+        now = time.time()
+        if now - self._last_sweep < 1:
+            return
+        self._last_sweep = now
+
+        conn.execute('DELETE FROM progress WHERE terminal = 1 AND updated < ?', (now - self.terminal_ttl,))
+        overflow = conn.execute('SELECT COUNT(*) FROM progress').fetchone()[0] - self.max_entries
+        if overflow > 0:
+            # Oldest finished entries first, then the oldest of the rest
+            conn.execute('DELETE FROM progress WHERE request_id IN '
+                         '(SELECT request_id FROM progress ORDER BY terminal DESC, updated ASC LIMIT ?)', (overflow,))
+
+    def stats(self):
+        with self.state.connect(write=False) as conn:
+            retained, active = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(1 - terminal), 0) FROM progress').fetchone()
+        return {
+            'active': active,
+            'retained': retained,
+            'max_entries': self.max_entries,
+            'terminal_ttl': self.terminal_ttl,
+            'backend': 'sqlite',
+        }
+
+
+class SqliteJobRecords:
+    """Job records (key, outcome) so any worker can answer /api/jobs/<id>"""
+
+    FIELDS = ('key', 'download_name', 'state', 'file', 'error', 'created')
+
+    def __init__(self, state):
+        self.state = state
+
+    def put(self, job_id, record):
+        with self.state.connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO jobs (job_id, key, download_name, state, file, error, created) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (job_id, record['key'], record.get('download_name'), record.get('state', 'pending'),
+                          record.get('file'), record.get('error'), record.get('created', time.time())))
+
+    def update(self, job_id, **fields):
+        fields = {k: v for k, v in fields.items() if k in self.FIELDS}
+        if not fields:
+            return
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self.state.connect() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE job_id = ?', (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self.state.connect(write=False) as conn:
+            row = conn.execute(f'SELECT {", ".join(self.FIELDS)} FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return dict(zip(self.FIELDS, row)) if row else None
+
+    def prune(self, cutoff):
+        with self.state.connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE created < ? AND state != 'pending'", (cutoff,))
+
+
+class SqliteOutputStore:
+    """OutputStore with the index in SQLite, so every worker sees every finished file"""
+
+    def __init__(self, state, download_dir, legacy_index_path=None):
+        self.state = state
+        self.download_dir = download_dir
+        if legacy_index_path:
+            self._import(legacy_index_path)
+
+    def _import(self, index_path):
+        # One-time carry-over from the JSON index used by the single-process mode
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, entry in index.items():
+            path = os.path.join(self.download_dir, entry.get('filename', ''))
+            if os.path.isfile(path):
+                meta = {k: v for k, v in entry.items() if k not in ('filename', 'size', 'created', 'last_access', 'hits')}
+                with self.state.connect() as conn:
+                    conn.execute('INSERT OR IGNORE INTO outputs (key, filename, size, created, last_access, hits, meta) '
+                                 'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                 (key, entry['filename'], entry.get('size', 0), entry.get('created', time.time()),
+                                  entry.get('last_access', time.time()), entry.get('hits', 0), json.dumps(meta)))
+
+    @staticmethod
+    def _entry(row):
+        filename, size, created, last_access, hits, meta = row
+        entry = {'filename': filename, 'size': size, 'created': created, 'last_access': last_access, 'hits': hits}
+        entry.update(json.loads(meta or '{}'))
+        return entry
+
+    def lookup(self, key):
+        with self.state.connect() as conn:
+            row = conn.execute('SELECT filename FROM outputs WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+
+            path = os.path.join(self.download_dir, row[0])
+            if not os.path.isfile(path):
+                conn.execute('DELETE FROM outputs WHERE key = ?', (key,))
+                return None
+
+            conn.execute('UPDATE outputs SET last_access = ?, hits = hits + 1 WHERE key = ?', (time.time(), key))
+            return path
+
+    def entry(self, key):
+        with self.state.connect(write=False) as conn:
+            row = conn.execute('SELECT filename, size, created, last_access, hits, meta FROM outputs WHERE key = ?',
+                               (key,)).fetchone()
+        return self._entry(row) if row else None
+
+    def record(self, key, path, **meta):
+        now = time.time()
+        with self.state.connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO outputs (key, filename, size, created, last_access, hits, meta) '
+                         'VALUES (?, ?, ?, ?, ?, 0, ?)',
+                         (key, os.path.basename(path), os.path.getsize(path), now, now, json.dumps(meta)))
+
+    def forget(self, key):
+        with self.state.connect() as conn:
+            conn.execute('DELETE FROM outputs WHERE key = ?', (key,))
+
+    def path(self, key):
+        with self.state.connect(write=False) as conn:
+            row = conn.execute('SELECT filename FROM outputs WHERE key = ?', (key,)).fetchone()
+        return os.path.join(self.download_dir, row[0]) if row else None
+
+    def snapshot(self):
+        with self.state.connect(write=False) as conn:
+            rows = conn.execute('SELECT key, filename, size, created, last_access, hits, meta FROM outputs').fetchall()
+        return [(row[0], self._entry(row[1:])) for row in rows]
+
+    def total_bytes(self):
+        with self.state.connect(write=False) as conn:
+            return conn.execute('SELECT COALESCE(SUM(size), 0) FROM outputs').fetchone()[0]
+
+    def __len__(self):
+        with self.state.connect(write=False) as conn:
+            return conn.execute('SELECT COUNT(*) FROM outputs').fetchone()[0]
+
+
+class SqlitePins:
+    """
+    Pins on files in use, counted per worker process. Pins of a process
+    that has exited (crashed mid-transfer) no longer count.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        # Left by an earlier process that had this PID
+        with self.state.connect() as conn:
+            conn.execute('DELETE FROM pins WHERE pid = ?', (os.getpid(),))
+
+    def pin(self, key):
+        with self.state.connect() as conn:
+            conn.execute('INSERT INTO pins (key, pid, count) VALUES (?, ?, 1) '
+                         'ON CONFLICT (key, pid) DO UPDATE SET count = count + 1', (key, os.getpid()))
+
+    def unpin(self, key):
+        with self.state.connect() as conn:
+            conn.execute('UPDATE pins SET count = count - 1 WHERE key = ? AND pid = ?', (key, os.getpid()))
+            conn.execute('DELETE FROM pins WHERE key = ? AND pid = ? AND count <= 0', (key, os.getpid()))
+
+    def _live(self, rows):
+        pid = os.getpid()
+        return [row for row in rows if row[-1] == pid or psutil.pid_exists(row[-1])]
+
+    def is_pinned(self, key):
+        with self.state.connect(write=False) as conn:
+            rows = conn.execute('SELECT pid FROM pins WHERE key = ?', (key,)).fetchall()
+        return bool(self._live(rows))
+
+    def __len__(self):
+        with self.state.connect(write=False) as conn:
+            rows = conn.execute('SELECT key, pid FROM pins').fetchall()
+        return len({key for key, _ in self._live(rows)})
+
+
+class SqliteMetrics:
+    """
+    Each worker's latest metrics snapshot, republished every interval
+    seconds, so a scrape answered by any worker reports the whole server
+    (MetricsRegistry.render(others)). Rows are per process lifetime, so
+    counts of exited workers are kept; a worker counts as alive while its
+    process exists and it published within the last three intervals.
+    """
+
+    def __init__(self, state, interval=15):
+        self.state = state
+        self.interval = interval
+        self.worker = uuid.uuid4().hex
+
+    def publish(self, snapshot):
+        with self.state.connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO metrics (worker, pid, snapshot, updated) VALUES (?, ?, ?, ?)',
+                         (self.worker, os.getpid(), json.dumps(snapshot), time.time()))
+
+    def others(self):
+        """(snapshot, alive) of every other worker, past and present"""
+        with self.state.connect(write=False) as conn:
+            rows = conn.execute('SELECT pid, snapshot, updated FROM metrics WHERE worker != ?', (self.worker,)).fetchall()
+        recent = time.time() - 3 * self.interval
+        return [(json.loads(snapshot), updated > recent and psutil.pid_exists(pid)) for pid, snapshot, updated in rows]
+
+    def run_periodically(self, snapshot):
+        """Background loop publishing snapshot() every interval seconds"""
+        while True:
+            try:
+                self.publish(snapshot())
+            except Exception as e:
+                print(f"Metrics publish error: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import threading
+
+# Leftovers from interrupted yt-dlp runs: partial downloads, resume state,
+# fragment scratch files and per-format intermediates that were never merged
+ORPHAN_PATTERNS = (
+    re.compile(r'\.part(-Frag\d+)?$'),
+    re.compile(r'\.ytdl$'),
+    re.compile(r'\.f\d+[^.]*\.\w+(\.part)?$'),
+    re.compile(r'\.temp\.\w+$'),
+)
+
+# Inline cookie files are written as <uuid>.txt under CACHE_DIR
+TEMP_COOKIE_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.txt$')
+
+
+class PinCounter:
+    """In-process pins: key -> number of holders"""
+
+    def __init__(self):
+        self._pins = {}
+        self._lock = threading.Lock()
+
+    def pin(self, key):
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, key):
+        with self._lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+
+    def is_pinned(self, key):
+        with self._lock:
+            return key in self._pins
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pins)
+
+
+class StorageManager:
+    """
+    Keeps the downloads directory under a byte budget. Usage and access
+    statistics come from the output store's in-memory index, so no
+    directory scans are needed. When usage crosses the high watermark,
+    unpinned files are evicted (LRU or LFU) until it drops below the low
+    watermark. Files being served or merged are pinned and never evicted.
+    Pins live in pins (in-process by default; SqlitePins shares them
+    between worker processes).
+    """
+
+    # Files touched this recently are probably on their way to a client
+    GRACE_SECONDS = 60
+
+    def __init__(self, store, budget_bytes, high_watermark=0.9, low_watermark=0.75, policy='lru', pins=None):
+        self.store = store
+        self.budget_bytes = budget_bytes
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.policy = policy
+        self.pins = pins if pins is not None else PinCounter()
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+
+    def pin(self, key):
+        self.pins.pin(key)
+
+    def unpin(self, key):
+        self.pins.unpin(key)
+
+    def _is_pinned(self, key):
+        return self.pins.is_pinned(key)
+
+    def _eviction_order(self, entries):
+        if self.policy == 'lfu':
+            return sorted(entries, key=lambda item: (item[1].get('hits', 0), item[1].get('last_access', 0)))
+        return sorted(entries, key=lambda item: item[1].get('last_access', 0))
+
+    def enforce(self):
+        """Evict files until usage is below the low watermark; returns bytes freed"""
+        if not self.budget_bytes:
+            return 0
+
+        usage = self.store.total_bytes()
+        if usage <= self.budget_bytes * self.high_watermark:
+            return 0
+
+        target = self.budget_bytes * self.low_watermark
+        recent = time.time() - self.GRACE_SECONDS
+        freed = 0
+        for key, entry in self._eviction_order(self.store.snapshot()):
+            if usage - freed <= target:
+                break
+            if self._is_pinned(key) or entry.get('last_access', 0) > recent:
+                continue
+
+            path = self.store.path(key)
+            self.store.forget(key)
+            try:
+                if path and os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                print(f"Error evicting {path}: {e}")
+                continue
+
+            freed += entry.get('size', 0)
+            self.evicted_files += 1
+            self.evicted_bytes += entry.get('size', 0)
+            print(f"Evicted {entry.get('filename')} ({entry.get('size', 0)} bytes)")
+
+        return freed
+
+    def reclaim_orphans(self, download_dir, cache_dir, min_age=0):
+        """
+        Startup sweep: remove partial yt-dlp fragments and leaked temp cookie
+        files. Files modified in the last min_age seconds are left alone, and
+        so are files of a download still running: their name starts with a
+        pinned output stem (see pin()), possibly held by another worker.
+        """
+        reclaimed = 0
+        candidates = []
+
+        for filename in os.listdir(download_dir):
+            if any(p.search(filename) for p in ORPHAN_PATTERNS):
+                candidates.append(os.path.join(download_dir, filename))
+        for filename in os.listdir(cache_dir):
+            if TEMP_COOKIE_RE.match(filename):
+                candidates.append(os.path.join(cache_dir, filename))
+
+        cutoff = time.time() - min_age
+        for path in candidates:
+            try:
+                if min_age and os.path.getmtime(path) > cutoff:
+                    continue
+                if self._is_pinned(os.path.basename(path).split('.')[0]):
+                    continue
+                size = os.path.getsize(path)
+                os.remove(path)
+                reclaimed += size
+                print(f"Reclaimed orphaned file: {os.path.basename(path)}")
+            except OSError as e:
+                print(f"Error reclaiming {path}: {e}")
+
+        return reclaimed
+
+    def run_periodically(self, interval):
+        """Background loop that re-checks the budget every interval seconds"""
+        while True:
+            time.sleep(interval)
+            try:
+                self.enforce()
+            except Exception as e:
+                print(f"Storage check error: {e}")
+
+    def stats(self):
+        pinned = len(self.pins)
+        return {
+            'usage_bytes': self.store.total_bytes(),
+            'budget_bytes': self.budget_bytes,
+            'high_watermark': self.high_watermark,
+            'low_watermark': self.low_watermark,
+            'policy': self.policy,
+            'files': len(self.store),
+            'pinned': pinned,
+            'evicted_files': self.evicted_files,
+            'evicted_bytes': self.evicted_bytes,
+        }
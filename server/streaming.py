@@ -0,0 +1,126 @@
+import subprocess
+from yt_dlp.networking import Request
+
+from format_analysis import video_codec, audio_codec, merge_container
+
+# Only plain HTTP(S) sources can be piped; DASH/HLS fragments fall back to files
+STREAMABLE_PROTOCOLS = ('http', 'https')
+CHUNK_SIZE = 64 * 1024
+
+MIMETYPES = {
+    'mp4': 'video/mp4',
+    'webm': 'video/webm',
+    'm4a': 'audio/mp4',
+    'mp3': 'audio/mpeg',
+    'mkv': 'video/x-matroska',
+}
+
+# FFmpeg muxer per container; all of them can be written to a pipe
+MUXERS = {
+    'mp4': ['-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-f', 'mp4'],
+    'webm': ['-f', 'webm'],
+    'mkv': ['-f', 'matroska'],
+}
+AUDIO_MIMETYPES = {
+    'm4a': 'audio/mp4',
+    'webm': 'audio/webm',
+    'opus': 'audio/ogg',
+    'ogg': 'audio/ogg',
+}
+
+
+class StreamUnavailable(Exception):
+    """The selected formats cannot be streamed; use the file-based path"""
+
+
+def plan_stream(info, audio_quality, ffmpeg_path, transcode=True):
+    """
+    Decide how to stream the formats yt-dlp selected in info.
+    Returns a dict with 'kind' ('pipe' or 'ffmpeg'), 'formats', 'ext'
+    and 'mimetype', or raises StreamUnavailable. With transcode=False
+    audio is piped in its native container instead of encoded to MP3.
+    """
+    formats = info.get('requested_formats') or [info]
+    for f in formats:
+        if not f.get('url') or f.get('protocol', 'https') not in STREAMABLE_PROTOCOLS:
+            raise StreamUnavailable(f"protocol {f.get('protocol')} is not streamable")
+
+    if audio_quality and not transcode:
+        # Native stream at the requested bitrate: pass the bytes through
+        f = formats[-1]
+        ext = f.get('ext', 'm4a')
+        return {'kind': 'pipe', 'formats': [f], 'ext': ext, 'mimetype': AUDIO_MIMETYPES.get(ext, 'application/octet-stream')}
+
+    if audio_quality:
+        # Audio is delivered as MP3 like the file path, encoded on the fly
+        if not ffmpeg_path:
+            raise StreamUnavailable('FFmpeg is required for audio streaming')
+        return {'kind': 'ffmpeg', 'formats': formats[-1:], 'ext': 'mp3', 'mimetype': MIMETYPES['mp3']}
+
+    if len(formats) == 1:
+        # Progressive stream already has audio and video: pass the bytes through
+        ext = formats[0].get('ext', 'mp4')
+        return {'kind': 'pipe', 'formats': formats, 'ext': ext, 'mimetype': MIMETYPES.get(ext, 'application/octet-stream')}
+
+    if not ffmpeg_path:
+        raise StreamUnavailable('FFmpeg is required to mux separate video and audio')
+    # Stream copy only, into whichever container takes both codecs
+    ext = merge_container(video_codec(formats[0].get('vcodec')), audio_codec(formats[1].get('acodec')))
+    return {'kind': 'ffmpeg', 'formats': formats, 'ext': ext, 'mimetype': MIMETYPES[ext]}
+
+
+def ffmpeg_command(ffmpeg_path, plan, audio_quality=None):
+    """FFmpeg command that writes the planned output to stdout"""
+    cmd = [ffmpeg_path, '-hide_banner', '-loglevel', 'error']
+    for f in plan['formats']:
+        headers = ''.join(f'{k}: {v}\r\n' for k, v in (f.get('http_headers') or {}).items())
+        if headers:
+            cmd += ['-headers', headers]
+        cmd += ['-i', f['url']]
+
+    if plan['ext'] == 'mp3':
+        bitrate = (audio_quality or '192').replace('k', '')
+        cmd += ['-vn', '-c:a', 'libmp3lame', '-b:a', f'{bitrate}k', '-f', 'mp3']
+    else:
+        # Fragmented MP4 can be written to a pipe without seeking back for the moov atom
+        cmd += ['-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', *MUXERS[plan['ext']]]
+
+    return cmd + ['pipe:1']
+
+
+def iter_stream(ydl, plan, ffmpeg_path, audio_quality=None, on_chunk=None):
+    """
+    Yield the output bytes for plan. Nothing touches the disk; if the client
+    goes away the generator is closed and the upstream transfer stops.
+    """
+    if plan['kind'] == 'pipe':
+        f = plan['formats'][0]
+        with ydl.urlopen(Request(f['url'], headers=f.get('http_headers') or {})) as response:
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if on_chunk:
+                    on_chunk(len(chunk))
+                yield chunk
+        return
+
+    proc = subprocess.Popen(
+        ffmpeg_command(ffmpeg_path, plan, audio_quality),
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            chunk = proc.stdout.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if on_chunk:
+                on_chunk(len(chunk))
+            yield chunk
+        if proc.wait() != 0:
+            raise RuntimeError(f'FFmpeg exited with status {proc.returncode}')
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
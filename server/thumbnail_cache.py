@@ -0,0 +1,166 @@
+import os
+import shutil
+import threading
+import subprocess
+import urllib.request
+from collections import OrderedDict
+
+# Upstream thumbnails are a few hundred KB at most; refuse anything far bigger
+MAX_SOURCE_BYTES = 5 * 1024 * 1024
+
+SOURCE_EXTS = {'image/jpeg': 'jpg', 'image/webp': 'webp', 'image/png': 'png'}
+
+
+class ThumbnailError(Exception):
+    """The upstream image could not be fetched or converted"""
+
+
+class ThumbnailCache:
+    """
+    Disk cache of video thumbnails under cache_dir, one directory per
+    video: the upstream image ('original'), fetched once, plus JPEG
+    variants resized to the widths in sizes (name -> width) on first
+    request. Resizing needs FFmpeg (ffmpeg_path() returns its path);
+    without it every size is the original image. Whole videos are
+    evicted least recently used first once the cache holds more than
+    max_bytes.
+    """
+
+    def __init__(self, cache_dir, sizes, max_bytes=200 * 1024 ** 2, ffmpeg_path=None, timeout=10):
+        self.cache_dir = cache_dir
+        self.sizes = sizes
+        self.max_bytes = max_bytes
+        self.ffmpeg_path = ffmpeg_path or (lambda: None)
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # video_id -> bytes on disk, least recently used first
+        self._fetching = {}  # video_id -> lock held while its files are written
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        # Rebuild the LRU order from the files left by an earlier run
+        found = []
+        for video_id in os.listdir(self.cache_dir):
+            directory = os.path.join(self.cache_dir, video_id)
+            if not os.path.isdir(directory):
+                continue
+            files = [os.path.join(directory, f) for f in os.listdir(directory) if not f.endswith('.part')]
+            if not files:
+                shutil.rmtree(directory, ignore_errors=True)
+                continue
+            found.append((max(os.path.getmtime(f) for f in files), video_id, sum(os.path.getsize(f) for f in files)))
+        for _, video_id, size in sorted(found):
+            self._entries[video_id] = size
+
+    def _video_lock(self, video_id):
+        with self._lock:
+            return self._fetching.setdefault(video_id, threading.Lock())
+
+    def _find(self, directory, prefix):
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return None
+        for name in names:
+            if name.startswith(prefix + '.') and not name.endswith('.part'):
+                return os.path.join(directory, name)
+        return None
+
+    def get(self, video_id, size, source_url):
+        """Path of video_id's thumbnail at size, fetching source_url and resizing if needed"""
+        ffmpeg = self.ffmpeg_path()
+        if size not in self.sizes or not ffmpeg:
+            size = 'original'
+        directory = os.path.join(self.cache_dir, video_id)
+        path = self._find(directory, size)
+        if path:
+            self._touch(video_id, hit=True)
+            return path
+
+        # One request per video fetches and converts; the others wait for its files
+        with self._video_lock(video_id):
+            path = self._find(directory, size)
+            if path:
+                self._touch(video_id, hit=True)
+                return path
+            os.makedirs(directory, exist_ok=True)
+            source = self._find(directory, 'original') or self._fetch(source_url, directory)
+            path = source if size == 'original' else self._resize(ffmpeg, source, directory, size)
+        self._touch(video_id, hit=False)
+        self._enforce()
+        return path
+
+    def _fetch(self, url, directory):
+        request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                ext = SOURCE_EXTS.get(response.headers.get_content_type(), 'jpg')
+                data = response.read(MAX_SOURCE_BYTES + 1)
+        except OSError as e:
+            raise ThumbnailError(f'Thumbnail fetch failed: {e}') from e
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ThumbnailError('Thumbnail is too large')
+
+        with self._lock:
+            self.fetches += 1
+        path = os.path.join(directory, f'original.{ext}')
+        with open(path + '.part', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.part', path)
+        return path
+
+    def _resize(self, ffmpeg, source, directory, size):
+        # Never upscale; -2 keeps the aspect ratio with an even height
+        width = self.sizes[size]
+        path = os.path.join(directory, f'{size}.jpg')
+        result = subprocess.run(
+            [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-i', source,
+             '-vf', f"scale='min({width},iw)':-2", '-frames:v', '1', '-q:v', '3', '-f', 'mjpeg', path + '.part'],
+            capture_output=True, text=True)
+        if result.returncode != 0:
+            raise ThumbnailError(f'Thumbnail resize failed: {result.stderr.strip()}')
+        os.replace(path + '.part', path)
+        return path
+
+    def _touch(self, video_id, hit):
+        size = None
+        if not hit:
+            directory = os.path.join(self.cache_dir, video_id)
+            try:
+                size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+            except OSError:
+                size = 0
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if size is not None or video_id not in self._entries:
+                self._entries[video_id] = size or 0
+            self._entries.move_to_end(video_id)
+
+    def _enforce(self):
+        while True:
+            with self._lock:
+                if sum(self._entries.values()) <= self.max_bytes or len(self._entries) <= 1:
+                    return
+                video_id, _ = self._entries.popitem(last=False)
+                self._fetching.pop(video_id, None)
+                self.evictions += 1
+            shutil.rmtree(os.path.join(self.cache_dir, video_id), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'fetches': self.fetches,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,17 @@
+"""
+WSGI entry point for running several worker processes, e.g.
+
+    gunicorn -c gunicorn.conf.py
+
+APP_MODULE picks the app (app for the web client, app1 for the
+extension). Jobs, progress and the finished-file index default to the
+shared SQLite backend so a request can land on any worker.
+"""
+import os
+import importlib
+
+os.environ.setdefault('STATE_BACKEND', 'sqlite')
+
+module = importlib.import_module(os.environ.get('APP_MODULE', 'app'))
+app = module.app
+module.start_background_tasks()
@@ -0,0 +1,285 @@
+import io
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import yt_dlp
+from yt_dlp.cookies import YoutubeDLCookieJar
+from yt_dlp.postprocessor import get_postprocessor
+
+# Options that differ between requests or jobs. They are applied to a pooled
+# instance on checkout instead of being part of the key, so instances are
+# keyed only on session-level options (verbosity, timeouts) and cookies.
+HOOK_OPTIONS = ('progress_hooks', 'post_hooks', 'postprocessor_hooks')
+# Read from params when a download runs: quality choice, clip range and
+# the download profile. yt-dlp uses its defaults for the ones left out.
+PARAM_OPTIONS = (
+    'format_sort', 'merge_output_format', 'download_ranges', 'force_keyframes_at_cuts',
+    'concurrent_fragment_downloads', 'buffersize', 'http_chunk_size', 'retries', 'fragment_retries',
+    'retry_sleep_functions',
+)
+# Built into objects by YoutubeDL.__init__, so they are rebuilt on checkout
+PER_REQUEST_OPTIONS = HOOK_OPTIONS + PARAM_OPTIONS + ('outtmpl', 'format', 'postprocessors')
+
+
+def _freeze(value):
+    """Hashable, order-independent form of an options value"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class CookieJarCache:
+    """
+    Parsed cookie jars keyed by a hash of their Netscape text, so identical
+    cookies sent with every extension request are parsed once and shared.
+    Cookie files are re-read only when their mtime or size changes. Jars
+    unused for ttl seconds, or beyond max_entries, are dropped.
+    """
+
+    def __init__(self, max_entries=256, ttl=30 * 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._jars = OrderedDict()  # content hash -> (jar, last_used)
+        self._files = {}  # path -> ((mtime_ns, size), content hash)
+        self._lock = threading.Lock()
+
+    def from_text(self, text):
+        """Return (key, jar) for Netscape cookie text"""
+        key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            entry = self._jars.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._jars[key] = (entry[0], now)
+                self._jars.move_to_end(key)
+                return key, entry[0]
+            self.misses += 1
+
+        jar = YoutubeDLCookieJar()
+        jar.load(io.StringIO(text))
+
+        with self._lock:
+            # Another request may have parsed the same text meanwhile; keep the first
+            jar = self._jars.get(key, (jar, now))[0]
+            self._jars[key] = (jar, now)
+            self._jars.move_to_end(key)
+            while len(self._jars) > self.max_entries:
+                self._jars.popitem(last=False)
+        return key, jar
+
+    def from_file(self, path):
+        """Return (key, jar) for a cookie file, or (None, None) if it is missing"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None, None
+
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._files.get(path)
+            key = cached[1] if cached and cached[0] == stamp else None
+            entry = self._jars.get(key) if key else None
+            if entry is not None:
+                self.hits += 1
+                self._jars[key] = (entry[0], time.time())
+                self._jars.move_to_end(key)
+                return key, entry[0]
+
+        with open(path, encoding='utf-8') as f:
+            key, jar = self.from_text(f.read())
+        with self._lock:
+            self._files[path] = (stamp, key)
+        return key, jar
+
+    def _prune(self, now):
+        # Caller must hold the lock
+        if not self.ttl:
+            return
+        for key in [k for k, (_, used) in self._jars.items() if now - used > self.ttl]:
+            del self._jars[key]
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._jars), 'hits': self.hits, 'misses': self.misses}
+
+
+class YoutubeDLPool:
+    """
+    Warm yt-dlp instances keyed by session-level options and cookie hash.
+    Reusing an instance keeps its initialized extractors and its HTTP
+    connections. Each checkout gets its own hooks, output template, format
+    choice, post-processors and download profile. An instance is
+    never shared by two requests at once, and one that raised is closed
+    instead of returned. Besides yt-dlp options, 'cookies' may carry
+    Netscape cookie text, which is parsed once per distinct content.
+    """
+
+    def __init__(self, cookie_jars=None, max_idle_per_key=4, max_keys=64, idle_ttl=10 * 60):
+        self.cookie_jars = cookie_jars or CookieJarCache()
+        self.max_idle_per_key = max_idle_per_key
+        self.max_keys = max_keys
+        self.idle_ttl = idle_ttl
+        self.created = 0
+        self.reused = 0
+        self._idle = OrderedDict()  # key -> [(ydl, last_used), ...]
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def _split(self, ydl_opts):
+        """Return (pool key, base options, per-request overrides, cookie jar)"""
+        base = {k: v for k, v in ydl_opts.items() if k not in PER_REQUEST_OPTIONS}
+        overrides = {k: ydl_opts[k] for k in PER_REQUEST_OPTIONS if k in ydl_opts}
+
+        cookies = base.pop('cookies', None)
+        cookiefile = base.pop('cookiefile', None)
+        if cookies:
+            cookie_key, jar = self.cookie_jars.from_text(cookies)
+        elif cookiefile:
+            cookie_key, jar = self.cookie_jars.from_file(cookiefile)
+        else:
+            cookie_key, jar = None, None
+
+        return (_freeze(base), cookie_key), base, overrides, jar
+
+    @classmethod
+    def _apply(cls, ydl, overrides):
+        # yt-dlp falls back to its defaults (e.g. the whole video for
+        # download_ranges) only when a key is absent, so unset ones are removed
+        for name in PARAM_OPTIONS:
+            if overrides.get(name) is not None:
+                ydl.params[name] = overrides[name]
+            else:
+                ydl.params.pop(name, None)
+
+        # Parsing a selector takes about half a millisecond; keep it while the format is unchanged
+        fmt = overrides.get('format')
+        if ydl.params.get('format') != fmt:
+            if fmt is None:
+                ydl.params.pop('format', None)
+            else:
+                ydl.params['format'] = fmt
+            ydl.format_selector = fmt if fmt in (None, '-') or callable(fmt) else ydl.build_format_selector(fmt)
+
+        # Same as YoutubeDL.__init__ does for the postprocessors option
+        ydl.params['postprocessors'] = list(overrides.get('postprocessors', []))
+        ydl._pps = {when: [] for when in ydl._pps}
+        for pp_def in ydl.params['postprocessors']:
+            pp_def = dict(pp_def)
+            when = pp_def.pop('when', 'post_process')
+            ydl.add_post_processor(get_postprocessor(pp_def.pop('key'))(ydl, **pp_def), when=when)
+
+        cls._apply_hooks(ydl, overrides)
+        ydl.params['outtmpl'] = overrides.get('outtmpl', {})
+        ydl._parse_outtmpl()
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+
+    @staticmethod
+    def _apply_hooks(ydl, overrides):
+        ydl._progress_hooks = list(overrides.get('progress_hooks', []))
+        ydl._post_hooks = list(overrides.get('post_hooks', []))
+        ydl._postprocessor_hooks = list(overrides.get('postprocessor_hooks', []))
+        # Post-processors copy the hooks when they are created, so refresh theirs too
+        for pps in ydl._pps.values():
+            for pp in pps:
+                pp._progress_hooks = list(ydl._postprocessor_hooks)
+
+    def checkout(self, ydl_opts):
+        """Return (key, ydl) configured for this request; give it back with checkin()"""
+        key, base, overrides, jar = self._split(ydl_opts)
+
+        ydl = None
+        with self._lock:
+            stale = self._prune(time.time())
+            idle = self._idle.get(key)
+            if idle:
+                ydl = idle.pop()[0]
+                self._idle.move_to_end(key)
+                self.reused += 1
+            else:
+                self.created += 1
+            self._in_use += 1
+
+        for old in stale:
+            self._close(old)
+
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(base)
+            if jar is not None:
+                # Must be in place before the first request builds the HTTP handlers
+                ydl.cookiejar = jar
+
+        self._apply(ydl, overrides)
+        return key, ydl
+
+    def checkin(self, key, ydl, reusable=True):
+        # Drop references to the request's hooks either way; the next checkout sets everything else
+        self._apply_hooks(ydl, {})
+
+        evicted = []
+        with self._lock:
+            self._in_use -= 1
+            idle = self._idle.setdefault(key, [])
+            if reusable and len(idle) < self.max_idle_per_key:
+                idle.append((ydl, time.time()))
+                self._idle.move_to_end(key)
+            else:
+                evicted.append(ydl)
+            while len(self._idle) > self.max_keys:
+                evicted.extend(y for y, _ in self._idle.popitem(last=False)[1])
+            if not idle:
+                self._idle.pop(key, None)
+
+        for stale in evicted:
+            self._close(stale)
+
+    @contextmanager
+    def acquire(self, ydl_opts):
+        """Context manager form of checkout()/checkin()"""
+        key, ydl = self.checkout(ydl_opts)
+        reusable = False
+        try:
+            yield ydl
+            reusable = True
+        finally:
+            self.checkin(key, ydl, reusable)
+
+    def _prune(self, now):
+        """Caller must hold the lock; returns expired instances for the caller to close"""
+        stale = []
+        for key in list(self._idle):
+            fresh = [(y, used) for y, used in self._idle[key] if now - used <= self.idle_ttl]
+            stale.extend(y for y, used in self._idle[key] if now - used > self.idle_ttl)
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+        return stale
+
+    @staticmethod
+    def _close(ydl):
+        try:
+            ydl.close()
+        except Exception as e:
+            print(f"Error closing pooled YoutubeDL: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'in_use': self._in_use,
+                'idle': sum(len(v) for v in self._idle.values()),
+                'keys': len(self._idle),
+                'cookie_jars': self.cookie_jars.stats(),
+            }
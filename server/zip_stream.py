@@ -0,0 +1,57 @@
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _ChunkSink:
+    """Write-only, non-seekable file object that hands written bytes back to the caller"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipStream:
+    """
+    Builds a ZIP archive incrementally with stored (uncompressed) entries.
+    Each call returns the archive bytes produced so far, so the caller can
+    stream them out without keeping the archive in memory or on disk.
+    """
+
+    def __init__(self):
+        self._sink = _ChunkSink()
+        # The sink can't seek, so zipfile writes data descriptors after each entry
+        self._zip = zipfile.ZipFile(self._sink, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True)
+
+    def add_file(self, arcname, path):
+        """Yield archive bytes while copying the file at path into the archive"""
+        with open(path, 'rb') as src, self._zip.open(arcname, mode='w', force_zip64=True) as dest:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                dest.write(chunk)
+                data = self._sink.drain()
+                if data:
+                    yield data
+        yield self._sink.drain()
+
+    def add_text(self, arcname, text):
+        self._zip.writestr(arcname, text)
+        return self._sink.drain()
+
+    def close(self):
+        """Write the central directory and return the final bytes"""
+        self._zip.close()
+        return self._sink.drain()